@@ -0,0 +1,213 @@
+"""Benchmarks of the views and the model hot paths.
+
+Seeds a database of the requested size (reused between runs), runs each
+benchmark a number of times and reports the latency percentiles and the
+number of SQL queries per call. The results are saved as JSON, and can be
+compared with a baseline from another commit::
+
+    python benchmarks/bench.py --recipes 10000 --output baseline.json
+    # ... change the code ...
+    python benchmarks/bench.py --recipes 10000 --compare baseline.json
+
+The comparison exits with status 1 if the median of a benchmark got slower
+than the threshold, or it makes more queries than before."""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import platform
+import random
+import sys
+import time
+from typing import Callable
+
+from common import (
+    DEFAULT_DATABASE,
+    QueryCounter,
+    ensure_seeded,
+    git_revision,
+    make_app,
+    sample_ids,
+    sample_logins,
+    sample_words,
+    summarize,
+)
+
+
+class Context:
+    """What the benchmarks need: the app, a client and ids and words to pick from"""
+
+    def __init__(self, app, seed: int):
+        from tymenu.models import MenuPlan, Recipe
+
+        self.app = app
+        self.client = app.test_client()
+        self.rng = random.Random(seed)
+        self.recipe_ids = sample_ids(app, Recipe)
+        self.plan_ids = sample_ids(app, MenuPlan)
+        self.words = sample_words(app)
+        self.emails = sample_logins(app)
+
+    def get(self, url: str) -> None:
+        response = self.client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url}: {response.status_code}")
+
+
+def bench_index(ctx: Context) -> None:
+    ctx.get("/")
+
+
+def bench_search(ctx: Context) -> None:
+    ctx.get(f"/search_results?q={ctx.rng.choice(ctx.words)}")
+
+
+def bench_recipe(ctx: Context) -> None:
+    ctx.get(f"/recipe/{ctx.rng.choice(ctx.recipe_ids)}")
+
+
+def bench_plan(ctx: Context) -> None:
+    ctx.get(f"/plan/view_plan/{ctx.rng.choice(ctx.plan_ids)}")
+
+
+def bench_login(ctx: Context) -> None:
+    from tymenu.fake import PASSWORD
+
+    # A new client, so the user is not logged in already.
+    client = ctx.app.test_client()
+    data = {"email": ctx.rng.choice(ctx.emails), "password": PASSWORD}
+    response = client.post("/login", data=data)
+    if response.status_code != 302:
+        raise RuntimeError(f"Login failed: {response.status_code}")
+
+
+def bench_markdown(ctx: Context) -> None:
+    from tymenu.rendering import get_renderer
+    from tymenu.utils import clean_markdown_to_html
+
+    # Render, not a hit in the renderer's cache
+    get_renderer().clear()
+    words = ctx.rng.sample(ctx.words, min(len(ctx.words), 5))
+    clean_markdown_to_html(
+        "\n".join(f"* {i} g **{word}** and _{word}_ :smile:" for i, word in enumerate(words))
+        + "\n\n1. Boil\n2. Serve at https://example.com"
+    )
+
+
+def bench_build_query(ctx: Context) -> None:
+    from tymenu.models import Recipe
+
+    with ctx.app.app_context():
+        # Whole words, as the ingredients and keywords are matched as terms
+        ingredient, keyword = ctx.rng.sample(ctx.words, 2)
+        Recipe.build_query(ingredients=[ingredient], keywords=[keyword]).limit(20).all()
+
+
+BENCHMARKS: dict[str, Callable[[Context], None]] = {
+    "index": bench_index,
+    "search": bench_search,
+    "recipe": bench_recipe,
+    "plan": bench_plan,
+    "login": bench_login,
+    "markdown": bench_markdown,
+    "build_query": bench_build_query,
+}
+
+
+def run_benchmark(ctx: Context, func, iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        func(ctx)
+    samples = []
+    with QueryCounter(ctx.app) as counter:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func(ctx)
+            samples.append(time.perf_counter() - start)
+    result = summarize(samples)
+    result["queries_per_call"] = counter.count / iterations
+    return result
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Print the changes from the baseline, returns True if nothing regressed."""
+    ok = True
+    print(f"\nCompared to {baseline.get('revision', '?')}:")
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("inf")
+        more_queries = result["queries_per_call"] > before["queries_per_call"] + 0.01
+        regressed = ratio > threshold or more_queries
+        ok = ok and not regressed
+        flag = "REGRESSION" if regressed else ""
+        print(
+            f"{name:<12} p50 {before['p50_ms']:8.2f} -> {result['p50_ms']:8.2f} ms "
+            f"({ratio:5.2f}x), queries {before['queries_per_call']:.1f} -> "
+            f"{result['queries_per_call']:.1f} {flag}"
+        )
+    return ok
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="SQLAlchemy database URL.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--recipes", type=int, default=5000)
+    parser.add_argument("--plans", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="Comma separated benchmarks to run.")
+    parser.add_argument("--output", help="Save the results as JSON.")
+    parser.add_argument("--compare", help="JSON results to compare with.")
+    parser.add_argument(
+        "--threshold", type=float, default=1.2, help="Allowed slowdown of the median."
+    )
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    app = make_app(args.database, TYMENU_SQL_INSTRUMENTATION=False)
+    ensure_seeded(app, args.users, args.recipes, args.plans, seed=args.seed)
+    ctx = Context(app, args.seed)
+
+    results = {}
+    print(f"{'benchmark':<12} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}")
+    for name in names:
+        result = run_benchmark(ctx, BENCHMARKS[name], args.iterations, args.warmup)
+        results[name] = result
+        print(
+            f"{name:<12} {result['n']:>5} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+            f"{result['p99_ms']:>9.2f} {result['queries_per_call']:>8.1f}"
+        )
+
+    report = {
+        "revision": git_revision(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": app.config["SQLALCHEMY_DATABASE_URI"].split(":", 1)[0],
+        "size": {"users": args.users, "recipes": args.recipes, "plans": args.plans},
+        "iterations": args.iterations,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Saved the results to {args.output}")
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("size") != report["size"]:
+            print("Warning: the baseline was made with a database of another size.")
+        if not compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Helpers shared by the benchmarks and the load harness"""
+from __future__ import annotations
+
+import os
+import statistics
+import subprocess
+
+from flask import Flask
+import sqlalchemy as sql
+from sqlalchemy import event
+
+DEFAULT_DATABASE = "sqlite:///" + os.path.join(os.path.dirname(__file__), "bench.sqlite")
+
+
+def make_app(database_url: str, **config) -> Flask:
+    """App with the given database, and CSRF disabled so forms can be posted."""
+    # The config classes read the database URL when they are imported.
+    os.environ["TEST_DATABASE_URL"] = database_url
+    from tymenu import create_app
+
+    app = create_app("testing")
+    if app.config["SQLALCHEMY_DATABASE_URI"] != database_url:
+        raise RuntimeError("tymenu.config was imported before the database URL was set.")
+    app.config.update({"WTF_CSRF_ENABLED": False, "TYMENU_MAIL_WORKERS": 0, **config})
+    return app
+
+
+def ensure_seeded(app: Flask, users: int, recipes: int, plans: int, seed: int = 0) -> None:
+    """Seed the database, unless it has the requested number of rows already."""
+    from tymenu.fake import BulkSeeder
+    from tymenu.models import MenuPlan, Recipe, Role, User
+    from tymenu.resources import get_db
+
+    with app.app_context():
+        db = get_db()
+        db.create_all()
+        counts = [db.session.query(model).count() for model in (User, Recipe, MenuPlan)]
+        if counts == [users, recipes, plans]:
+            return
+        print(f"Seeding {users} users, {recipes} recipes and {plans} menu plans...")
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        Role.insert_roles()
+        BulkSeeder(seed=seed).seed(users, recipes, plans)
+
+
+def sample_ids(app: Flask, model, limit: int = 1000) -> list[int]:
+    from tymenu.resources import get_db
+
+    with app.app_context():
+        stmt = sql.select(model.id).order_by(sql.func.random()).limit(limit)
+        return get_db().session.scalars(stmt).all()
+
+
+def sample_words(app: Flask, limit: int = 200) -> list[str]:
+    from tymenu.models import Recipe
+    from tymenu.resources import get_db
+
+    with app.app_context():
+        stmt = sql.select(Recipe.title).order_by(sql.func.random()).limit(limit)
+        titles = get_db().session.scalars(stmt).all()
+    return sorted({word.lower() for title in titles for word in title.split()[:-1]})
+
+
+def sample_logins(app: Flask, limit: int = 100) -> list[str]:
+    from tymenu.models import User
+    from tymenu.resources import get_db
+
+    with app.app_context():
+        stmt = sql.select(User.email).order_by(User.id).limit(limit)
+        return get_db().session.scalars(stmt).all()
+
+
+class QueryCounter:
+    """Counts the SQL statements executed on the engines of an app"""
+
+    def __init__(self, app: Flask):
+        from tymenu.resources import get_db
+
+        with app.app_context():
+            self.engines = list(get_db().engines.values())
+        self.count = 0
+
+    def _record(self, *args) -> None:
+        self.count += 1
+
+    def __enter__(self) -> QueryCounter:
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._record)
+
+
+def percentile(sorted_samples: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    if not sorted_samples:
+        return float("nan")
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """Latency statistics in milliseconds, of samples in seconds"""
+    ms = sorted(sample * 1000 for sample in samples)
+    return {
+        "n": len(ms),
+        "mean_ms": statistics.fmean(ms) if ms else float("nan"),
+        "p50_ms": percentile(ms, 0.50),
+        "p95_ms": percentile(ms, 0.95),
+        "p99_ms": percentile(ms, 0.99),
+        "max_ms": ms[-1] if ms else float("nan"),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
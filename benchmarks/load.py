@@ -0,0 +1,474 @@
+"""Closed-loop load test of the app.
+
+A number of simulated users each run a loop: pick an action from the traffic
+mix, run its requests, wait a think time, and repeat. The load is run in
+steps of increasing concurrency, so the throughput curve shows where the app
+saturates: the step where the throughput stops growing while the latency
+goes up.
+
+The requests go either in-process through the Flask test client, or over
+HTTP to a server: a running one given by ``--url``, or gunicorn launched on
+the benchmark database with ``--gunicorn``. In-process, all simulated users
+share one Python process and the GIL, so it measures the cost of the app
+code; gunicorn with several workers measures the server as deployed::
+
+    python benchmarks/load.py --concurrency 1,2,4,8 --duration 20
+    python benchmarks/load.py --gunicorn --workers 4 --concurrency 4,8,16,32,64
+
+The actions and their default weights are in ``MIX``; change them with e.g.
+``--mix browse=5,search=2,recipe=10,plan=1,login=1,edit=0.5``."""
+from __future__ import annotations
+
+import argparse
+import contextlib
+from dataclasses import dataclass, field
+import datetime
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Iterator
+
+from common import (
+    DEFAULT_DATABASE,
+    ensure_seeded,
+    git_revision,
+    make_app,
+    sample_ids,
+    sample_logins,
+    sample_words,
+    summarize,
+)
+
+# Action -> relative weight. Read traffic dominates.
+MIX = {
+    "browse": 30.0,
+    "search": 15.0,
+    "recipe": 40.0,
+    "plan": 10.0,
+    "login": 3.0,
+    "edit": 2.0,
+}
+
+_CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]*)"')
+_CURSOR_RE = re.compile(r'href="[^"]*[?&]cursor=([^"&]+)')
+
+
+class Response:
+    def __init__(self, status: int, text: str):
+        self.status = status
+        self.text = text
+
+
+class ClientSession:
+    """Requests of one simulated user, through the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path: str) -> Response:
+        response = self.client.get(path)
+        return Response(response.status_code, response.get_data(as_text=True))
+
+    def post(self, path: str, data: dict) -> Response:
+        response = self.client.post(path, data=data)
+        return Response(response.status_code, response.get_data(as_text=True))
+
+
+class HttpSession:
+    """Requests of one simulated user, over HTTP"""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def get(self, path: str) -> Response:
+        response = self.session.get(
+            self.base_url + path, timeout=self.timeout, allow_redirects=False
+        )
+        return Response(response.status_code, response.text)
+
+    def post(self, path: str, data: dict) -> Response:
+        response = self.session.post(
+            self.base_url + path, data=data, timeout=self.timeout, allow_redirects=False
+        )
+        return Response(response.status_code, response.text)
+
+
+@dataclass
+class Endpoint:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+
+class Recorder:
+    """Latencies and errors per endpoint, of one step"""
+
+    def __init__(self):
+        self.endpoints: dict[str, Endpoint] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            endpoint = self.endpoints.setdefault(name, Endpoint())
+            endpoint.latencies.append(seconds)
+            if not ok:
+                endpoint.errors += 1
+
+
+class RequestFailed(Exception):
+    pass
+
+
+@dataclass
+class Data:
+    """What the simulated users pick from"""
+
+    recipe_ids: list[int]
+    plan_ids: list[int]
+    words: list[str]
+    editors: list[str]
+    password: str
+
+
+class SimulatedUser:
+    def __init__(self, session, data: Data, recorder: Recorder, rng: random.Random):
+        self.session = session
+        self.data = data
+        self.recorder = recorder
+        self.rng = rng
+        self.logged_in = False
+
+    def request(
+        self, method: str, name: str, path: str, data: dict | None = None, expect: int = 200
+    ) -> Response:
+        start = time.perf_counter()
+        try:
+            if method == "GET":
+                response = self.session.get(path)
+            else:
+                response = self.session.post(path, data or {})
+        except Exception as exc:
+            self.recorder.record(f"{method} {name}", time.perf_counter() - start, False)
+            raise RequestFailed(f"{method} {path}: {exc}") from exc
+        ok = response.status == expect
+        self.recorder.record(f"{method} {name}", time.perf_counter() - start, ok)
+        if not ok:
+            raise RequestFailed(f"{method} {path}: {response.status}")
+        return response
+
+    def form(self, name: str, path: str) -> dict:
+        """GET a form, returns the CSRF token to post with it"""
+        match = _CSRF_RE.search(self.request("GET", name, path).text)
+        return {"csrf_token": match.group(1)} if match else {}
+
+    def browse(self) -> None:
+        """The feed, and a couple of the following pages"""
+        response = self.request("GET", "main.index", "/")
+        for _ in range(self.rng.randint(0, 2)):
+            match = _CURSOR_RE.search(response.text)
+            if match is None:
+                break
+            response = self.request("GET", "main.index", f"/?cursor={match.group(1)}")
+
+    def search(self) -> None:
+        terms = " ".join(self.rng.sample(self.data.words, self.rng.choice((1, 1, 2))))
+        self.request("GET", "menu.search_results", f"/search_results?q={terms}")
+
+    def recipe(self) -> None:
+        recipe_id = self.rng.choice(self.data.recipe_ids)
+        self.request("GET", "menu.view_recipe", f"/recipe/{recipe_id}")
+
+    def plan(self) -> None:
+        plan_id = self.rng.choice(self.data.plan_ids)
+        self.request("GET", "planner.view_plan", f"/plan/view_plan/{plan_id}")
+
+    def login(self) -> None:
+        if self.logged_in:
+            self.request("GET", "auth.logout", "/logout", expect=302)
+            self.logged_in = False
+        form = self.form("auth.login", "/login")
+        form.update(email=self.rng.choice(self.data.editors), password=self.data.password)
+        self.request("POST", "auth.login", "/login", form, expect=302)
+        self.logged_in = True
+
+    def edit(self) -> None:
+        """Open the edit page of a recipe, and post it back with a changed field"""
+        if not self.logged_in:
+            self.login()
+        recipe_id = self.rng.choice(self.data.recipe_ids)
+        response = self.request("GET", "menu.edit_recipe", f"/edit/{recipe_id}")
+        form = _form_values(response.text)
+        form["cooking_time_min"] = str(self.rng.choice((10, 20, 30, 45, 60)))
+        form["submit"] = "Submit"
+        form.pop("cancel", None)
+        self.request("POST", "menu.edit_recipe", f"/edit/{recipe_id}", form, expect=302)
+
+    def run(self, actions: list[str], weights: list[float], deadline: float, think: float):
+        while time.monotonic() < deadline:
+            action = self.rng.choices(actions, weights)[0]
+            try:
+                getattr(self, action)()
+            except RequestFailed:
+                # Recorded as an error, start over as a new visitor
+                self.logged_in = False
+            if think:
+                time.sleep(self.rng.expovariate(1 / think))
+
+
+_INPUT_RE = re.compile(r"<input\b[^>]*>")
+_TEXTAREA_RE = re.compile(r'<textarea\b[^>]*name="([^"]+)"[^>]*>(.*?)</textarea>', re.DOTALL)
+_SELECT_RE = re.compile(r'<select\b[^>]*name="([^"]+)"[^>]*>(.*?)</select>', re.DOTALL)
+_ATTR_RE = re.compile(r'(\w+)="([^"]*)"')
+
+
+def _form_values(html: str) -> dict:
+    """The values of the fields of a rendered form, as a browser would post them"""
+    from html import unescape
+
+    values = {}
+    for tag in _INPUT_RE.findall(html):
+        attrs = dict(_ATTR_RE.findall(tag))
+        if "name" in attrs and attrs.get("type") not in ("submit", "checkbox"):
+            values[attrs["name"]] = unescape(attrs.get("value", ""))
+    for name, text in _TEXTAREA_RE.findall(html):
+        values[name] = unescape(text).lstrip("\r\n")
+    for name, options in _SELECT_RE.findall(html):
+        selected = re.search(r'<option[^>]*selected[^>]*value="([^"]*)"', options) or re.search(
+            r'<option[^>]*value="([^"]*)"', options
+        )
+        if selected:
+            values[name] = unescape(selected.group(1))
+    return values
+
+
+def run_step(
+    make_session: Callable[[], object],
+    data: Data,
+    concurrency: int,
+    duration: float,
+    mix: dict[str, float],
+    think: float,
+    seed: int,
+) -> tuple[Recorder, float]:
+    """Run the simulated users for the duration, returns the records and the elapsed time."""
+    recorder = Recorder()
+    actions = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in actions]
+    start = time.monotonic()
+    deadline = start + duration
+    threads = []
+    for i in range(concurrency):
+        user = SimulatedUser(make_session(), data, recorder, random.Random(seed * 1000 + i))
+        thread = threading.Thread(
+            target=user.run, args=(actions, weights, deadline, think), daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return recorder, time.monotonic() - start
+
+
+def report(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for name, endpoint in sorted(recorder.endpoints.items()):
+        stats = summarize(endpoint.latencies)
+        stats["rps"] = len(endpoint.latencies) / elapsed
+        stats["errors"] = endpoint.errors
+        stats["error_rate"] = endpoint.errors / len(endpoint.latencies)
+        endpoints[name] = stats
+    total = sum(len(endpoint.latencies) for endpoint in recorder.endpoints.values())
+    errors = sum(endpoint.errors for endpoint in recorder.endpoints.values())
+    all_latencies = [s for endpoint in recorder.endpoints.values() for s in endpoint.latencies]
+    overall = summarize(all_latencies)
+    overall.update(rps=total / elapsed, errors=errors, error_rate=errors / total if total else 0)
+    return {"overall": overall, "endpoints": endpoints}
+
+
+def print_step(concurrency: int, result: dict) -> None:
+    print(f"\nConcurrency {concurrency}:")
+    print(
+        f"{'endpoint':<26} {'n':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'errors':>7}"
+    )
+    rows = [*result["endpoints"].items(), ("total", result["overall"])]
+    for name, stats in rows:
+        print(
+            f"{name:<26} {stats['n']:>6} {stats['rps']:>8.1f} {stats['p50_ms']:>8.1f} "
+            f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['error_rate']:>7.1%}"
+        )
+
+
+def print_curve(steps: list[dict]) -> None:
+    print("\nThroughput by concurrency:")
+    print(f"{'users':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    best = 0.0
+    for step in steps:
+        overall = step["overall"]
+        # Less than 10 % more throughput from the extra users: saturated
+        saturated = best and overall["rps"] < best * 1.1
+        best = max(best, overall["rps"])
+        print(
+            f"{step['concurrency']:>6} {overall['rps']:>8.1f} {overall['p50_ms']:>8.1f} "
+            f"{overall['p99_ms']:>8.1f} {overall['error_rate']:>7.1%}"
+            + ("  saturated" if saturated else "")
+        )
+
+
+def promote_editors(app, emails: list[str]) -> None:
+    """The simulated users who edit must be moderators"""
+    from tymenu.models import Permission, User
+    from tymenu.resources import get_db
+
+    with app.app_context():
+        for user in User.query.filter(User.email.in_(emails)):
+            if not user.can(Permission.MODERATE):
+                user.set_role("moderator")
+        get_db().session.commit()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def gunicorn_server(database_url: str, workers: int, threads: int) -> Iterator[str]:
+    """Launch gunicorn serving the app on the database, yields its URL."""
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, TYMENU_SQL_INSTRUMENTATION="false")
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "--workers",
+        str(workers),
+        "--threads",
+        str(threads),
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--log-level",
+        "warning",
+        "tymenu:create_app('production')",
+    ]
+    process = subprocess.Popen(command, env=env)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError("gunicorn exited, is it installed?")
+            with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), 1):
+                break
+            if time.monotonic() > deadline:
+                raise RuntimeError("gunicorn did not start.")
+            time.sleep(0.2)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def parse_mix(text: str | None) -> dict[str, float]:
+    mix = dict(MIX)
+    if text:
+        for item in text.split(","):
+            name, _, weight = item.partition("=")
+            if name not in MIX:
+                raise ValueError(f"Unknown action: {name}. Actions: {', '.join(MIX)}")
+            mix[name] = float(weight)
+    return mix
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="SQLAlchemy database URL.")
+    parser.add_argument("--users", type=int, default=200, help="Users in the database.")
+    parser.add_argument("--recipes", type=int, default=5000)
+    parser.add_argument("--plans", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Simulated users in each step.")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds of each step.")
+    parser.add_argument("--think", type=float, default=0, help="Mean think time in seconds.")
+    parser.add_argument("--mix", help="Weights of the actions, e.g. recipe=10,edit=0.")
+    parser.add_argument("--seed", type=int, default=0)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Run against a server at this URL.")
+    target.add_argument("--gunicorn", action="store_true", help="Launch gunicorn.")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes.")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker.")
+    parser.add_argument("--output", help="Save the results as JSON.")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as exc:
+        parser.error(str(exc))
+    concurrency = [int(n) for n in args.concurrency.split(",")]
+
+    app = make_app(args.database, TYMENU_SQL_INSTRUMENTATION=False)
+    from tymenu.fake import PASSWORD
+    from tymenu.models import MenuPlan, Recipe
+
+    ensure_seeded(app, args.users, args.recipes, args.plans, seed=args.seed)
+    editors = sample_logins(app, limit=20)
+    promote_editors(app, editors)
+    data = Data(
+        recipe_ids=sample_ids(app, Recipe),
+        plan_ids=sample_ids(app, MenuPlan),
+        words=sample_words(app),
+        editors=editors,
+        password=PASSWORD,
+    )
+
+    with contextlib.ExitStack() as stack:
+        if args.gunicorn:
+            url = stack.enter_context(gunicorn_server(args.database, args.workers, args.threads))
+        else:
+            url = args.url
+        if url:
+            print(f"Running against {url}")
+            make_session = lambda: HttpSession(url)
+        else:
+            print("Running in-process")
+            make_session = lambda: ClientSession(app)
+
+        steps = []
+        for i, users in enumerate(concurrency):
+            recorder, elapsed = run_step(
+                make_session, data, users, args.duration, mix, args.think, args.seed + i
+            )
+            result = report(recorder, elapsed)
+            print_step(users, result)
+            steps.append({"concurrency": users, "duration": elapsed, **result})
+    print_curve(steps)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "revision": git_revision(),
+                    "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    "target": "gunicorn" if args.gunicorn else (args.url or "in-process"),
+                    "size": {"users": args.users, "recipes": args.recipes, "plans": args.plans},
+                    "mix": mix,
+                    "think": args.think,
+                    "steps": steps,
+                },
+                file,
+                indent=2,
+            )
+        print(f"Saved the results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Throughput of concurrent readers and writers on a SQLite file, with SQLite's
+default settings and with the tuning of ``tymenu.sqlite_tuning``.
+
+Reader threads load a recipe and the first page of the feed, writer threads
+update a recipe and commit. Each profile runs in its own process on a fresh
+database, as the config is read when the app is created and the journal mode
+is stored in the database file::
+
+    python benchmarks/sqlite_concurrency.py --readers 8 --writers 2 --duration 10"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import make_app, summarize
+
+PROFILES = {"default": "false", "tuned": "true"}
+
+
+def _reader(app, recipe_ids, deadline, latencies, errors, seed):
+    from tymenu.models import Recipe
+    from tymenu.resources import get_db
+
+    rng = random.Random(seed)
+    with app.app_context():
+        db = get_db()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                db.session.get(Recipe, rng.choice(recipe_ids))
+                Recipe.list_query().limit(20).all()
+                db.session.rollback()
+            except Exception:
+                db.session.rollback()
+                errors.append(1)
+                continue
+            finally:
+                # A new identity map, so the rows are read again
+                db.session.expunge_all()
+            latencies.append(time.perf_counter() - start)
+
+
+def _writer(app, recipe_ids, deadline, latencies, errors, seed):
+    from tymenu.models import Recipe
+    from tymenu.resources import get_db
+    from tymenu.timestamp import get_now_utc
+
+    rng = random.Random(seed)
+    with app.app_context():
+        db = get_db()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                db.session.execute(
+                    Recipe.__table__.update()
+                    .where(Recipe.id == rng.choice(recipe_ids))
+                    .values(cooking_time_min=rng.randint(5, 120), last_updated=get_now_utc())
+                )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                errors.append(1)
+                continue
+            latencies.append(time.perf_counter() - start)
+
+
+def run_profile(args) -> dict:
+    """Run the threads in this process, on the database of args.database"""
+    from common import ensure_seeded, sample_ids
+
+    app = make_app(f"sqlite:///{args.database}", TYMENU_SQL_INSTRUMENTATION=False)
+    from tymenu.models import Recipe
+
+    ensure_seeded(app, 20, args.recipes, 0)
+    recipe_ids = sample_ids(app, Recipe)
+    with app.app_context():
+        from tymenu.resources import get_db
+
+        journal_mode = get_db().session.execute(get_db().text("PRAGMA journal_mode")).scalar()
+
+    results = {}
+    threads = []
+    deadline = time.monotonic() + args.duration
+    for kind, target, count in [("read", _reader, args.readers), ("write", _writer, args.writers)]:
+        latencies: list[float] = []
+        errors: list[int] = []
+        results[kind] = (latencies, errors)
+        for i in range(count):
+            thread = threading.Thread(
+                target=target, args=(app, recipe_ids, deadline, latencies, errors, i)
+            )
+            thread.start()
+            threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    report = {"journal_mode": journal_mode}
+    for kind, (latencies, errors) in results.items():
+        stats = summarize(latencies)
+        stats["per_second"] = len(latencies) / args.duration
+        stats["errors"] = len(errors)
+        report[kind] = stats
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--recipes", type=int, default=2000)
+    parser.add_argument("--output", help="Save the results as JSON.")
+    # Used for the process of each profile
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.database:
+        print(json.dumps(run_profile(args)))
+        return 0
+
+    reports = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for profile, tuning in PROFILES.items():
+            print(f"Running {profile} ({args.readers} readers, {args.writers} writers)...")
+            command = [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--database",
+                os.path.join(directory, f"{profile}.sqlite"),
+                *(argv if argv is not None else sys.argv[1:]),
+            ]
+            env = dict(os.environ, TYMENU_SQLITE_TUNING=tuning)
+            output = subprocess.run(
+                command, env=env, check=True, capture_output=True, text=True
+            ).stdout
+            reports[profile] = json.loads(output.strip().splitlines()[-1])
+
+    print(
+        f"\n{'profile':<9} {'journal':<8} {'kind':<6} {'ops/s':>9} {'p50 ms':>8} "
+        f"{'p99 ms':>8} {'max ms':>8} {'errors':>7}"
+    )
+    for profile, report in reports.items():
+        for kind in ("read", "write"):
+            stats = report[kind]
+            print(
+                f"{profile:<9} {report['journal_mode']:<8} {kind:<6} {stats['per_second']:>9.1f} "
+                f"{stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['max_ms']:>8.1f} "
+                f"{stats['errors']:>7}"
+            )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "profiles": reports}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,8 @@ from logging.config import fileConfig
 from alembic import context
 from flask import current_app
 
+from tymenu import fulltext
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -24,6 +26,17 @@ config.set_main_option(
 )
 target_metadata = current_app.extensions["migrate"].db.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave the full-text index out of autogenerate, it is not in the metadata.
+    On SQLite it is the FTS5 table and its shadow tables, on MySQL an index."""
+    if type_ == "table" and (
+        name == fulltext.FTS_TABLE or name.startswith(f"{fulltext.FTS_TABLE}_")
+    ):
+        return False
+    return not (type_ == "index" and name == fulltext.MYSQL_INDEX_NAME)
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -44,7 +57,11 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True, compare_type=True
+        url=url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        compare_type=True,
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -77,6 +94,7 @@ def run_migrations_online():
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
             compare_type=True,
+            include_object=include_object,
         )
         config_kwargs.update(current_app.extensions["migrate"].configure_args)
         context.configure(**config_kwargs)
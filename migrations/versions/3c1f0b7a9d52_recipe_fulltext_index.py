@@ -0,0 +1,73 @@
+"""recipe fulltext index
+
+Revision ID: 3c1f0b7a9d52
+Revises: 47b6f6e4dfc2
+Create Date: 2026-10-16 09:12:31.402117
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3c1f0b7a9d52"
+down_revision = "47b6f6e4dfc2"
+branch_labels = None
+depends_on = None
+
+# The DDL of tymenu.fulltext at this revision, so that the migration
+# doesn't change with the code of the application
+SQLITE_UPGRADE = [
+    (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING fts5("
+        "title, ingredients, keywords, instructions, content='recipe', content_rowid='id')"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_ai AFTER INSERT ON recipe BEGIN "
+        "INSERT INTO recipe_fts(rowid, title, ingredients, keywords, instructions) "
+        "VALUES (new.id, new.title, new.ingredients, new.keywords, new.instructions); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_ad AFTER DELETE ON recipe BEGIN "
+        "INSERT INTO recipe_fts(recipe_fts, rowid, title, ingredients, keywords, instructions) "
+        "VALUES ('delete', old.id, old.title, old.ingredients, old.keywords, old.instructions); END"
+    ),
+    (
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_au AFTER UPDATE ON recipe BEGIN "
+        "INSERT INTO recipe_fts(recipe_fts, rowid, title, ingredients, keywords, instructions) "
+        "VALUES ('delete', old.id, old.title, old.ingredients, old.keywords, old.instructions); "
+        "INSERT INTO recipe_fts(rowid, title, ingredients, keywords, instructions) "
+        "VALUES (new.id, new.title, new.ingredients, new.keywords, new.instructions); END"
+    ),
+    # Index the existing recipes as well
+    "INSERT INTO recipe_fts(recipe_fts) VALUES ('rebuild')",
+]
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS recipe_fts_au",
+    "DROP TRIGGER IF EXISTS recipe_fts_ad",
+    "DROP TRIGGER IF EXISTS recipe_fts_ai",
+    "DROP TABLE IF EXISTS recipe_fts",
+]
+MYSQL_UPGRADE = [
+    (
+        "CREATE FULLTEXT INDEX ix_recipe_fulltext ON recipe "
+        "(title, ingredients, keywords, instructions)"
+    )
+]
+MYSQL_DOWNGRADE = ["DROP INDEX ix_recipe_fulltext ON recipe"]
+
+
+def _execute(statements):
+    connection = op.get_bind()
+    for statement in statements.get(connection.dialect.name, []):
+        connection.exec_driver_sql(statement)
+
+
+def upgrade():
+    # SQLite: FTS5 table + sync triggers, MySQL: FULLTEXT index.
+    _execute({"sqlite": SQLITE_UPGRADE, "mysql": MYSQL_UPGRADE})
+
+
+def downgrade():
+    _execute({"sqlite": SQLITE_DOWNGRADE, "mysql": MYSQL_DOWNGRADE})
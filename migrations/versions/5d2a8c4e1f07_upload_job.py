@@ -0,0 +1,51 @@
+"""upload job
+
+Revision ID: 5d2a8c4e1f07
+Revises: 3c1f0b7a9d52
+Create Date: 2026-10-16 11:02:47.518203
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5d2a8c4e1f07"
+down_revision = "3c1f0b7a9d52"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "upload_job",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("recipe_id", sa.Integer(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("spool_path", sa.String(length=255), nullable=True),
+        sa.Column("error", sa.String(length=255), nullable=True),
+        sa.Column("timestamp", sa.DateTime(), nullable=True),
+        sa.Column("last_updated", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["recipe_id"],
+            ["recipe.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("upload_job", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_upload_job_recipe_id"), ["recipe_id"], unique=False)
+        batch_op.create_index(batch_op.f("ix_upload_job_status"), ["status"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("upload_job", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_upload_job_status"))
+        batch_op.drop_index(batch_op.f("ix_upload_job_recipe_id"))
+
+    op.drop_table("upload_job")
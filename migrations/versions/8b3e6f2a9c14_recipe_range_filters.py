@@ -0,0 +1,58 @@
+"""recipe range filters
+
+Revision ID: 8b3e6f2a9c14
+Revises: 5d2a8c4e1f07
+Create Date: 2026-10-16 14:21:09.337412
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "8b3e6f2a9c14"
+down_revision = "5d2a8c4e1f07"
+branch_labels = None
+depends_on = None
+
+# KcalType.PER_PERSON
+PER_PERSON = 1
+
+
+def upgrade():
+    with op.batch_alter_table("recipe", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("kcal_per_person", sa.Float(), nullable=True))
+        batch_op.create_index(
+            batch_op.f("ix_recipe_kcal_per_person"), ["kcal_per_person"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_recipe_cooking_time_min"), ["cooking_time_min"], unique=False
+        )
+        batch_op.create_index(batch_op.f("ix_recipe_protein_gram"), ["protein_gram"], unique=False)
+
+    # Fill in the kcal per person of the existing recipes, as Recipe.on_save does
+    recipe = sa.table(
+        "recipe",
+        sa.column("kcal", sa.Float),
+        sa.column("kcal_type", sa.Integer),
+        sa.column("servings", sa.Integer),
+        sa.column("kcal_per_person", sa.Float),
+    )
+    op.execute(
+        recipe.update().values(
+            kcal_per_person=sa.case(
+                (recipe.c.kcal_type == PER_PERSON, recipe.c.kcal),
+                (recipe.c.servings > 0, recipe.c.kcal / recipe.c.servings),
+                else_=None,
+            )
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("recipe", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_recipe_protein_gram"))
+        batch_op.drop_index(batch_op.f("ix_recipe_cooking_time_min"))
+        batch_op.drop_index(batch_op.f("ix_recipe_kcal_per_person"))
+        batch_op.drop_column("kcal_per_person")
@@ -0,0 +1,27 @@
+"""menu plan last updated
+
+Revision ID: a7c2d9e4b316
+Revises: e4a17c3b5d90
+Create Date: 2026-10-16 17:05:41.226093
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "a7c2d9e4b316"
+down_revision = "e4a17c3b5d90"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("menu_plan", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("last_updated", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("menu_plan", schema=None) as batch_op:
+        batch_op.drop_column("last_updated")
@@ -0,0 +1,27 @@
+"""user version
+
+Revision ID: c3f8a1d6e297
+Revises: a7c2d9e4b316
+Create Date: 2026-10-17 09:12:58.640217
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "c3f8a1d6e297"
+down_revision = "a7c2d9e4b316"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.drop_column("version")
@@ -0,0 +1,214 @@
+"""recipe keyword and ingredient terms
+
+Revision ID: e4a17c3b5d90
+Revises: 8b3e6f2a9c14
+Create Date: 2026-10-16 15:48:12.904618
+
+"""
+from __future__ import annotations
+
+import re
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = "e4a17c3b5d90"
+down_revision = "8b3e6f2a9c14"
+branch_labels = None
+depends_on = None
+
+# A copy of the parser in tymenu.terms at this revision, so that the backfill
+# doesn't change with the code of the application
+MAX_TERM_LENGTH = 64
+BATCH_SIZE = 500
+# Binary on MySQL, so names which only differ by accents are different terms
+TERM_NAME_TYPE = sa.String(length=MAX_TERM_LENGTH).with_variant(
+    mysql.VARCHAR(MAX_TERM_LENGTH, charset="utf8mb4", collation="utf8mb4_bin"), "mysql"
+)
+
+_LETTERS_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_KEYWORD_SEPARATOR_RE = re.compile(r"[,;\n]")
+STOP_WORDS = frozenset(
+    {
+        "and",
+        "or",
+        "of",
+        "with",
+        "to",
+        "the",
+        "for",
+        "some",
+        "lots",
+        "dl",
+        "ml",
+        "cl",
+        "kg",
+        "tsp",
+        "tbsp",
+        "cup",
+        "pinch",
+        "pcs",
+    }
+)
+
+
+def normalize(word):
+    word = word.lower()
+    if len(word) > 4 and word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif len(word) > 4 and word.endswith("oes"):
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    if len(word) > 4 and word.endswith("ie"):
+        word = word[:-2] + "y"
+    return word
+
+
+def parse_keywords(text):
+    keywords = set()
+    for phrase in _KEYWORD_SEPARATOR_RE.split(text or ""):
+        keyword = " ".join(normalize(word) for word in _WORD_RE.findall(phrase))
+        if keyword:
+            keywords.add(keyword[:MAX_TERM_LENGTH])
+    return keywords
+
+
+def parse_ingredients(text):
+    ingredients = set()
+    for word in _LETTERS_RE.findall(text or ""):
+        word = normalize(word)
+        if len(word) > 1 and word not in STOP_WORDS:
+            ingredients.add(word[:MAX_TERM_LENGTH])
+    return ingredients
+
+
+recipe = sa.table(
+    "recipe",
+    sa.column("id", sa.Integer),
+    sa.column("keywords", sa.Text),
+    sa.column("ingredients", sa.Text),
+)
+
+
+def term_tables(name):
+    terms = sa.table(name, sa.column("id", sa.Integer), sa.column("name", sa.String))
+    links = sa.table(
+        f"recipe_{name}", sa.column("recipe_id", sa.Integer), sa.column(f"{name}_id", sa.Integer)
+    )
+    return terms, links
+
+
+def backfill_terms(connection):
+    """Link the existing recipes to their terms"""
+    indexes = [
+        (*term_tables("keyword"), "keywords", parse_keywords),
+        (*term_tables("ingredient"), "ingredients", parse_ingredients),
+    ]
+    ids = {terms.name: {} for terms, _, _, _ in indexes}
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(recipe.c.id, recipe.c.keywords, recipe.c.ingredients)
+            .where(recipe.c.id > last_id)
+            .order_by(recipe.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        for terms, links, column, parse in indexes:
+            names = {row.id: parse(getattr(row, column)) for row in rows}
+            term_ids = ids[terms.name]
+            # The tables are new, so the terms are only added here
+            missing = sorted(set().union(*names.values()) - term_ids.keys())
+            if missing:
+                connection.execute(terms.insert(), [{"name": name} for name in missing])
+                for start in range(0, len(missing), BATCH_SIZE):
+                    chunk = missing[start : start + BATCH_SIZE]
+                    term_ids.update(
+                        connection.execute(
+                            sa.select(terms.c.name, terms.c.id).where(terms.c.name.in_(chunk))
+                        ).all()
+                    )
+            link_rows = [
+                {"recipe_id": recipe_id, f"{terms.name}_id": term_ids[name]}
+                for recipe_id, recipe_names in names.items()
+                for name in recipe_names
+            ]
+            if link_rows:
+                connection.execute(links.insert(), link_rows)
+
+
+def upgrade():
+    op.create_table(
+        "ingredient",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", TERM_NAME_TYPE, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_table(
+        "keyword",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", TERM_NAME_TYPE, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_table(
+        "recipe_ingredient",
+        sa.Column("recipe_id", sa.Integer(), nullable=False),
+        sa.Column("ingredient_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["ingredient_id"],
+            ["ingredient.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["recipe_id"],
+            ["recipe.id"],
+        ),
+        sa.PrimaryKeyConstraint("recipe_id", "ingredient_id"),
+    )
+    with op.batch_alter_table("recipe_ingredient", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_recipe_ingredient_ingredient_id_recipe_id",
+            ["ingredient_id", "recipe_id"],
+            unique=False,
+        )
+
+    op.create_table(
+        "recipe_keyword",
+        sa.Column("recipe_id", sa.Integer(), nullable=False),
+        sa.Column("keyword_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["keyword_id"],
+            ["keyword.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["recipe_id"],
+            ["recipe.id"],
+        ),
+        sa.PrimaryKeyConstraint("recipe_id", "keyword_id"),
+    )
+    with op.batch_alter_table("recipe_keyword", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_recipe_keyword_keyword_id_recipe_id", ["keyword_id", "recipe_id"], unique=False
+        )
+
+    backfill_terms(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table("recipe_keyword", schema=None) as batch_op:
+        batch_op.drop_index("ix_recipe_keyword_keyword_id_recipe_id")
+
+    op.drop_table("recipe_keyword")
+    with op.batch_alter_table("recipe_ingredient", schema=None) as batch_op:
+        batch_op.drop_index("ix_recipe_ingredient_ingredient_id_recipe_id")
+
+    op.drop_table("recipe_ingredient")
+    op.drop_table("keyword")
+    op.drop_table("ingredient")
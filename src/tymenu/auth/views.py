@@ -5,9 +5,10 @@ import logging
 from flask import flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required, login_user, logout_user
 
-from tymenu.email import send_email
+from tymenu.email import EmailQueueFull, send_email
 from tymenu.models import User
 from tymenu.resources import get_db
+from tymenu.user_cache import invalidate_user
 
 from . import forms
 
@@ -103,6 +104,7 @@ def change_password():
             current_user.password = form.password.data
             db.session.add(current_user)
             db.session.commit()
+            invalidate_user(current_user)
             flash("Your password has been updated.")
             return redirect(url_for("main.index"))
         else:
@@ -119,13 +121,18 @@ def password_reset_request():
         user = User.query.filter_by(email=form.email.data.lower()).first()
         if user:
             token = user.generate_reset_token()
-            send_email(
-                user.email,
-                "Reset Your TyMenu Password",
-                "auth/email/reset_password",
-                user=user,
-                token=token,
-            )
+            try:
+                send_email(
+                    user.email,
+                    "Reset Your TyMenu Password",
+                    "auth/email/reset_password",
+                    user=user,
+                    token=token,
+                )
+            except EmailQueueFull:
+                logger.error("Email queue is full, reset email to %s not sent.", user.email)
+                flash("Too many emails are waiting to be sent. Please try again later.")
+                return render_template("auth/reset_password.html", form=form)
         flash("An email with instructions to reset your password has been sent to you.")
         return redirect(url_for("auth.login"))
     return render_template("auth/reset_password.html", form=form)
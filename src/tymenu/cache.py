@@ -0,0 +1,167 @@
+"""Cache of rendered HTML fragments.
+
+Fragments are stored under a key together with a version, e.g. the time
+the underlying row was last updated. A fragment is only returned if its
+version matches the requested version, so stale entries are never served
+even if an invalidation is missed."""
+from __future__ import annotations
+
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+from pathlib import Path
+import tempfile
+import threading
+from typing import Callable
+
+from flask import Flask, current_app
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """Storage of (version, value) pairs by key."""
+
+    def get(self, key: str) -> tuple[str, str] | None:
+        raise NotImplementedError
+
+    def set(self, key: str, version: str, value: str) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    """Cache which stores nothing"""
+
+    def get(self, key: str) -> tuple[str, str] | None:
+        return None
+
+    def set(self, key: str, version: str, value: str) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache, local to each worker process"""
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._data: OrderedDict[str, tuple[str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[str, str] | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, version: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class FileSystemCache(CacheBackend):
+    """Cache with one file per key in a directory, which can be shared
+    between the worker processes. Files are replaced atomically, so readers
+    never see a partially written entry."""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.directory / f"{name}.html"
+
+    def get(self, key: str) -> tuple[str, str] | None:
+        try:
+            content = self._path(key).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        version, _, value = content.partition("\n")
+        return version, value
+
+    def set(self, key: str, version: str, value: str) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(f"{version}\n{value}")
+            os.replace(tmp, self._path(key))
+        except OSError as exc:
+            logger.warning("Failed to write cache entry %s: %s", key, exc)
+            Path(tmp).unlink(missing_ok=True)
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        for path in self.directory.glob("*.html"):
+            path.unlink(missing_ok=True)
+
+
+def make_backend(config) -> CacheBackend:
+    kind = (config.get("TYMENU_FRAGMENT_CACHE") or "none").lower()
+    if kind == "memory":
+        return MemoryCache(config.get("TYMENU_FRAGMENT_CACHE_SIZE", 512))
+    if kind == "filesystem":
+        return FileSystemCache(config["TYMENU_FRAGMENT_CACHE_DIR"])
+    if kind == "none":
+        return NullCache()
+    raise ValueError(f"Unknown fragment cache: {kind}. Available caches: memory, filesystem, none")
+
+
+class FragmentCache:
+    """Flask extension for the fragment cache, with the backend chosen by
+    the ``TYMENU_FRAGMENT_CACHE`` config."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions["fragment_cache"] = make_backend(app.config)
+
+    @property
+    def backend(self) -> CacheBackend:
+        return current_app.extensions["fragment_cache"]
+
+    def get_or_render(self, key: str, version: str, render: Callable[[], str]) -> str:
+        """Get the fragment from the cache, or render and store it
+        if it is missing or of another version."""
+        entry = self.backend.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = render()
+        self.backend.set(key, version, value)
+        return value
+
+    def invalidate(self, key: str) -> None:
+        self.backend.delete(key)
+
+    def clear(self) -> None:
+        self.backend.clear()
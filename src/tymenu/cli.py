@@ -0,0 +1,279 @@
+"""Maintenance commands for the flask CLI"""
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import logging
+import multiprocessing
+import time
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+import sqlalchemy as sql
+
+from .models import MenuPlan, Recipe
+from .profiling.profiler import HEADER, make_token
+from .rendering import MarkdownRenderer, get_renderer
+from .resources import get_db, get_upload_queue
+from .sqlite_tuning import run_maintenance, sqlite_engines
+from .timestamp import get_now_utc
+from .transfer import export_data, import_data, open_file
+
+logger = logging.getLogger(__name__)
+
+# Markdown source column -> rendered HTML column
+RENDERED_COLUMNS = {
+    "recipe": (
+        Recipe,
+        {
+            "ingredients": "ingredients_html",
+            "instructions": "instructions_html",
+            "background": "background_html",
+        },
+    ),
+    "menu_plan": (MenuPlan, {"description": "description_html"}),
+}
+
+
+# The renderer of a worker process, made by _init_worker
+_worker_renderer: MarkdownRenderer | None = None
+
+
+def _init_worker(cache_size: int) -> None:
+    global _worker_renderer
+    _worker_renderer = MarkdownRenderer(cache_size)
+
+
+def render_rows(
+    rows: list[tuple[int, dict[str, str | None]]], renderer: MarkdownRenderer | None = None
+) -> list[dict]:
+    """Render the Markdown of a batch of rows. In the worker processes, which
+    have no app, the renderer is the one of the worker."""
+    renderer = renderer or _worker_renderer
+    rendered = []
+    for row_id, sources in rows:
+        values = {"id": row_id}
+        for html_column, source in sources.items():
+            values[html_column] = "" if source is None else renderer.render(source)
+        rendered.append(values)
+    return rendered
+
+
+def _iter_batches(model, columns: dict[str, str], batch_size: int, start_id: int):
+    """Read the Markdown sources in batches of increasing id, so only one batch
+    is held in memory at a time, and an interrupted run can continue from the
+    last id."""
+    db = get_db()
+    source_cols = [getattr(model, name) for name in columns]
+    last_id = start_id
+    while True:
+        stmt = (
+            sql.select(model.id, *source_cols)
+            .where(model.id > last_id)
+            .order_by(model.id)
+            .limit(batch_size)
+        )
+        rows = db.session.execute(stmt).all()
+        if not rows:
+            return
+        batch = [
+            (row[0], {html: source for html, source in zip(columns.values(), row[1:])})
+            for row in rows
+        ]
+        last_id = rows[-1][0]
+        yield batch
+
+
+def _render_batches(batches, workers: int):
+    """Render the batches in order, in a pool of processes if ``workers > 1``.
+    Only a few batches are in flight at a time, to keep the memory bounded.
+
+    The workers are spawned, so they don't depend on inheriting the app
+    context, threads or database connections of this process."""
+    if workers <= 1:
+        yield from map(functools.partial(render_rows, renderer=get_renderer()), batches)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(current_app.config["TYMENU_MARKDOWN_CACHE_SIZE"],),
+    ) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(render_rows, batch))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def rerender_table(table: str, batch_size: int, workers: int, start_id: int = 0) -> int:
+    """Re-render the stored HTML of a table, returns the number of rows updated."""
+    db = get_db()
+    model, columns = RENDERED_COLUMNS[table]
+    total = db.session.execute(
+        sql.select(sql.func.count()).select_from(model).where(model.id > start_id)
+    ).scalar_one()
+    click.echo(f"Re-rendering {total} rows of {table} from id {start_id}.")
+
+    batches = _iter_batches(model, columns, batch_size, start_id)
+    done = 0
+    for rendered in _render_batches(batches, workers):
+        # A new version, for the cached fragments and the ETags of the pages
+        now = get_now_utc()
+        for values in rendered:
+            values["last_updated"] = now
+        db.session.execute(sql.update(model), rendered)
+        db.session.commit()
+        done += len(rendered)
+        click.echo(f"{table}: {done}/{total} rows, last id {rendered[-1]['id']}")
+    return done
+
+
+@click.command("rerender-html")
+@click.option(
+    "--table",
+    type=click.Choice(["all", *RENDERED_COLUMNS]),
+    default="all",
+    show_default=True,
+)
+@click.option("--batch-size", default=500, show_default=True, help="Rows per batch.")
+@click.option("--workers", default=1, show_default=True, help="Number of rendering processes.")
+@click.option(
+    "--start-id",
+    default=0,
+    show_default=True,
+    help="Only re-render rows with a larger id, to resume an interrupted run of one --table.",
+)
+@with_appcontext
+def rerender_html(table: str, batch_size: int, workers: int, start_id: int) -> None:
+    """Re-render the stored HTML columns from their Markdown source."""
+    if start_id and table == "all":
+        # The ids of the tables are unrelated
+        raise click.UsageError("--start-id needs a single --table.")
+    tables = list(RENDERED_COLUMNS) if table == "all" else [table]
+    for name in tables:
+        rerender_table(name, batch_size=batch_size, workers=workers, start_id=start_id)
+
+
+@click.command("resume-uploads")
+@with_appcontext
+def resume_uploads() -> None:
+    """Send the images of the upload jobs which are still pending, or stale."""
+    queue = get_upload_queue()
+    click.echo(f"Resuming {queue.resume()} upload jobs.")
+    queue.shutdown()
+
+
+@click.command("export-data")
+@click.argument("path", default="-")
+@click.option("--yield-per", default=1000, show_default=True, help="Rows read at a time.")
+@with_appcontext
+def export_data_command(path: str, yield_per: int) -> None:
+    """Export the users, recipes and menu plans as NDJSON to PATH, or stdout.
+    The file is compressed if PATH ends with .gz."""
+    start = time.perf_counter()
+    with open_file(path, "w") as file:
+        counts = export_data(file, yield_per=yield_per)
+    summary = ", ".join(f"{count} {table}" for table, count in counts.items())
+    click.echo(f"Exported {summary} in {time.perf_counter() - start:.1f} s.", err=True)
+
+
+@click.command("import-data")
+@click.argument("path")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows inserted at a time.")
+@with_appcontext
+def import_data_command(path: str, batch_size: int) -> None:
+    """Import an NDJSON export from PATH, or stdin if PATH is "-"."""
+    start = time.perf_counter()
+    with open_file(path, "r") as file:
+        try:
+            counts, skipped = import_data(file, batch_size=batch_size)
+        except (ValueError, sql.exc.IntegrityError) as exc:
+            raise click.ClickException(f"Import failed, nothing was imported: {exc}") from exc
+    summary = ", ".join(f"{count} {table}" for table, count in counts.items())
+    click.echo(f"Imported {summary} in {time.perf_counter() - start:.1f} s.")
+    for table, count in skipped.items():
+        if count:
+            click.echo(f"Skipped {count} {table} which exist already.")
+
+
+@click.command("seed")
+@click.option("--users", default=100, show_default=True, help="Number of users.")
+@click.option("--recipes", default=1000, show_default=True, help="Number of recipes.")
+@click.option("--plans", default=100, show_default=True, help="Number of menu plans.")
+@click.option("--chunk-size", default=5000, show_default=True, help="Rows inserted at a time.")
+@click.option("--seed", type=int, default=None, help="Random seed, for repeatable data.")
+@with_appcontext
+def seed(users: int, recipes: int, plans: int, chunk_size: int, seed: int | None) -> None:
+    """Fill the database with fake users, recipes and menu plans."""
+    try:
+        from .fake import PASSWORD, BulkSeeder
+    except ImportError as exc:
+        raise click.ClickException(f"Seeding needs the dev requirements: {exc}") from exc
+
+    start = time.perf_counter()
+    ids = BulkSeeder(chunk_size=chunk_size, seed=seed).seed(users, recipes, plans)
+    summary = ", ".join(f"{len(new_ids)} {name}" for name, new_ids in ids.items())
+    click.echo(f"Created {summary} in {time.perf_counter() - start:.1f} s.")
+    click.echo(f"The password of the users is '{PASSWORD}'.")
+
+
+@click.command("profile-token")
+@with_appcontext
+def profile_token() -> None:
+    """Print a token for the X-Tymenu-Profile header, which profiles the request."""
+    max_age = current_app.config["TYMENU_PROFILING_TOKEN_MAX_AGE"]
+    if not current_app.config["TYMENU_PROFILING"]:
+        click.echo("Warning: profiling is disabled, set TYMENU_PROFILING to enable it.", err=True)
+    click.echo(f"{HEADER}: {make_token(current_app.config['SECRET_KEY'])}")
+    click.echo(f"The token is valid for {max_age} seconds.", err=True)
+
+
+@click.command("sqlite-maintenance")
+@click.option(
+    "--mode",
+    type=click.Choice(["PASSIVE", "FULL", "RESTART", "TRUNCATE"], case_sensitive=False),
+    default="TRUNCATE",
+    show_default=True,
+    help="Checkpoint mode.",
+)
+@with_appcontext
+def sqlite_maintenance(mode: str) -> None:
+    """Checkpoint the WAL of the SQLite databases, and optimize them."""
+    engines = sqlite_engines(current_app._get_current_object())
+    if not engines:
+        click.echo("No SQLite databases.")
+    for engine in engines:
+        result = run_maintenance(engine, mode.upper())
+        state = "blocked by a reader or writer" if result.busy else "done"
+        click.echo(
+            f"{engine.url.database}: checkpoint {state}, "
+            f"{result.checkpointed_pages}/{result.wal_pages} WAL pages."
+        )
+
+
+@click.command("reindex-terms")
+@click.option("--batch-size", default=1000, show_default=True, help="Recipes read at a time.")
+@with_appcontext
+def reindex_terms(batch_size: int) -> None:
+    """Link all recipes to their keyword and ingredient terms again."""
+    db = get_db()
+    start = time.perf_counter()
+    count = Recipe.reindex_terms(db.session.connection(), batch_size=batch_size)
+    db.session.commit()
+    click.echo(f"Indexed the terms of {count} recipes in {time.perf_counter() - start:.1f} s.")
+
+
+def register_commands(app: Flask) -> None:
+    app.cli.add_command(rerender_html)
+    app.cli.add_command(resume_uploads)
+    app.cli.add_command(export_data_command)
+    app.cli.add_command(import_data_command)
+    app.cli.add_command(seed)
+    app.cli.add_command(profile_token)
+    app.cli.add_command(sqlite_maintenance)
+    app.cli.add_command(reindex_terms)
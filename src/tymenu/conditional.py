@@ -0,0 +1,71 @@
+"""Conditional GET support, so unchanged pages are answered with
+304 Not Modified without rendering the template."""
+from __future__ import annotations
+
+import datetime
+import hashlib
+from typing import Callable
+
+from flask import Response, make_response, request, session
+from flask_login import current_user
+
+
+def page_etag(*parts) -> str:
+    """Strong ETag of a page, from the version of the data it shows.
+    The page also depends on the logged in user and their role (e.g. the
+    edit links), and on the app version."""
+    from . import __version__
+
+    user = None
+    if current_user.is_authenticated:
+        role = current_user.role
+        user = (current_user.get_id(), role.name if role else None, role and role.permissions)
+    key = repr((__version__, user, *parts)).encode("utf-8")
+    return hashlib.sha256(key).hexdigest()[:32]
+
+
+def _as_utc(timestamp: datetime.datetime) -> datetime.datetime:
+    # Timestamps are stored in UTC, but the database may drop the time zone.
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp.replace(microsecond=0)
+
+
+def is_not_modified(etag: str, last_modified: datetime.datetime | None) -> bool:
+    """Check the request's validators. If-None-Match takes precedence
+    over If-Modified-Since."""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if session.get("_flashes"):
+        # Flashed messages have to be rendered
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified is not None:
+        return _as_utc(last_modified) <= request.if_modified_since
+    return False
+
+
+def add_validators(
+    response: Response, etag: str, last_modified: datetime.datetime | None
+) -> Response:
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _as_utc(last_modified)
+    # Always revalidate, and don't share the user specific pages in caches.
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    response.vary.add("Cookie")
+    return response
+
+
+def conditional_render(
+    etag: str, last_modified: datetime.datetime | None, render: Callable[[], str]
+) -> Response:
+    """Answer with 304 Not Modified if the client has the current version
+    of the page, otherwise render it."""
+    if is_not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = make_response(render())
+    return add_validators(response, etag, last_modified)
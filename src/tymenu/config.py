@@ -20,15 +20,96 @@ else:
     DEV_URL_KEY = "DEV_DATABASE_URL"
 
 
+def env_flag(name: str, default: bool) -> bool:
+    """Read a boolean flag from the environment."""
+    if name not in os.environ:
+        return default
+    return os.environ[name].lower() in ["true", "on", "1"]
+
+
+def engine_options() -> dict:
+    """Options of the database engines. The pool size options are only set if
+    given, as e.g. in-memory SQLite databases don't have a sized pool."""
+    options = {
+        "pool_recycle": int(os.environ.get("SQLALCHEMY_POOL_RECYCLE", -1)),
+        # Test each connection before use, to replace connections closed by the server
+        "pool_pre_ping": env_flag("SQLALCHEMY_POOL_PRE_PING", False),
+    }
+    for option, name, convert in [
+        ("pool_size", "SQLALCHEMY_POOL_SIZE", int),
+        ("max_overflow", "SQLALCHEMY_MAX_OVERFLOW", int),
+        # Seconds to wait for a connection when the pool is exhausted
+        ("pool_timeout", "SQLALCHEMY_POOL_TIMEOUT", float),
+    ]:
+        if name in os.environ:
+            options[option] = convert(os.environ[name])
+    return options
+
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY") or "unpiloted-flashcard-reuse-swoop"
     TYMENU_ADMIN = os.environ.get("TYMENU_ADMIN")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        "pool_recycle": int(os.environ.get("SQLALCHEMY_POOL_RECYCLE", -1)),
-    }
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options()
+    # Pragmas of the connections to SQLite files, see tymenu.sqlite_tuning
+    TYMENU_SQLITE_TUNING = env_flag("TYMENU_SQLITE_TUNING", True)
+    TYMENU_SQLITE_JOURNAL_MODE = os.environ.get("TYMENU_SQLITE_JOURNAL_MODE", "WAL")
+    TYMENU_SQLITE_SYNCHRONOUS = os.environ.get("TYMENU_SQLITE_SYNCHRONOUS", "NORMAL")
+    TYMENU_SQLITE_MMAP_SIZE = int(os.environ.get("TYMENU_SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    # Negative: in KiB, positive: in pages
+    TYMENU_SQLITE_CACHE_SIZE = int(os.environ.get("TYMENU_SQLITE_CACHE_SIZE", -64 * 1024))
+    TYMENU_SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("TYMENU_SQLITE_BUSY_TIMEOUT_MS", 5000))
+    # Seconds between checkpoints of the WAL, 0 disables them
+    TYMENU_SQLITE_MAINTENANCE_INTERVAL = float(
+        os.environ.get("TYMENU_SQLITE_MAINTENANCE_INTERVAL", 300)
+    )
+    TYMENU_SQLITE_CHECKPOINT_MODE = os.environ.get("TYMENU_SQLITE_CHECKPOINT_MODE", "PASSIVE")
+    # Comma separated URLs of read replicas, used by the read-only views
+    TYMENU_REPLICA_URLS = os.environ.get("TYMENU_REPLICA_URLS", "")
+    # Seconds a user reads from the primary after writing, for the replicas to catch up
+    TYMENU_READ_AFTER_WRITE_SECONDS = float(os.environ.get("TYMENU_READ_AFTER_WRITE_SECONDS", 5))
     TYMENU_RECIPES_PER_PAGE = int(os.environ.get("TYMENU_RECIPES_PER_PAGE", 5))
     TYMENU_USERS_PER_PAGE = int(os.environ.get("TYMENU_USERS_PER_PAGE", 10))
+    # Use the full-text index for searches (SQLite FTS5 / MySQL FULLTEXT)
+    TYMENU_FULLTEXT_SEARCH = env_flag("TYMENU_FULLTEXT_SEARCH", True)
+    # Seconds to reuse the total number of search results between pages
+    TYMENU_COUNT_CACHE_TTL = float(os.environ.get("TYMENU_COUNT_CACHE_TTL", 60))
+    # Stop counting search results beyond this, and show the total as an estimate
+    TYMENU_SEARCH_COUNT_LIMIT = int(os.environ.get("TYMENU_SEARCH_COUNT_LIMIT", 1000))
+    # Cache of rendered recipe pages: "memory" (per process), "filesystem" or "none"
+    TYMENU_FRAGMENT_CACHE = os.environ.get("TYMENU_FRAGMENT_CACHE", "memory")
+    TYMENU_FRAGMENT_CACHE_SIZE = int(os.environ.get("TYMENU_FRAGMENT_CACHE_SIZE", 512))
+    TYMENU_FRAGMENT_CACHE_DIR = os.environ.get("TYMENU_FRAGMENT_CACHE_DIR") or os.path.join(
+        basedir, "cache", "fragments"
+    )
+    # Rendered Markdown texts kept in memory, 0 disables the cache
+    TYMENU_MARKDOWN_CACHE_SIZE = int(os.environ.get("TYMENU_MARKDOWN_CACHE_SIZE", 2048))
+    # Count and time the SQL queries of each request, and log the slow queries
+    TYMENU_SQL_INSTRUMENTATION = env_flag("TYMENU_SQL_INSTRUMENTATION", True)
+    TYMENU_SLOW_QUERY_MS = float(os.environ.get("TYMENU_SLOW_QUERY_MS", 200))
+    # Prometheus metrics on /metrics, protected by the token if it is set. With multiple
+    # worker processes, point the metrics dir to a directory shared by the workers,
+    # emptied at startup.
+    TYMENU_METRICS = env_flag("TYMENU_METRICS", False)
+    TYMENU_METRICS_TOKEN = os.environ.get("TYMENU_METRICS_TOKEN")
+    TYMENU_METRICS_DIR = os.environ.get("TYMENU_METRICS_DIR") or os.environ.get(
+        "PROMETHEUS_MULTIPROC_DIR"
+    )
+    # Profile the requests with a valid X-Tymenu-Profile header (see `flask profile-token`),
+    # and a random fraction of the other requests. Mode: "sampler" or "cprofile".
+    TYMENU_PROFILING = env_flag("TYMENU_PROFILING", False)
+    TYMENU_PROFILING_RATE = float(os.environ.get("TYMENU_PROFILING_RATE", 0))
+    TYMENU_PROFILING_MODE = os.environ.get("TYMENU_PROFILING_MODE", "sampler").lower()
+    TYMENU_PROFILING_INTERVAL_MS = float(os.environ.get("TYMENU_PROFILING_INTERVAL_MS", 1))
+    TYMENU_PROFILING_DIR = os.environ.get("TYMENU_PROFILING_DIR") or os.path.join(
+        basedir, "cache", "profiles"
+    )
+    # Profiles kept in the directory, and listed on /admin/profiles
+    TYMENU_PROFILING_KEEP = int(os.environ.get("TYMENU_PROFILING_KEEP", 200))
+    TYMENU_PROFILING_LIST = int(os.environ.get("TYMENU_PROFILING_LIST", 50))
+    TYMENU_PROFILING_TOKEN_MAX_AGE = int(os.environ.get("TYMENU_PROFILING_TOKEN_MAX_AGE", 3600))
+    # Seconds the logged in users are cached, 0 disables the cache.
+    TYMENU_USER_CACHE_TTL = float(os.environ.get("TYMENU_USER_CACHE_TTL", 30))
 
     MAIL_SERVER = os.environ.get("MAIL_SERVER", "smtp.googlemail.com")
     MAIL_PORT = int(os.environ.get("MAIL_PORT", "587"))
@@ -37,8 +118,35 @@ class Config:
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
     TYMENU_MAIL_SUBJECT_PREFIX = "[TyMenu]"
     TYMENU_MAIL_SENDER = "TyMenu Admin <tymenuapp@gmail.com>"
+    # Emails are sent by a pool of worker threads, 0 sends them in the request.
+    TYMENU_MAIL_WORKERS = int(os.environ.get("TYMENU_MAIL_WORKERS", 2))
+    TYMENU_MAIL_QUEUE_SIZE = int(os.environ.get("TYMENU_MAIL_QUEUE_SIZE", 100))
+    TYMENU_MAIL_ENQUEUE_TIMEOUT = float(os.environ.get("TYMENU_MAIL_ENQUEUE_TIMEOUT", 5))
+    # Messages sent over one SMTP connection, which is closed when idle
+    TYMENU_MAIL_BATCH_SIZE = int(os.environ.get("TYMENU_MAIL_BATCH_SIZE", 50))
+    TYMENU_MAIL_IDLE_TIMEOUT = float(os.environ.get("TYMENU_MAIL_IDLE_TIMEOUT", 10))
+    TYMENU_MAIL_RETRIES = int(os.environ.get("TYMENU_MAIL_RETRIES", 3))
+    TYMENU_MAIL_RETRY_DELAY = float(os.environ.get("TYMENU_MAIL_RETRY_DELAY", 1))
 
     IMGBB_API_KEY = os.environ.get("IMGBB_API_KEY")
+    IMGBB_UPLOAD_URL = os.environ.get("IMGBB_UPLOAD_URL", "https://api.imgbb.com/1/upload")
+    IMGBB_CONNECT_TIMEOUT = float(os.environ.get("IMGBB_CONNECT_TIMEOUT", 5))
+    IMGBB_READ_TIMEOUT = float(os.environ.get("IMGBB_READ_TIMEOUT", 60))
+    # Where the recipe images are stored: "imgbb" or "local"
+    TYMENU_IMAGE_STORE = os.environ.get("TYMENU_IMAGE_STORE", "imgbb").lower()
+    TYMENU_IMAGE_DIR = os.environ.get("TYMENU_IMAGE_DIR") or os.path.join(basedir, "images")
+    # Base URL of the local images, e.g. a CDN in front of the image dir
+    TYMENU_IMAGE_URL = os.environ.get("TYMENU_IMAGE_URL", "/images")
+    # Widths of the resized local images
+    TYMENU_IMAGE_THUMB_WIDTH = int(os.environ.get("TYMENU_IMAGE_THUMB_WIDTH", 200))
+    TYMENU_IMAGE_DISPLAY_WIDTH = int(os.environ.get("TYMENU_IMAGE_DISPLAY_WIDTH", 1200))
+    # Images are uploaded by a pool of worker threads, 0 uploads them in the request.
+    TYMENU_UPLOAD_WORKERS = int(os.environ.get("TYMENU_UPLOAD_WORKERS", 2))
+    TYMENU_UPLOAD_SPOOL_DIR = os.environ.get("TYMENU_UPLOAD_SPOOL_DIR") or os.path.join(
+        basedir, "cache", "uploads"
+    )
+    # Running jobs are resumed after this long, as their process is gone
+    TYMENU_UPLOAD_STALE_SECONDS = float(os.environ.get("TYMENU_UPLOAD_STALE_SECONDS", 600))
     MAX_CONTENT_LENGTH = os.environ.get(
         "MAX_CONTENT_LENGTH", 16 * 1000 * 1000
     )  # Default 16 megabytes
@@ -57,6 +165,7 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    TYMENU_METRICS = True
     SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URL") or "sqlite://"
 
 
@@ -7,6 +7,7 @@ from flask_login import current_user
 from flask_login.utils import login_required as login_required
 
 from .models import Permission
+from .routing import read_only as read_only
 
 
 def permission_required(permission):
@@ -1,22 +1,23 @@
 from __future__ import annotations
 
-from threading import Thread
-
 from flask import current_app, render_template
 from flask_mail import Message
 
-from tymenu.resources import get_mail
+from tymenu.email_dispatcher import EmailQueueFull
+from tymenu.resources import get_email_dispatcher
+
+__all__ = ["EmailQueueFull", "email_queue_depth", "send_email"]
 
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail = get_mail()
-        mail.send(msg)
+def email_queue_depth() -> int:
+    """Number of emails which are not sent yet"""
+    return get_email_dispatcher().depth
 
 
-def send_email(to, subject, template, **kwargs):
-    app = current_app._get_current_object()
-    config = app.config
+def send_email(to, subject, template, **kwargs) -> None:
+    """Queue an email for sending in the background.
+    Raises EmailQueueFull if too many emails are waiting."""
+    config = current_app.config
     msg = Message(
         f"{config['TYMENU_MAIL_SUBJECT_PREFIX']} {subject}",
         sender=config["TYMENU_MAIL_SENDER"],
@@ -24,6 +25,4 @@ def send_email(to, subject, template, **kwargs):
     )
     msg.body = render_template(f"{template}.txt", **kwargs)
     msg.html = render_template(f"{template}.html", **kwargs)
-    thr = Thread(target=send_async_email, args=[app, msg])
-    thr.start()
-    return thr
+    get_email_dispatcher().submit(msg)
@@ -0,0 +1,181 @@
+"""Background delivery of emails.
+
+Messages are put on a bounded queue, and a fixed number of worker threads
+deliver them. A worker keeps its SMTP connection open while there are
+messages to send, so a burst of emails shares a few connections instead of
+opening one per message. The connection is closed after
+``TYMENU_MAIL_BATCH_SIZE`` messages, or when the queue has been empty for
+``TYMENU_MAIL_IDLE_TIMEOUT`` seconds.
+
+When the queue is full, :meth:`EmailDispatcher.submit` waits up to
+``TYMENU_MAIL_ENQUEUE_TIMEOUT`` seconds and then raises :class:`EmailQueueFull`.
+Temporary failures are retried with an exponential backoff, and the queued
+messages are delivered before the process exits."""
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import smtplib
+import threading
+import time
+
+from flask import Flask, current_app
+from flask_mail import Message
+
+from .process_local import ProcessLocal
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION = "tymenu_email_dispatcher"
+_STOP = object()
+
+
+class EmailQueueFull(RuntimeError):
+    """The email could not be queued, because too many emails are waiting."""
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Errors which will not go away by sending the message again"""
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class _Dispatcher:
+    """The queue and worker threads of an app"""
+
+    def __init__(self, app: Flask):
+        config = app.config
+        self.app = app
+        self.workers = config["TYMENU_MAIL_WORKERS"]
+        self.batch_size = config["TYMENU_MAIL_BATCH_SIZE"]
+        self.idle_timeout = config["TYMENU_MAIL_IDLE_TIMEOUT"]
+        self.enqueue_timeout = config["TYMENU_MAIL_ENQUEUE_TIMEOUT"]
+        self.retries = config["TYMENU_MAIL_RETRIES"]
+        self.retry_delay = config["TYMENU_MAIL_RETRY_DELAY"]
+        self.queue: queue.Queue = queue.Queue(maxsize=config["TYMENU_MAIL_QUEUE_SIZE"])
+        self.sent = 0
+        self.failed = 0
+        self._threads = ProcessLocal(self._start)
+
+    @property
+    def depth(self) -> int:
+        """Number of emails which are not delivered yet"""
+        return self.queue.unfinished_tasks
+
+    def _start(self) -> list[threading.Thread]:
+        threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"email-worker-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        atexit.register(self.shutdown)
+        return threads
+
+    def submit(self, msg: Message) -> None:
+        if self.workers <= 0:
+            # No workers, e.g. in a script, so send it right away.
+            self.app.extensions["mail"].send(msg)
+            return
+        self._threads.get()
+        try:
+            self.queue.put(msg, timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise EmailQueueFull(f"{self.queue.maxsize} emails are waiting to be sent.") from None
+
+    def shutdown(self, timeout: float | None = 30.0) -> None:
+        """Deliver the queued emails and stop the workers"""
+        threads = self._threads.reset() or []
+        for _ in threads:
+            self.queue.put(_STOP)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def _run(self) -> None:
+        with self.app.app_context():
+            connection = None
+            try:
+                while True:
+                    try:
+                        msg = self.queue.get(timeout=self.idle_timeout if connection else None)
+                    except queue.Empty:
+                        connection = self._close(connection)
+                        continue
+                    try:
+                        if msg is _STOP:
+                            return
+                        connection = self._deliver(connection, msg)
+                        if connection is not None and connection.num_emails >= self.batch_size:
+                            connection = self._close(connection)
+                    finally:
+                        self.queue.task_done()
+            finally:
+                self._close(connection)
+
+    def _open(self):
+        connection = current_app.extensions["mail"].connect()
+        # Opens the SMTP connection, which is closed by _close
+        return connection.__enter__()
+
+    @staticmethod
+    def _close(connection) -> None:
+        if connection is None:
+            return None
+        try:
+            connection.__exit__(None, None, None)
+        except (smtplib.SMTPException, OSError):
+            # E.g. the server closed it already
+            pass
+        return None
+
+    def _deliver(self, connection, msg: Message):
+        """Send the message, and return the connection if it can be reused"""
+        for attempt in range(self.retries + 1):
+            try:
+                if connection is None:
+                    connection = self._open()
+                connection.send(msg)
+                self.sent += 1
+                return connection
+            except (smtplib.SMTPException, OSError) as error:
+                connection = self._close(connection)
+                if attempt == self.retries or _is_permanent(error):
+                    self.failed += 1
+                    logger.error(
+                        "Failed to send email %r to %s: %s", msg.subject, msg.recipients, error
+                    )
+                    return None
+                delay = self.retry_delay * 2**attempt
+                logger.warning(
+                    "Failed to send email %r, retrying in %.1f s: %s", msg.subject, delay, error
+                )
+                time.sleep(delay)
+            except Exception:
+                self.failed += 1
+                logger.exception("Failed to send email %r", msg.subject)
+                return self._close(connection)
+        return None
+
+
+class EmailDispatcher:
+    """Flask extension sending the emails from a pool of worker threads.
+    With ``TYMENU_MAIL_WORKERS = 0`` the emails are sent in the calling thread."""
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions[_EXTENSION] = _Dispatcher(app)
+
+    @staticmethod
+    def _dispatcher() -> _Dispatcher:
+        return current_app.extensions[_EXTENSION]
+
+    def submit(self, msg: Message) -> None:
+        self._dispatcher().submit(msg)
+
+    def shutdown(self, timeout: float | None = 30.0) -> None:
+        self._dispatcher().shutdown(timeout)
+
+    @property
+    def depth(self) -> int:
+        return self._dispatcher().depth
@@ -24,13 +24,23 @@ def create_app(config_name: str) -> Flask:
 
     # Blueprints
     from .auth import auth_blueprint
+    from .images import images_blueprint
     from .main import main_blueprint
     from .menu import menu_blueprint
+    from .metrics import metrics_blueprint
     from .plan import plan_blueprint
+    from .profiling import profiling_blueprint
 
     app.register_blueprint(main_blueprint)
     app.register_blueprint(auth_blueprint)
     app.register_blueprint(menu_blueprint)
     app.register_blueprint(plan_blueprint)
+    app.register_blueprint(metrics_blueprint)
+    app.register_blueprint(images_blueprint)
+    app.register_blueprint(profiling_blueprint)
+
+    from .cli import register_commands
+
+    register_commands(app)
 
     return app
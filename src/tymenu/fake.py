@@ -1,47 +1,270 @@
+"""Fake data for development and load testing.
+
+The :class:`BulkSeeder` generates the rows in memory, one chunk at a time,
+and inserts each chunk with a single executemany. It does not query the
+database per row: the new rows get the ids after the largest existing id,
+names are made unique with that id, and all users share one password hash.
+Faker is slow, so it is only used for a pool of words and Markdown texts,
+which the rows are made from. The Markdown of the pool is rendered once, so
+the HTML columns are filled without rendering every row."""
 from __future__ import annotations
 
-from random import randint
+import datetime
+import hashlib
+import random
+from typing import Callable, Iterable, Iterator, Sequence
 
 from faker import Faker
-from sqlalchemy.exc import IntegrityError
+import sqlalchemy as sql
+from werkzeug.security import generate_password_hash
 
-from .models import Recipe, User
+from .models import (
+    KcalType,
+    MenuPlan,
+    MenuPlanInstance,
+    MenuPlanItem,
+    Recipe,
+    Role,
+    User,
+    kcal_per_person,
+)
 from .resources import get_db
+from .timestamp import get_now_utc
+from .utils import clean_markdown_to_html
 
+PASSWORD = "password"
 
-def users(count=100):
-    db = get_db()
-    fake = Faker()
-    i = 0
-    while i < count:
-        u = User(
-            email=fake.email(),
-            username=fake.user_name(),
-            password="password",
-            member_since=fake.past_date(),
-        )
-        db.session.add(u)
-        try:
+_UNITS = ("g", "kg", "dl", "l", "tsp", "tbsp", "pcs", "cloves", "cans")
+
+
+class _TextPool:
+    """Words and rendered Markdown texts, which the fake rows are made from"""
+
+    def __init__(self, fake: Faker, rng: random.Random, size: int = 200):
+        self.rng = rng
+        self.words = list(dict.fromkeys(fake.words(nb=1000)))
+        self.first_names = [fake.first_name().lower() for _ in range(size)]
+        self.domains = [fake.free_email_domain() for _ in range(20)]
+        self.urls = [fake.url() for _ in range(size)]
+        self.ingredients = [self._render(self._ingredients()) for _ in range(size)]
+        self.instructions = [self._render(self._instructions(fake)) for _ in range(size)]
+        self.backgrounds = [self._render(self._background(fake)) for _ in range(size)]
+
+    @staticmethod
+    def _render(markdown: str) -> tuple[str, str]:
+        return markdown, clean_markdown_to_html(markdown)
+
+    def _ingredients(self) -> str:
+        lines = []
+        for _ in range(self.rng.randint(3, 12)):
+            amount = self.rng.choice((1, 2, 3, 4, 50, 100, 200, 250, 500))
+            unit = self.rng.choice(_UNITS)
+            lines.append(f"* {amount} {unit} {' '.join(self.rng.sample(self.words, 2))}")
+        return "\n".join(lines)
+
+    def _instructions(self, fake: Faker) -> str:
+        steps = []
+        for i in range(1, self.rng.randint(3, 8) + 1):
+            sentence = fake.sentence(nb_words=12)
+            if self.rng.random() < 0.3:
+                word = self.rng.choice(self.words)
+                sentence = f"{sentence} Use **{word}**."
+            steps.append(f"{i}. {sentence}")
+        return "\n".join(steps)
+
+    def _background(self, fake: Faker) -> str:
+        paragraphs = fake.paragraphs(nb=self.rng.randint(1, 3))
+        paragraphs[0] = f"*{self.rng.choice(self.words).capitalize()}*: {paragraphs[0]}"
+        return "\n\n".join(paragraphs)
+
+    def title(self, unique: int) -> str:
+        words = " ".join(self.rng.sample(self.words, self.rng.randint(1, 3)))
+        return f"{words.capitalize()} {unique}"[:64]
+
+
+class BulkSeeder:
+    def __init__(self, chunk_size: int = 5000, seed: int | None = None):
+        self.chunk_size = chunk_size
+        self.rng = random.Random(seed)
+        self.fake = Faker()
+        if seed is not None:
+            self.fake.seed_instance(seed)
+        self._pool: _TextPool | None = None
+        self._password_hash: str | None = None
+        self.now = get_now_utc().replace(tzinfo=None)
+
+    @property
+    def pool(self) -> _TextPool:
+        if self._pool is None:
+            self._pool = _TextPool(self.fake, self.rng)
+        return self._pool
+
+    def _past(self, days: int = 3 * 365) -> datetime.datetime:
+        return self.now - datetime.timedelta(seconds=self.rng.randint(0, days * 24 * 3600))
+
+    @staticmethod
+    def _next_id(model) -> int:
+        db = get_db()
+        return (db.session.execute(sql.select(sql.func.max(model.id))).scalar() or 0) + 1
+
+    def _insert(
+        self,
+        model,
+        count: int,
+        make_row: Callable[[int], dict],
+        on_chunk: Callable[[list[dict]], None] | None = None,
+    ) -> range:
+        """Insert ``count`` rows after the largest existing id, returns the new ids."""
+        first_id = self._next_id(model)
+        ids = range(first_id, first_id + count)
+        self._insert_rows(model, (make_row(row_id) for row_id in ids), on_chunk)
+        return ids
+
+    def _insert_rows(
+        self,
+        model,
+        rows: Iterable[dict],
+        on_chunk: Callable[[list[dict]], None] | None = None,
+    ) -> None:
+        """Insert the rows in chunks, so only one chunk is held in memory.
+        ``on_chunk`` is called with each inserted chunk, in its transaction."""
+        db = get_db()
+
+        def _commit(chunk: list[dict]) -> None:
+            db.session.execute(sql.insert(model.__table__), chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
             db.session.commit()
-        except IntegrityError:
-            db.session.rollback()
-        else:
-            i += 1
 
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                _commit(chunk)
+                chunk = []
+        if chunk:
+            _commit(chunk)
 
-def recipes(count=100):
-    db = get_db()
-    fake = Faker()
-    user_count = User.query.count()
-    for i in range(count):
-        u = User.query.offset(randint(0, user_count - 1)).first()
-        p = Recipe(
-            title=fake.text(),
-            ingredients=fake.text(),
-            instructions=fake.text(),
-            keywords=fake.text(),
-            source=fake.text(),
-            author=u,
+    def users(self, count: int) -> range:
+        pool = self.pool
+        if self._password_hash is None:
+            self._password_hash = generate_password_hash(PASSWORD)
+        default_role = Role.query.filter_by(default=True).first()
+        role_id = default_role.id if default_role is not None else None
+
+        def make_row(row_id: int) -> dict:
+            username = f"{self.rng.choice(pool.first_names)}{row_id}"
+            email = f"{username}@{self.rng.choice(pool.domains)}"
+            return {
+                "id": row_id,
+                "email": email,
+                "username": username,
+                "role_id": role_id,
+                "password_hash": self._password_hash,
+                "avatar_hash": hashlib.md5(email.encode("utf-8")).hexdigest(),
+                "member_since": self._past(),
+            }
+
+        return self._insert(User, count, make_row)
+
+    def recipes(self, count: int, author_ids: Sequence[int] | None = None) -> range:
+        pool = self.pool
+        if author_ids is None:
+            author_ids = get_db().session.scalars(sql.select(User.id)).all()
+        if not author_ids:
+            raise ValueError("There are no users to be the authors of the recipes.")
+
+        def make_row(row_id: int) -> dict:
+            ingredients, ingredients_html = self.rng.choice(pool.ingredients)
+            instructions, instructions_html = self.rng.choice(pool.instructions)
+            background, background_html = self.rng.choice(pool.backgrounds)
+            servings = self.rng.randint(1, 8)
+            kcal = round(self.rng.uniform(200, 900) * servings)
+            protein, carb, fat = (round(self.rng.uniform(5, 80), 1) for _ in range(3))
+            return {
+                "id": row_id,
+                "author_id": self.rng.choice(author_ids),
+                "timestamp": self._past(),
+                "title": pool.title(row_id),
+                "ingredients": ingredients,
+                "ingredients_html": ingredients_html,
+                "instructions": instructions,
+                "instructions_html": instructions_html,
+                "background": background,
+                "background_html": background_html,
+                "keywords": ", ".join(self.rng.sample(pool.words, 3)),
+                "source": self.rng.choice(pool.urls) if self.rng.random() < 0.1 else "",
+                "servings": servings,
+                "kcal": kcal,
+                "kcal_type": int(KcalType.TOTAL),
+                # Core inserts skip the ORM events which compute it
+                "kcal_per_person": kcal_per_person(kcal, KcalType.TOTAL, servings),
+                "protein_gram": protein,
+                "carb_gram": carb,
+                "fat_gram": fat,
+                "cooking_time_min": self.rng.choice((10, 15, 20, 30, 45, 60, 90, 120)),
+            }
+
+        def index_terms(chunk: list[dict]) -> None:
+            # Core inserts skip the mapper events which link the terms
+            Recipe.index_terms(get_db().session.connection(), chunk, replace=False)
+
+        return self._insert(Recipe, count, make_row, index_terms)
+
+    def menu_plans(
+        self,
+        count: int,
+        recipe_ids: Sequence[int],
+        author_ids: Sequence[int],
+        items: tuple[int, int] = (3, 10),
+    ) -> range:
+        """Menu plans, each with a random number of recipes and one instance."""
+        pool = self.pool
+        if not recipe_ids:
+            raise ValueError("There are no recipes for the menu plans.")
+
+        def make_row(row_id: int) -> dict:
+            description, description_html = self.rng.choice(pool.backgrounds)
+            return {
+                "id": row_id,
+                "title": f"Plan {row_id}: {self.rng.choice(pool.words)}",
+                "description": description,
+                "description_html": description_html,
+                "added_by_id": self.rng.choice(author_ids) if author_ids else None,
+                "timestamp": self._past(),
+            }
+
+        plan_ids = self._insert(MenuPlan, count, make_row)
+        item_rows = self._plan_items(plan_ids, recipe_ids, items)
+        self._insert_rows(MenuPlanItem, item_rows)
+        instance_rows = (
+            {"menu_plan_id": plan_id, "date": self._past().date()} for plan_id in plan_ids
         )
-        db.session.add(p)
-    db.session.commit()
+        self._insert_rows(MenuPlanInstance, instance_rows)
+        return plan_ids
+
+    def _plan_items(
+        self, plan_ids: Iterable[int], recipe_ids: Sequence[int], items: tuple[int, int]
+    ) -> Iterator[dict]:
+        for plan_id in plan_ids:
+            for day in range(self.rng.randint(*items)):
+                yield {
+                    "menu_plan_id": plan_id,
+                    "recipe_id": self.rng.choice(recipe_ids),
+                    "day": day,
+                    "days_leftover": self.rng.choice((0, 0, 1, 2)),
+                }
+
+    def seed(self, users: int, recipes: int, plans: int) -> dict[str, range]:
+        user_ids = self.users(users)
+        recipe_ids = self.recipes(recipes, author_ids=user_ids or None)
+        plan_ids = self.menu_plans(plans, recipe_ids, user_ids) if plans else range(0)
+        return {"users": user_ids, "recipes": recipe_ids, "plans": plan_ids}
+
+
+def users(count=100):
+    BulkSeeder().users(count)
+
+
+def recipes(count=100):
+    BulkSeeder().recipes(count)
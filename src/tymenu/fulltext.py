@@ -0,0 +1,180 @@
+"""Full-text index for recipe searches.
+
+On SQLite the index is an FTS5 virtual table (``recipe_fts``) using the recipe
+table as external content, kept in sync by triggers. On MySQL it is an InnoDB
+FULLTEXT index on the recipe table itself. Other dialects fall back
+to substring matching."""
+
+from __future__ import annotations
+
+import logging
+import re
+
+from flask import current_app
+import sqlalchemy as sql
+from sqlalchemy.dialects import mysql
+
+from .resources import get_db
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "recipe_fts"
+FTS_COLUMNS = ("title", "ingredients", "keywords", "instructions")
+# Relative weight of a match in each of the indexed columns, used for ranking.
+FIELD_WEIGHTS = {"title": 10.0, "keywords": 5.0, "ingredients": 2.0, "instructions": 1.0}
+MYSQL_INDEX_NAME = "ix_recipe_fulltext"
+SUPPORTED_DIALECTS = ("sqlite", "mysql")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+fts_table = sql.table(FTS_TABLE, sql.column("rowid"), *(sql.column(c) for c in FTS_COLUMNS))
+
+
+def _sqlite_ddl(table: str = "recipe") -> list[str]:
+    cols = ", ".join(FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+    ]
+
+
+def _sqlite_drop_ddl() -> list[str]:
+    return [
+        f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+        f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+        f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+        f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    ]
+
+
+def create_fulltext_index(connection, rebuild: bool = False) -> None:
+    """Create the full-text index on the connection's database.
+    With ``rebuild``, existing recipes are (re)indexed as well."""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for stmt in _sqlite_ddl():
+            connection.exec_driver_sql(stmt)
+        if rebuild:
+            connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    elif dialect == "mysql":
+        cols = ", ".join(FTS_COLUMNS)
+        connection.exec_driver_sql(f"CREATE FULLTEXT INDEX {MYSQL_INDEX_NAME} ON recipe ({cols})")
+    else:
+        logger.info("No full-text index available for dialect %s.", dialect)
+
+
+def drop_fulltext_index(connection) -> None:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for stmt in _sqlite_drop_ddl():
+            connection.exec_driver_sql(stmt)
+    elif dialect == "mysql":
+        connection.exec_driver_sql(f"DROP INDEX {MYSQL_INDEX_NAME} ON recipe")
+
+
+def register_fulltext_ddl(table: sql.Table) -> None:
+    """Keep the full-text index in step with ``db.create_all`` and ``db.drop_all``."""
+
+    def _after_create(target, connection, **kw):
+        create_fulltext_index(connection)
+
+    def _before_drop(target, connection, **kw):
+        # The MySQL index is dropped along with the table.
+        if connection.dialect.name == "sqlite":
+            drop_fulltext_index(connection)
+
+    sql.event.listen(table, "after_create", _after_create)
+    sql.event.listen(table, "before_drop", _before_drop)
+
+
+def fulltext_dialect() -> str | None:
+    """Name of the dialect if full-text search is enabled for the
+    current app, otherwise None."""
+    if not current_app.config.get("TYMENU_FULLTEXT_SEARCH", True):
+        return None
+    dialect = get_db().engine.dialect.name
+    if dialect in SUPPORTED_DIALECTS:
+        return dialect
+    return None
+
+
+def tokenize(string: str) -> list[str]:
+    return _TOKEN_RE.findall(string.lower())
+
+
+def sqlite_match_expression(tokens: list[str]) -> str:
+    """Every token must be present, each token matched as a prefix."""
+    return " ".join(f'"{tok}"*' for tok in tokens)
+
+
+def mysql_match_expression(tokens: list[str]) -> str:
+    return " ".join(f"+{tok}*" for tok in tokens)
+
+
+def mysql_match(string: str):
+    """MATCH ... AGAINST expression on the FULLTEXT index, which is a column
+    expression, so it can be used both as a filter and to order by relevance."""
+    cols = [sql.literal_column(f"recipe.{c}") for c in FTS_COLUMNS]
+    expr = mysql_match_expression(tokenize(string))
+    return mysql.match(*cols, against=expr).in_boolean_mode()
+
+
+def _fts_match(tokens: list[str]):
+    return sql.literal_column(FTS_TABLE).op("MATCH")(sqlite_match_expression(tokens))
+
+
+def match_recipe_ids(id_column, string: str, dialect: str):
+    """Build a filter clause selecting recipes matching all the words
+    in the string. Returns None if the string contains no words."""
+    tokens = tokenize(string)
+    if not tokens:
+        return None
+    if dialect == "sqlite":
+        return id_column.in_(sql.select(fts_table.c.rowid).where(_fts_match(tokens)))
+    if dialect == "mysql":
+        return mysql_match(string)
+    raise ValueError(f"Full-text search is not supported for dialect {dialect}")
+
+
+def ranked_recipes(query, id_column, string: str, dialect: str):
+    """Filter the query on the full-text index, and order it by relevance,
+    best match first. Returns None if the string contains no words.
+
+    On SQLite the matches are scored with BM25 using ``FIELD_WEIGHTS``.
+    MySQL uses the relevance of the boolean mode FULLTEXT search, which
+    does not support per-column weights on a combined index."""
+    tokens = tokenize(string)
+    if not tokens:
+        return None
+    if dialect == "sqlite":
+        weights = [FIELD_WEIGHTS[c] for c in FTS_COLUMNS]
+        # bm25() is negative, the lower the better.
+        score = sql.func.bm25(sql.literal_column(FTS_TABLE), *weights)
+        return (
+            query.join(fts_table, fts_table.c.rowid == id_column)
+            .filter(_fts_match(tokens))
+            .order_by(score)
+        )
+    if dialect == "mysql":
+        match = mysql_match(string)
+        return query.filter(match).order_by(match.desc())
+    raise ValueError(f"Full-text search is not supported for dialect {dialect}")
+
+
+def substring_score(columns: dict, string: str):
+    """Weighted score for substring matches, for databases without a full-text index."""
+    return sum(
+        sql.case((column.contains(string), FIELD_WEIGHTS[name]), else_=0.0)
+        for name, column in columns.items()
+    )
@@ -0,0 +1,141 @@
+"""Storage of the recipe images.
+
+The backend is chosen by ``TYMENU_IMAGE_STORE``:
+
+* ``imgbb``: the images are uploaded to imgbb, which also makes the thumbnail.
+* ``local``: the images are stored in ``TYMENU_IMAGE_DIR``, and a resized copy
+  is made for the thumbnail and the displayed image, which are
+  ``TYMENU_IMAGE_THUMB_WIDTH`` and ``TYMENU_IMAGE_DISPLAY_WIDTH`` wide. The file names
+  contain a hash of the image, so the files never change and can be cached
+  forever. They are served from ``TYMENU_IMAGE_URL``, which is the app's own
+  ``/images`` route by default, but can be a CDN or object store bucket to
+  which the directory is synced.
+
+Resizing needs Pillow, which is an optional dependency. Without it, the
+original image is used in all sizes."""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+import tempfile
+from typing import BinaryIO
+
+from .imgbb import ImageUrlData, ImgbbClient, UploadError
+
+try:
+    from PIL import Image, UnidentifiedImageError
+except ImportError:  # pragma: no cover
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class ImageStore:
+    def save(self, fileobj: BinaryIO, extension: str) -> ImageUrlData:
+        """Store the image, and return its URL's. Raises UploadError on failure."""
+        raise NotImplementedError
+
+
+class ImgbbStore(ImageStore):
+    def __init__(self, client: ImgbbClient):
+        self.client = client
+
+    def save(self, fileobj: BinaryIO, extension: str) -> ImageUrlData:
+        return self.client.upload(fileobj)
+
+
+class LocalImageStore(ImageStore):
+    def __init__(self, directory: str | Path, base_url: str, thumb_width: int, display_width: int):
+        self.directory = Path(directory)
+        self.base_url = base_url.rstrip("/")
+        self.thumb_width = thumb_width
+        self.display_width = display_width
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    def _store_original(self, fileobj: BinaryIO, extension: str) -> tuple[str, str, bool]:
+        """Copy the image into the directory, named by its hash. Returns the
+        hash, the file name and whether the image was not stored already."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as tmp:
+            try:
+                for chunk in iter(lambda: fileobj.read(_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            except BaseException:
+                os.remove(tmp.name)
+                raise
+        content_hash = digest.hexdigest()[:20]
+        name = f"{content_hash}.{extension}"
+        new = not (self.directory / name).exists()
+        # The same image may be stored already, then it is replaced by an identical copy.
+        os.replace(tmp.name, self.directory / name)
+        return content_hash, name, new
+
+    def _resize(self, content_hash: str, name: str, extension: str, new: bool) -> dict[int, str]:
+        """Make the resized copies, returns the file name for each width.
+        On failure, the files stored for this image are removed again."""
+        widths = sorted({self.thumb_width, self.display_width})
+        if Image is None:
+            logger.warning("Pillow is not installed, so the images are not resized.")
+            return {width: name for width in widths}
+        names = {}
+        created = [self.directory / name] if new else []
+        try:
+            with Image.open(self.directory / name) as image:
+                image_format = image.format
+                for width in widths:
+                    if image.width <= width:
+                        names[width] = name
+                        continue
+                    names[width] = f"{content_hash}_{width}.{extension}"
+                    path = self.directory / names[width]
+                    if path.exists():
+                        # Made for an earlier upload of the same image
+                        continue
+                    height = max(1, round(image.height * width / image.width))
+                    resized = image.resize((width, height), Image.LANCZOS)
+                    created.append(path)
+                    resized.save(path, format=image_format)
+        except (UnidentifiedImageError, OSError) as exc:
+            logger.error("Failed to resize image %s: %s", name, exc)
+            for path in created:
+                path.unlink(missing_ok=True)
+            raise UploadError("The file is not a valid image.") from exc
+        return names
+
+    def save(self, fileobj: BinaryIO, extension: str) -> ImageUrlData:
+        extension = extension.lower().lstrip(".")
+        try:
+            content_hash, name, new = self._store_original(fileobj, extension)
+        except OSError as exc:
+            logger.error("Failed to store image: %s", exc)
+            raise UploadError("The image could not be stored.") from exc
+        names = self._resize(content_hash, name, extension, new)
+        return ImageUrlData(
+            display_url=self.url(names[self.display_width]),
+            # The images are only deleted together with the directory
+            delete_url="",
+            thumb_url=self.url(names[self.thumb_width]),
+            url_viewer=self.url(name),
+        )
+
+
+def make_store(config) -> ImageStore:
+    kind = (config.get("TYMENU_IMAGE_STORE") or "imgbb").lower()
+    if kind == "imgbb":
+        return ImgbbStore(ImgbbClient.from_config(config))
+    if kind == "local":
+        return LocalImageStore(
+            config["TYMENU_IMAGE_DIR"],
+            config["TYMENU_IMAGE_URL"],
+            int(config["TYMENU_IMAGE_THUMB_WIDTH"]),
+            int(config["TYMENU_IMAGE_DISPLAY_WIDTH"]),
+        )
+    raise ValueError(f"Unknown image store: {kind}. Available stores: imgbb, local")
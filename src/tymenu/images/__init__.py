@@ -0,0 +1,4 @@
+from .blueprint import images_blueprint
+from . import views
+
+__all__ = ["images_blueprint", "views"]
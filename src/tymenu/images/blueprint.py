@@ -0,0 +1,5 @@
+from __future__ import annotations
+
+from flask import Blueprint
+
+images_blueprint = Blueprint("images", __name__)
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from flask import abort, current_app, send_from_directory
+
+from .blueprint import images_blueprint as images
+
+# The file names contain a hash of the image, so they never change.
+MAX_AGE = 365 * 24 * 60 * 60
+
+
+@images.route("/images/<path:filename>")
+def serve_image(filename: str):
+    if current_app.config["TYMENU_IMAGE_STORE"] != "local":
+        abort(404)
+    response = send_from_directory(
+        current_app.config["TYMENU_IMAGE_DIR"], filename, max_age=MAX_AGE, conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
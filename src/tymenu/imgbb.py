@@ -0,0 +1,181 @@
+"""Client for uploading images to imgbb.
+
+The image is sent as a streamed multipart/form-data body. It is read from
+the file and base64 encoded one chunk at a time, so the memory used by an
+upload does not depend on the size of the image. The client does not use
+the Flask app or request, so uploads can also run in a background thread."""
+from __future__ import annotations
+
+import base64
+import logging
+import os
+import threading
+from typing import BinaryIO, Iterator, NamedTuple
+import uuid
+
+from flask import current_app
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+IMGBB_UPLOAD_URL = "https://api.imgbb.com/1/upload"
+# Multiple of 3 bytes, so the chunks are encoded without padding.
+CHUNK_SIZE = 3 * 16 * 1024
+
+
+class ImageUrlData(NamedTuple):
+    display_url: str
+    delete_url: str
+    thumb_url: str
+    url_viewer: str
+
+
+class UploadError(Exception):
+    """The upload failed. The message can be shown to the user."""
+
+
+def _encoded_length(size: int) -> int:
+    return 4 * ((size + 2) // 3)
+
+
+def _encode_chunks(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    remainder = b""
+    while True:
+        data = fileobj.read(chunk_size)
+        if not data:
+            break
+        data = remainder + data
+        cut = len(data) - len(data) % 3
+        remainder = data[cut:]
+        if cut:
+            yield base64.b64encode(data[:cut])
+    if remainder:
+        yield base64.b64encode(remainder)
+
+
+class Base64MultipartBody:
+    """A multipart/form-data body with text fields and one base64 encoded
+    file field. It has a length, so it is sent with a Content-Length."""
+
+    def __init__(self, fields: dict[str, str], file_field: str, fileobj: BinaryIO, size: int):
+        self.boundary = uuid.uuid4().hex
+        self.fileobj = fileobj
+        self.size = size
+        head = b"".join(
+            self._part_header(name) + value.encode() + b"\r\n" for name, value in fields.items()
+        )
+        self._head = head + self._part_header(file_field)
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+    def _part_header(self, name: str) -> bytes:
+        return (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode()
+        )
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return len(self._head) + _encoded_length(self.size) + len(self._tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+        yield from _encode_chunks(self.fileobj)
+        yield self._tail
+
+
+_sessions: dict[int, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """HTTP session of the process, which keeps the connections to imgbb open"""
+    pid = os.getpid()
+    with _sessions_lock:
+        if pid not in _sessions:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            _sessions.clear()
+            _sessions[pid] = session
+        return _sessions[pid]
+
+
+def _error_message(response: requests.Response) -> str:
+    try:
+        error = response.json().get("error")
+    except ValueError:
+        error = None
+    if isinstance(error, dict) and error.get("message"):
+        return f"An error occured during upload: {error['message']}"
+    return "An error occured during upload."
+
+
+class ImgbbClient:
+    def __init__(
+        self,
+        api_key: str,
+        url: str = IMGBB_UPLOAD_URL,
+        timeout: tuple[float, float] = (5.0, 60.0),
+        session: requests.Session | None = None,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.session = session or get_session()
+
+    @classmethod
+    def from_config(cls, config) -> ImgbbClient:
+        if not config["IMGBB_API_KEY"]:
+            logger.warning("No API key for imgbb.")
+            raise UploadError("imgbb API key is not configured.")
+        return cls(
+            config["IMGBB_API_KEY"],
+            url=config["IMGBB_UPLOAD_URL"],
+            timeout=(config["IMGBB_CONNECT_TIMEOUT"], config["IMGBB_READ_TIMEOUT"]),
+        )
+
+    def upload(self, fileobj: BinaryIO) -> ImageUrlData:
+        """Upload the image, read from the current position of the file to the end."""
+        start = fileobj.tell()
+        size = fileobj.seek(0, os.SEEK_END) - start
+        fileobj.seek(start)
+        body = Base64MultipartBody({"key": self.api_key}, "image", fileobj, size)
+        try:
+            response = self.session.post(
+                self.url,
+                data=body,
+                headers={"Content-Type": body.content_type},
+                timeout=self.timeout,
+                allow_redirects=False,
+            )
+        except requests.RequestException as exc:
+            logger.error("Failed to upload to imgbb: %s", exc)
+            raise UploadError("Could not reach the image server.") from exc
+
+        if response.status_code != 200:
+            logger.error(
+                "Status code '%s', will not upload. Content: %s",
+                response.status_code,
+                response.content,
+            )
+            raise UploadError(_error_message(response))
+
+        try:
+            data = response.json()["data"]
+            return ImageUrlData(
+                display_url=data["display_url"],
+                delete_url=data["delete_url"],
+                thumb_url=data["thumb"]["url"],
+                url_viewer=data["url_viewer"],
+            )
+        except (ValueError, KeyError, TypeError) as exc:
+            logger.error("Unexpected response from imgbb: %s", response.content)
+            raise UploadError("No data was received.") from exc
+
+
+def get_client() -> ImgbbClient:
+    """Client configured by the current app"""
+    return ImgbbClient.from_config(current_app.config)
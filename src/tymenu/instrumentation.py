@@ -0,0 +1,116 @@
+"""Per-request SQL query counting and timing.
+
+Every request records the number of queries, the total time spent in the
+database and the slowest statement. They are reported in a ``Server-Timing``
+response header and a log line per request, and queries slower than
+``TYMENU_SLOW_QUERY_MS`` are logged as warnings."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+import logging
+import time
+
+from flask import Flask, Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_START_KEY = "tymenu_query_start"
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_time: float = 0.0
+    slowest_time: float = 0.0
+    slowest_statement: str | None = None
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+
+def get_query_stats() -> QueryStats | None:
+    """Query statistics of the current request, if it is instrumented"""
+    if not has_request_context():
+        return None
+    return g.get("_query_stats")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_START_KEY)
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    stats = get_query_stats()
+    if stats is None:
+        return
+    stats.record(statement, duration)
+    threshold = current_app.config.get("TYMENU_SLOW_QUERY_MS")
+    if threshold and duration * 1000 >= threshold:
+        logger.warning(
+            "Slow query (%.1f ms) in %s: %s", duration * 1000, request.endpoint, statement
+        )
+
+
+def _handle_error(context) -> None:
+    # The statement failed, so after_cursor_execute is not called
+    starts = context.connection.info.get(_START_KEY) if context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _listen_engine_events() -> None:
+    """Listen on all engines, once per process."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def _start_request() -> None:
+    g._query_stats = QueryStats()
+    g._request_start = time.perf_counter()
+
+
+def _finish_request(response: Response) -> Response:
+    stats = get_query_stats()
+    if stats is None:
+        return response
+    duration = time.perf_counter() - g._request_start
+    db_ms = stats.total_time * 1000
+    response.headers.add(
+        "Server-Timing",
+        f'db;dur={db_ms:.1f};desc="{stats.count} queries", app;dur={duration * 1000:.1f}',
+    )
+    logger.info(
+        "endpoint=%s method=%s status=%d duration_ms=%.1f queries=%d db_ms=%.1f slowest_ms=%.1f",
+        request.endpoint,
+        request.method,
+        response.status_code,
+        duration * 1000,
+        stats.count,
+        db_ms,
+        stats.slowest_time * 1000,
+    )
+    return response
+
+
+class QueryInstrumentation:
+    """Flask extension enabling the instrumentation, if
+    ``TYMENU_SQL_INSTRUMENTATION`` is set."""
+
+    def init_app(self, app: Flask) -> None:
+        if not app.config.get("TYMENU_SQL_INSTRUMENTATION"):
+            return
+        _listen_engine_events()
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
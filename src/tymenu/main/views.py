@@ -5,9 +5,11 @@ import logging
 from flask import abort, current_app, flash, redirect, render_template, request, url_for
 from sqlalchemy import exc
 
-from tymenu.decorators import login_required
+from tymenu.decorators import login_required, read_only
 from tymenu.models import Recipe, User
+from tymenu.pagination import paginate
 from tymenu.resources import get_db
+from tymenu.user_cache import invalidate_user
 
 from . import main_blueprint as main
 from .forms import ChangeUsernameForm
@@ -16,12 +18,15 @@ logger = logging.getLogger(__name__)
 
 
 @main.route("/")
+@read_only
 def index():
-    page = request.args.get("page", 1, type=int)
-    pagination = Recipe.query.order_by(Recipe.timestamp.desc()).paginate(
-        page=page,
+    # The feed shows no total, so the recipes are not counted
+    pagination = paginate(
+        Recipe.list_query(),
         per_page=current_app.config["TYMENU_RECIPES_PER_PAGE"],
-        error_out=False,
+        count=False,
+        keyset=(Recipe.timestamp, Recipe.id),
+        cursor=request.args.get("cursor"),
     )
     recipes = pagination.items
     return render_template("index.html", recipes=recipes, recipes_list_max=5, pagination=pagination)
@@ -42,11 +47,11 @@ def users():
 @main.route("/profile/<int:id>")
 def profile(id):
     user: User = User.query.get_or_404(id)
-    page = request.args.get("page", 1, type=int)
-    pagination = user.recipes.order_by(Recipe.timestamp.desc()).paginate(
-        page=page,
+    pagination = paginate(
+        user.recipes,
         per_page=5,
-        error_out=False,
+        keyset=(Recipe.timestamp, Recipe.id),
+        cursor=request.args.get("cursor"),
     )
     recipes = pagination.items
     return render_template(
@@ -85,6 +90,7 @@ def change_username(id):
             flash(f"Failed to change username: {e}")
             logger.error("Failed to change username for user %d. Error: %s", user.id, e)
         else:
+            invalidate_user(user)
             flash(f"Successfully changed username to {user.username}")
         return redirect(url_for(".profile", id=id))
 
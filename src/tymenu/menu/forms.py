@@ -9,7 +9,7 @@ from flask_wtf import FlaskForm
 from wtforms import DateField, FloatField, IntegerField, SelectField, StringField, SubmitField
 from wtforms.validators import DataRequired, InputRequired, NumberRange, Optional, ValidationError
 
-from tymenu.models import KcalType, Recipe
+from tymenu.models import RANGE_FILTERS, KcalType, Recipe
 from tymenu.timestamp import get_now_utc
 from tymenu.utils import label_is_required
 
@@ -109,8 +109,25 @@ class EditRecipeForm(RecipeForm):
 
 class SimpleSearch(FlaskForm):
     search_string = StringField("Search:")
+    max_kcal = FloatField("At most (kcal per person):", validators=[Optional(), NumberRange(min=0)])
+    min_kcal = FloatField(
+        "At least (kcal per person):", validators=[Optional(), NumberRange(min=0)]
+    )
+    max_time = FloatField(
+        "Cooking time at most (minutes):", validators=[Optional(), NumberRange(min=0)]
+    )
+    min_protein = FloatField("Protein at least (g):", validators=[Optional(), NumberRange(min=0)])
     submit = SubmitField("Submit")
 
+    def ranges(self) -> dict[str, float]:
+        """The range filters which are set, the fields are named as in RANGE_FILTERS"""
+        ranges = {}
+        for name in RANGE_FILTERS:
+            value = getattr(self, name).data
+            if value is not None:
+                ranges[name] = value
+        return ranges
+
 
 class PlannerAdder(FlaskForm):
     entrydate = DateField(
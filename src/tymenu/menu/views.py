@@ -1,18 +1,16 @@
 from __future__ import annotations
 
-import base64
 import logging
-import tempfile
-from typing import NamedTuple
 
-from flask import current_app, flash, redirect, render_template, request, url_for
-import requests
+from flask import current_app, flash, jsonify, redirect, render_template, request, url_for
+from flask_login import current_user
 from sqlalchemy.exc import IntegrityError
-from werkzeug.datastructures import FileStorage
 
-from tymenu.decorators import login_required, mod_required
-from tymenu.models import Recipe
-from tymenu.resources import get_db
+from tymenu.conditional import conditional_render, page_etag
+from tymenu.decorators import login_required, mod_required, read_only
+from tymenu.models import RANGE_FILTERS, Recipe, UploadJob, UploadStatus
+from tymenu.pagination import paginate
+from tymenu.resources import get_db, get_fragment_cache, get_upload_queue
 
 from .blueprint import menu_blueprint as menu
 from .forms import EditRecipeForm, RecipeForm, SimpleSearch
@@ -20,77 +18,23 @@ from .forms import EditRecipeForm, RecipeForm, SimpleSearch
 logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+SEARCH_SORT_OPTIONS = {"time": "Newest", "relevance": "Relevance"}
+SEARCH_FILTER_LABELS = {
+    "min_kcal": "at least {:g} kcal per person",
+    "max_kcal": "at most {:g} kcal per person",
+    "max_time": "cooking time at most {:g} min",
+    "min_protein": "protein at least {:g} g",
+}
 
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-class ImageUrlData(NamedTuple):
-    display_url: str
-    delete_url: str
-    thumb_url: str
-    url_viewer: str
-
-
 def redirect_recipe(recipe_id: int):
     return redirect(url_for("menu.view_recipe", recipe_id=recipe_id))
 
 
-def _do_upload_file(file: FileStorage) -> ImageUrlData | None:
-    """Upload the image file to img BB"""
-    config = current_app._get_current_object().config
-    api_key = config["IMGBB_API_KEY"]
-    if not api_key:
-        flash("imgbb API key is not configured.")
-        logger.warning("No API key for imgbb.")
-        return None
-
-    logger.info("Uploading file: %s", file.filename)
-    with tempfile.TemporaryFile() as dst:
-        file.save(dst)
-        dst.seek(0)
-        encoded = base64.b64encode(dst.read())
-
-    url = "https://api.imgbb.com/1/upload"
-    payload = {
-        "key": api_key,
-        "image": encoded,
-    }
-    res = requests.post(url, payload, allow_redirects=False)
-
-    if res.status_code != 200:
-        logger.error("Status code '%s', will not upload. Content: %s", res.status_code, res.content)
-        # Something happened
-        # Try to fetch the error message
-        json_response: dict = res.json()
-        error = json_response.get("error", None)
-        if isinstance(error, dict):
-            # Recover the error message
-            msg = error.get("message", "")
-            flash(f"An error occured during upload: {msg}")
-        else:
-            # Something else happened... ?
-            flash("An error occured during upload.")
-        return None
-    else:
-        logger.info("Retrieved payload: %s. As JSON: %s", res, res.json())
-
-    flash("Image was uploaded.")
-
-    # Retrieve the display URL
-    data = res.json().get("data", None)
-    if data is None:
-        flash("No data was received?")
-        logger.info("No data.")
-        return None
-    delete_url = data["delete_url"]
-    display_url = data["display_url"]
-    thumb_url = data["thumb"]["url"]
-    url_viewer = data["url_viewer"]
-    return ImageUrlData(display_url, delete_url, thumb_url, url_viewer)
-
-
 @menu.route("/upload/<int:recipe_id>", methods=["GET", "POST"])
 @login_required
 @mod_required
@@ -108,26 +52,33 @@ def upload_file(recipe_id: int):
             flash("No file was selected.")
             return redirect(request.url)
         if file and allowed_file(file.filename):
-            url_data = _do_upload_file(file)
-            if url_data is None:
-                # Something went wrong
-                return redirect_recipe(recipe_id)
-            recipe.img_display_url = url_data.display_url
-            recipe.img_delete_url = url_data.delete_url
-            recipe.img_thumbnail_url = url_data.thumb_url
-            recipe.img_url_viewer = url_data.url_viewer
-
-            db = get_db()
             try:
-                db.session.commit()
+                job = get_upload_queue().submit(recipe, file, current_user)
             except Exception as exc:
-                logger.error("An error occurred during commit: %s", exc)
-                db.session.rollback()
-                flash(f"An error occurred while creating the recipe: {exc}")
-            else:
-                logger.info("Comitted image URL's to recipe with ID %s", recipe.id)
-            return redirect_recipe(recipe_id)
-    return render_template("menu/upload_image.html", recipe_id=recipe_id)
+                logger.error("Failed to queue the upload: %s", exc)
+                flash(f"An error occurred during upload: {exc}")
+                return redirect_recipe(recipe_id)
+            if job.status == UploadStatus.DONE:
+                flash("Image was uploaded.")
+                return redirect_recipe(recipe_id)
+            if job.status == UploadStatus.FAILED:
+                flash(job.error)
+                return redirect_recipe(recipe_id)
+            # Still running, the page polls the status of the job.
+            return render_template("menu/upload_image.html", recipe_id=recipe_id, job=job)
+    return render_template("menu/upload_image.html", recipe_id=recipe_id, job=None)
+
+
+@menu.route("/upload/status/<int:job_id>")
+@login_required
+@mod_required
+def upload_status(job_id: int):
+    job: UploadJob = UploadJob.query.get_or_404(job_id)
+    status = {"id": job.id, "status": job.status, "error": job.error}
+    if job.status == UploadStatus.DONE:
+        status["recipe_url"] = url_for("menu.view_recipe", recipe_id=job.recipe_id)
+        status["thumbnail_url"] = job.recipe.img_thumbnail_url
+    return jsonify(status)
 
 
 @menu.route("/new_recipe", methods=["GET", "POST"])
@@ -174,31 +125,53 @@ def search():
     form = SimpleSearch()
     if form.validate_on_submit():
         q = form.search_string.data
-        return redirect(url_for(".search_results", q=q))
+        return redirect(url_for(".search_results", q=q, **form.ranges()))
     return render_template("menu/search.html", form=form)
 
 
 @menu.route("/search_results")
+@read_only
 def search_results():
     """Return the results of the seach query"""
     page = request.args.get("page", 1, type=int)
     search_string = request.args.get("q", None)
+    sort = request.args.get("sort", "time")
+    if sort not in SEARCH_SORT_OPTIONS:
+        sort = "time"
+    # Values which are not numbers are ignored
+    ranges = {
+        name: value
+        for name in RANGE_FILTERS
+        if (value := request.args.get(name, type=float)) is not None
+    }
 
     recipes = []
     pagination = None
     results_total = 0
-    if search_string is not None:
-        query = Recipe.search_string(search_string).order_by(Recipe.timestamp.desc())
-        pagination = query.paginate(
+    if search_string is not None or ranges:
+        if search_string is None:
+            query = Recipe.list_query().order_by(Recipe.timestamp.desc())
+        elif sort == "relevance":
+            query = Recipe.search_string_by_relevance(search_string)
+        else:
+            query = Recipe.search_string(search_string).order_by(Recipe.timestamp.desc())
+        query = Recipe.filter_ranges(query, **ranges)
+        pagination = paginate(
+            query,
             page=page,
             per_page=current_app.config["TYMENU_RECIPES_PER_PAGE"],
-            error_out=False,
+            cache_total=True,
+            max_total=current_app.config["TYMENU_SEARCH_COUNT_LIMIT"],
         )
         recipes = pagination.items
-        results_total = query.count()
+        results_total = pagination.total
     return render_template(
         "menu/search_results.html",
         q=search_string,
+        sort=sort,
+        sort_options=SEARCH_SORT_OPTIONS,
+        ranges=ranges,
+        range_labels=[SEARCH_FILTER_LABELS[name].format(value) for name, value in ranges.items()],
         recipes=recipes,
         pagination=pagination,
         results_total=results_total,
@@ -206,9 +179,20 @@ def search_results():
 
 
 @menu.route("/recipe/<int:recipe_id>", methods=["GET"])
+@read_only
 def view_recipe(recipe_id):
     recipe = Recipe.query.get_or_404(recipe_id)
-    return render_template("menu/recipe.html", recipe=recipe)
+
+    def _render():
+        recipe_body = get_fragment_cache().get_or_render(
+            recipe.cache_key,
+            recipe.body_version,
+            lambda: render_template("menu/_recipe_body.html", recipe=recipe),
+        )
+        return render_template("menu/recipe.html", recipe=recipe, recipe_body=recipe_body)
+
+    etag = page_etag("recipe", recipe.id, recipe.version, recipe.author.username)
+    return conditional_render(etag, recipe.last_modified, _render)
 
 
 @menu.route("/edit/<int:recipe_id>", methods=["GET", "POST"])
@@ -233,6 +217,7 @@ def edit_recipe(recipe_id):
             flash(f"An error occurred while updating recipe: {exc}")
         else:
             logger.info("Comitted edit to recipe with ID: %s", recipe.id)
+            get_fragment_cache().invalidate(recipe.cache_key)
             flash(f"Recipe '{recipe.title}' has been updated.")
         return redirect(url_for(".view_recipe", recipe_id=recipe_id))
     form.fill_from_existing_recipe(recipe)
@@ -244,6 +229,7 @@ def edit_recipe(recipe_id):
 @mod_required
 def delete_recipe(recipe_id):
     recipe = Recipe.query.get_or_404(recipe_id)
+    cache_key = recipe.cache_key
     db = get_db()
     logger.info("Deleting recipe with ID: %d", recipe.id)
     try:
@@ -255,6 +241,7 @@ def delete_recipe(recipe_id):
         flash(f"An error occurred while deleting recipe: {exc}")
     else:
         logger.info("Recipe %s was deleted.", recipe.title)
+        get_fragment_cache().invalidate(cache_key)
         flash(f"Recipe '{recipe.title}' was deleted.")
 
     return redirect(url_for("main.index"))
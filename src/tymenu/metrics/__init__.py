@@ -0,0 +1,5 @@
+from .blueprint import metrics_blueprint
+from .collector import Metrics, get_metrics
+from . import views
+
+__all__ = ["metrics_blueprint", "Metrics", "get_metrics", "views"]
@@ -0,0 +1,5 @@
+from __future__ import annotations
+
+from flask import Blueprint
+
+metrics_blueprint = Blueprint("metrics", __name__)
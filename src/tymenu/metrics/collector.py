@@ -0,0 +1,136 @@
+"""Collection of the app's metrics"""
+from __future__ import annotations
+
+import time
+
+from flask import Flask, Response, current_app, g, has_app_context, request
+from sqlalchemy.pool import QueuePool
+
+from .registry import Registry
+from .store import MemoryStore, MmapStore
+
+_EXTENSION = "tymenu_metrics"
+
+
+class AppMetrics:
+    """The metrics of an app"""
+
+    def __init__(self, store):
+        self.registry = registry = Registry(store)
+        self.requests = registry.counter(
+            "tymenu_http_requests_total", "Number of HTTP requests by endpoint and status."
+        )
+        self.request_latency = registry.histogram(
+            "tymenu_http_request_duration_seconds", "Latency of HTTP requests by endpoint."
+        )
+        self.pool_checkout = registry.histogram(
+            "tymenu_db_pool_checkout_seconds",
+            "Time spent waiting for a connection from the database pool.",
+            buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+        )
+        self.pool_connect = registry.histogram(
+            "tymenu_db_pool_connect_seconds",
+            "Time to open a new connection of the database pool.",
+            buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+        )
+        self.cache_hits = registry.counter(
+            "tymenu_cache_hits_total", "Number of cache hits by cache."
+        )
+        self.cache_misses = registry.counter(
+            "tymenu_cache_misses_total", "Number of cache misses by cache."
+        )
+        registry.derived_gauge(
+            "tymenu_cache_hit_ratio", "Fraction of cache lookups which are hits.", _hit_ratios
+        )
+        self.email_queue = registry.gauge(
+            "tymenu_email_queue_depth", "Number of emails waiting to be sent."
+        )
+
+    def sync_process_metrics(self) -> None:
+        """Copy the counts kept by other parts of this process into the store."""
+        from tymenu.email import email_queue_depth
+        from tymenu.rendering import get_renderer
+        from tymenu.resources import get_fragment_cache
+
+        caches = {"markdown": get_renderer(), "fragment": get_fragment_cache()}
+        for name, cache in caches.items():
+            self.cache_hits.set_total(cache.hits, cache=name)
+            self.cache_misses.set_total(cache.misses, cache=name)
+        self.email_queue.set(email_queue_depth())
+
+
+def _hit_ratios(samples: dict[tuple, float]) -> dict[tuple, float]:
+    ratios = {}
+    for (sample_name, labels), hits in samples.items():
+        if sample_name != "tymenu_cache_hits_total":
+            continue
+        misses = samples.get(("tymenu_cache_misses_total", labels), 0.0)
+        if hits + misses > 0:
+            ratios[labels] = hits / (hits + misses)
+    return ratios
+
+
+def get_metrics() -> AppMetrics | None:
+    return current_app.extensions.get(_EXTENSION)
+
+
+def _start_request() -> None:
+    g._metrics_start = time.perf_counter()
+
+
+def _finish_request(response: Response) -> Response:
+    metrics = get_metrics()
+    start = g.pop("_metrics_start", None)
+    if metrics is None or start is None:
+        return response
+    endpoint = request.endpoint or "unknown"
+    metrics.request_latency.observe(time.perf_counter() - start, endpoint=endpoint)
+    metrics.requests.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    metrics.sync_process_metrics()
+    return response
+
+
+def _observe(histogram: str, seconds: float) -> None:
+    metrics = get_metrics() if has_app_context() else None
+    if metrics is not None:
+        getattr(metrics, histogram).observe(seconds)
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool which times the checkouts, including the wait when all the
+    connections are in use, and the new connections, for the current app."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        connection = super()._do_get()
+        _observe("pool_checkout", time.perf_counter() - start)
+        return connection
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        connection = super()._create_connection()
+        _observe("pool_connect", time.perf_counter() - start)
+        return connection
+
+
+class Metrics:
+    """Flask extension collecting the metrics, if ``TYMENU_METRICS`` is set.
+    With ``TYMENU_METRICS_TOKEN``, /metrics needs it as a bearer token. It must be
+    initialized before the database, as it sets the class of the connection pools.
+
+    With ``TYMENU_METRICS_DIR`` the samples are stored in memory mapped files
+    in that directory, which must be shared by all worker processes and emptied
+    before the server starts. Otherwise they are kept in the process."""
+
+    def init_app(self, app: Flask) -> None:
+        if not app.config.get("TYMENU_METRICS"):
+            return
+        directory = app.config.get("TYMENU_METRICS_DIR")
+        store = MmapStore(directory) if directory else MemoryStore()
+        metrics = AppMetrics(store)
+        app.extensions[_EXTENSION] = metrics
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
+        # Before the engines are created. In-memory SQLite databases keep their static pool.
+        options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"poolclass": TimedQueuePool, **options}
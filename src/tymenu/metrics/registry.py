@@ -0,0 +1,163 @@
+"""Metric types, and their rendering in the Prometheus text exposition format"""
+from __future__ import annotations
+
+import json
+import math
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def sample_key(sample_name: str, labels: dict[str, str]) -> str:
+    return json.dumps([sample_name, sorted(labels.items())], separators=(",", ":"))
+
+
+def parse_key(key: str) -> tuple[str, dict[str, str]]:
+    sample_name, labels = json.loads(key)
+    return sample_name, dict(labels)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_sample(sample_name: str, labels: dict[str, str], value: float) -> str:
+    if labels:
+        label_str = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+        return f"{sample_name}{{{label_str}}} {_format_value(value)}"
+    return f"{sample_name} {_format_value(value)}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, registry: Registry, name: str, documentation: str, live: bool = False):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        # Live values only count while the process which wrote them is running.
+        self.live = live
+
+    @property
+    def store(self):
+        return self.registry.store
+
+    def sample_names(self) -> tuple[str, ...]:
+        return (self.name,)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self.store.inc(sample_key(self.name, labels), amount, live=self.live)
+
+    def set_total(self, value: float, **labels: str) -> None:
+        """Set the total, for counts which are kept elsewhere in the process"""
+        self.store.set(sample_key(self.name, labels), value, live=self.live)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, registry: Registry, name: str, documentation: str, live: bool = True):
+        super().__init__(registry, name, documentation, live=live)
+
+    def set(self, value: float, **labels: str) -> None:
+        self.store.set(sample_key(self.name, labels), value, live=self.live)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        registry: Registry,
+        name: str,
+        documentation: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(registry, name, documentation)
+        self.buckets = (*sorted(buckets), math.inf)
+
+    def sample_names(self) -> tuple[str, ...]:
+        return (f"{self.name}_bucket", f"{self.name}_sum", f"{self.name}_count")
+
+    def observe(self, value: float, **labels: str) -> None:
+        # The buckets are stored cumulative, as they are exposed.
+        for bound in self.buckets:
+            if value <= bound:
+                key = sample_key(f"{self.name}_bucket", {**labels, "le": _format_value(bound)})
+                self.store.inc(key, 1.0)
+        self.store.inc(sample_key(f"{self.name}_sum", labels), value)
+        self.store.inc(sample_key(f"{self.name}_count", labels), 1.0)
+
+
+class Registry:
+    def __init__(self, store):
+        self.store = store
+        self.metrics: dict[str, Metric] = {}
+        self._derived: list[tuple[str, str, Callable]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, live: bool = False) -> Counter:
+        return self._register(Counter(self, name, documentation, live=live))
+
+    def gauge(self, name: str, documentation: str, live: bool = True) -> Gauge:
+        return self._register(Gauge(self, name, documentation, live=live))
+
+    def histogram(self, name: str, documentation: str, **kwargs) -> Histogram:
+        return self._register(Histogram(self, name, documentation, **kwargs))
+
+    def derived_gauge(
+        self, name: str, documentation: str, compute: Callable[[dict], dict[tuple, float]]
+    ) -> None:
+        """Gauge computed at exposition time from the other samples. ``compute`` maps
+        the parsed samples ``{(sample_name, labels tuple): value}`` to
+        ``{labels tuple: value}``."""
+        self._derived.append((name, documentation, compute))
+
+    def render(self) -> str:
+        """Render all samples in the Prometheus text exposition format."""
+        samples: dict[str, list[tuple[dict[str, str], float]]] = {}
+        parsed: dict[tuple, float] = {}
+        for key, value in self.store.collect().items():
+            sample_name, labels = parse_key(key)
+            samples.setdefault(sample_name, []).append((labels, value))
+            parsed[(sample_name, tuple(sorted(labels.items())))] = value
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for sample_name in metric.sample_names():
+                entries = samples.get(sample_name, [])
+                entries.sort(key=_sort_key)
+                for labels, value in entries:
+                    lines.append(format_sample(sample_name, labels, value))
+        for name, documentation, compute in self._derived:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(compute(parsed).items()):
+                lines.append(format_sample(name, dict(labels), value))
+        return "\n".join(lines) + "\n"
+
+
+def _sort_key(entry: tuple[dict[str, str], float]):
+    labels = entry[0]
+    other = sorted((k, v) for k, v in labels.items() if k != "le")
+    le = labels.get("le")
+    return (other, float(le.replace("+Inf", "inf")) if le is not None else 0.0)
@@ -0,0 +1,176 @@
+"""Storage of metric samples.
+
+Samples are floats stored under a string key. The ``MemoryStore`` keeps them
+in the process, while the ``MmapStore`` writes them to memory mapped files in
+a directory shared by all the worker processes, one file per process. Reading
+the samples then sums the values of all processes."""
+from __future__ import annotations
+
+import mmap
+import os
+from pathlib import Path
+import struct
+import threading
+
+# The file starts with the number of bytes in use, followed by the entries.
+# Each entry is the key length, the key padded to 8 bytes and a double.
+_HEADER = struct.Struct("i4x")
+_KEY_LENGTH = struct.Struct("i")
+_VALUE = struct.Struct("d")
+_INITIAL_SIZE = 64 * 1024
+
+
+class MemoryStore:
+    def __init__(self):
+        self._values: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key: str, amount: float = 1.0, live: bool = False) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key: str, value: float, live: bool = False) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def collect(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class MmapDict:
+    """A dict of floats in a memory mapped file, which can be read by other processes.
+    Values are only written by the owning process."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._positions: dict[str, int] = {}
+        exists = path.exists() and path.stat().st_size > 0
+        self._file = open(path, "a+b")
+        if not exists:
+            self._file.truncate(_INITIAL_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = _HEADER.unpack_from(self._map, 0)[0]
+        if self._used == 0:
+            self._used = _HEADER.size
+            _HEADER.pack_into(self._map, 0, self._used)
+        for key, _, pos in self._read_entries(self._map, self._used):
+            self._positions[key] = pos
+
+    @staticmethod
+    def _read_entries(data, used: int):
+        pos = _HEADER.size
+        while pos < used:
+            length = _KEY_LENGTH.unpack_from(data, pos)[0]
+            key_end = pos + _KEY_LENGTH.size + length
+            key = bytes(data[pos + _KEY_LENGTH.size : key_end]).decode("utf-8")
+            # Align the value to 8 bytes
+            value_pos = key_end + (-key_end % 8)
+            yield key, _VALUE.unpack_from(data, value_pos)[0], value_pos
+            pos = value_pos + _VALUE.size
+
+    @classmethod
+    def read_all(cls, path: Path) -> dict[str, float]:
+        """Read the values of a file, possibly owned by another process"""
+        data = path.read_bytes()
+        if len(data) < _HEADER.size:
+            return {}
+        used = _HEADER.unpack_from(data, 0)[0]
+        return {key: value for key, value, _ in cls._read_entries(data, used)}
+
+    def _grow(self, needed: int) -> None:
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        self._map.close()
+        self._file.truncate(capacity)
+        self._capacity = capacity
+        self._map = mmap.mmap(self._file.fileno(), capacity)
+
+    def _add_key(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        key_end = self._used + _KEY_LENGTH.size + len(encoded)
+        value_pos = key_end + (-key_end % 8)
+        end = value_pos + _VALUE.size
+        if end > self._capacity:
+            self._grow(end)
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size : key_end] = encoded
+        _VALUE.pack_into(self._map, value_pos, 0.0)
+        # Publish the entry only once it is fully written
+        self._used = end
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = value_pos
+        return value_pos
+
+    def get(self, key: str) -> float:
+        pos = self._positions.get(key)
+        if pos is None:
+            return 0.0
+        return _VALUE.unpack_from(self._map, pos)[0]
+
+    def set(self, key: str, value: float) -> None:
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._add_key(key)
+        _VALUE.pack_into(self._map, pos, value)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+def _pid_is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MmapStore:
+    """Multi-process store, for e.g. gunicorn workers.
+
+    Counters and histograms of a process are kept after it exits, so totals
+    never go backwards. "Live" values, e.g. a queue depth, only count for the
+    processes which are still running."""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+        self._files: dict[bool, MmapDict] = {}
+
+    def _file(self, live: bool) -> MmapDict:
+        pid = os.getpid()
+        if pid != self._pid:
+            # New process, e.g. after a fork, so don't write to the parent's files.
+            self._pid = pid
+            self._files = {}
+        if live not in self._files:
+            prefix = "live" if live else "total"
+            self._files[live] = MmapDict(self.directory / f"{prefix}_{pid}.db")
+        return self._files[live]
+
+    def inc(self, key: str, amount: float = 1.0, live: bool = False) -> None:
+        with self._lock:
+            file = self._file(live)
+            file.set(key, file.get(key) + amount)
+
+    def set(self, key: str, value: float, live: bool = False) -> None:
+        with self._lock:
+            self._file(live).set(key, value)
+
+    def collect(self) -> dict[str, float]:
+        values: dict[str, float] = {}
+        for path in sorted(self.directory.glob("*.db")):
+            prefix, _, pid = path.stem.partition("_")
+            if prefix == "live" and not _pid_is_alive(int(pid)):
+                continue
+            for key, value in MmapDict.read_all(path).items():
+                values[key] = values.get(key, 0.0) + value
+        return values
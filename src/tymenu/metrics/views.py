@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import hmac
+
+from flask import Response, abort, current_app, request
+
+from .blueprint import metrics_blueprint as metrics
+from .collector import get_metrics
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@metrics.route("/metrics")
+def expose_metrics():
+    app_metrics = get_metrics()
+    if app_metrics is None:
+        abort(404)
+    token = current_app.config.get("TYMENU_METRICS_TOKEN")
+    if token:
+        authorization = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+            abort(401)
+    app_metrics.sync_process_metrics()
+    return Response(app_metrics.registry.render(), content_type=CONTENT_TYPE)
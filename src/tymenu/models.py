@@ -9,14 +9,15 @@ from flask_login import AnonymousUserMixin, UserMixin, current_user
 from flask_sqlalchemy.model import DefaultMeta
 import jwt
 import sqlalchemy as sql
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy.orm import Mapped, joinedload, relationship
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from tymenu.timestamp import get_now_utc
 from tymenu.utils import clean_markdown_to_html
 
+from . import fulltext, terms, user_cache
 from .resources import get_db, get_login_manager
-from .search import get_operation, query_substrings
+from .search import query_range, query_substrings
 
 
 @enum.unique
@@ -25,6 +26,13 @@ class KcalType(enum.IntEnum):
     TOTAL = 2
 
 
+class UploadStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
 class Permission:
     FOLLOW = 1
     COMMENT = 2
@@ -64,6 +72,29 @@ energy_conversion = {
     "carb": 4.06,
 }
 
+
+def kcal_per_person(
+    kcal: float | None, kcal_type: int | None, servings: int | None
+) -> float | None:
+    """The kcal per person of a recipe, or None if it is unknown"""
+    if kcal is None:
+        return None
+    if kcal_type == KcalType.PER_PERSON:
+        return kcal
+    # kcal are measured in totals
+    if not servings:
+        return None
+    return kcal / servings
+
+
+# Range filters of the recipe search: name -> (column, bound)
+RANGE_FILTERS = {
+    "min_kcal": ("kcal_per_person", "minimum"),
+    "max_kcal": ("kcal_per_person", "maximum"),
+    "max_time": ("cooking_time_min", "maximum"),
+    "min_protein": ("protein_gram", "minimum"),
+}
+
 BaseModel: DefaultMeta = db.Model
 
 
@@ -82,11 +113,13 @@ class Recipe(BaseModel):
     servings: int = db.Column(db.Integer)
     kcal: float | None = db.Column(db.Float, nullable=True)
     kcal_type: int = db.Column(db.Integer)  # are kcal measured in per person or in total
+    # Computed from kcal, kcal_type and servings when the recipe is saved, for the search
+    kcal_per_person: float | None = db.Column(db.Float, nullable=True, index=True)
     # Breakdown of the kcals
-    protein_gram: float | None = db.Column(db.Float, nullable=True)
+    protein_gram: float | None = db.Column(db.Float, nullable=True, index=True)
     carb_gram: float | None = db.Column(db.Float, nullable=True)
     fat_gram: float | None = db.Column(db.Float, nullable=True)
-    cooking_time_min: float | None = db.Column(db.Float, nullable=True)
+    cooking_time_min: float | None = db.Column(db.Float, nullable=True, index=True)
 
     # Special columns with sanitized HTML from Markdown
     ingredients_html: str = db.Column(db.Text)
@@ -99,19 +132,51 @@ class Recipe(BaseModel):
     img_thumbnail_url: str = db.Column(db.Text, nullable=True)
     img_url_viewer: str = db.Column(db.Text, nullable=True)
 
+    # The terms of the keywords and ingredients, written by the mapper events
+    keyword_terms: Mapped[list[Keyword]] = relationship(
+        "Keyword", secondary="recipe_keyword", viewonly=True, order_by="Keyword.name"
+    )
+    ingredient_terms: Mapped[list[Ingredient]] = relationship(
+        "Ingredient", secondary="recipe_ingredient", viewonly=True, order_by="Ingredient.name"
+    )
+
     def __repr__(self) -> str:
         return f"<Recipe {self.title!r} by {self.author!r}>"
 
+    @property
+    def last_modified(self) -> datetime.datetime:
+        """Time of the latest change to the recipe"""
+        return self.last_updated or self.timestamp
+
+    @property
+    def cache_key(self) -> str:
+        return f"recipe:{self.id}"
+
+    @property
+    def version(self) -> str:
+        """Version of the recipe, which changes whenever the recipe is updated."""
+        return _as_naive_utc(self.last_modified).isoformat()
+
+    @property
+    def body_version(self) -> str:
+        """Version of the rendered recipe, which also shows the author's name and
+        depends on the templates of the app version. A new username or a deploy
+        changes it in every process, without an invalidation."""
+        from . import __version__
+
+        return f"{__version__}/{self.version}/{self.author.username}"
+
+    def set_image(self, url_data) -> None:
+        """Set the image URL's from an upload"""
+        self.img_display_url = url_data.display_url
+        self.img_delete_url = url_data.delete_url
+        self.img_thumbnail_url = url_data.thumb_url
+        self.img_url_viewer = url_data.url_viewer
+        self.last_updated = get_now_utc()
+
     @property
     def kcal_pers(self) -> float | None:
-        if self.kcal is None:
-            return None
-        if self.kcal_type == KcalType.PER_PERSON:
-            return self.kcal
-        # kcal are measured in totals
-        if self.servings is None:
-            return None
-        return self.kcal / self.servings
+        return kcal_per_person(self.kcal, self.kcal_type, self.servings)
 
     def _energy_string(self, val_g, energy_name, prefix: str):
         if val_g is None:
@@ -151,40 +216,115 @@ class Recipe(BaseModel):
             return None
         return self.kcal * self.servings
 
+    @classmethod
+    def list_query(cls):
+        """Query for recipes shown in lists, which display the author of each recipe.
+        The author is loaded in the same query, rather than one query per recipe."""
+        return cls.query.options(joinedload(cls.author))
+
     @classmethod
     def search_string(cls, string: str):
-        """Search in relevant fields for a string"""
+        """Search in relevant fields for a string.
+        Uses the full-text index when the database supports it."""
+        dialect = fulltext.fulltext_dialect()
+        if dialect is not None:
+            match = fulltext.match_recipe_ids(cls.id, string, dialect)
+            if match is not None:
+                return cls.list_query().filter(match)
 
-        contains = (
-            getattr(cls, name).contains(string)
-            for name in ("title", "ingredients", "keywords", "instructions")
-        )
+        contains = (getattr(cls, name).contains(string) for name in fulltext.FTS_COLUMNS)
 
-        return cls.query.filter(sql.or_(*contains))
+        return cls.list_query().filter(sql.or_(*contains))
+
+    @classmethod
+    def search_string_by_relevance(cls, string: str):
+        """Search in relevant fields for a string, with the best matches first.
+        Matches in the title weigh more than keywords, then ingredients
+        and finally the instructions."""
+        dialect = fulltext.fulltext_dialect()
+        if dialect is not None:
+            query = fulltext.ranked_recipes(cls.list_query(), cls.id, string, dialect)
+            if query is not None:
+                return query.order_by(cls.timestamp.desc())
+
+        columns = {name: getattr(cls, name) for name in fulltext.FTS_COLUMNS}
+        score = fulltext.substring_score(columns, string)
+        return cls.search_string(string).order_by(score.desc(), cls.timestamp.desc())
 
     @classmethod
     def search_ingredients(cls, *ingredients, operation="and", exclude: bool = False):
-        """Query for one or more ingredients from the ingredients column.
+        """Query for one or more ingredients, matching whole words of the ingredients.
         Default behaviour is to require all ingreduents."""
-        queries = query_substrings(cls.ingredients, *ingredients, exclude=exclude)
-        op = get_operation(operation)
-        return cls.query.filter(op(*queries))
+        clause = INGREDIENT_TERMS.filter(cls.id, *ingredients, operation=operation, exclude=exclude)
+        return cls.query.filter(clause)
 
     @classmethod
     def search_keywords(cls, *keywords: str, operation="and", exclude: bool = False):
-        queries = query_substrings(cls.keywords, *keywords, exclude=exclude)
-        op = get_operation(operation)
-        return cls.query.filter(op(*queries))
+        """Query for one or more keywords, matching whole keywords."""
+        clause = KEYWORD_TERMS.filter(cls.id, *keywords, operation=operation, exclude=exclude)
+        return cls.query.filter(clause)
+
+    @staticmethod
+    def index_terms(connection, rows, replace: bool = True) -> None:
+        """Link the recipes to their keyword and ingredient terms, for recipe rows
+        with the id, keywords and ingredients which were not saved with the ORM.
+        Use ``replace=False`` for new recipes, which have no links yet."""
+        rows = list(rows)
+        for index, column in ((KEYWORD_TERMS, "keywords"), (INGREDIENT_TERMS, "ingredients")):
+            index.update(connection, {row["id"]: row.get(column) for row in rows}, replace)
+
+    @classmethod
+    def reindex_terms(cls, connection, batch_size: int = 1000) -> int:
+        """Link all recipes to their terms again. Returns the number of recipes."""
+        table = cls.__table__
+        count = 0
+        last_id = 0
+        while True:
+            rows = (
+                connection.execute(
+                    sql.select(table.c.id, table.c.keywords, table.c.ingredients)
+                    .where(table.c.id > last_id)
+                    .order_by(table.c.id)
+                    .limit(batch_size)
+                )
+                .mappings()
+                .all()
+            )
+            if not rows:
+                return count
+            cls.index_terms(connection, rows)
+            count += len(rows)
+            last_id = rows[-1]["id"]
 
     @classmethod
-    def build_query(cls, title=None, ingredients=None, keywords=None, order_by_time=True):
-        query = cls.query
+    def filter_ranges(cls, query, **ranges: float | None):
+        """Filter a query on ranges of the nutrition and cooking time,
+        e.g. ``max_kcal=600, max_time=30, min_protein=30``. The names are
+        the keys of ``RANGE_FILTERS``, and None means no limit."""
+        for name, value in ranges.items():
+            if value is None:
+                continue
+            try:
+                column_name, bound = RANGE_FILTERS[name]
+            except KeyError:
+                avail = ", ".join(RANGE_FILTERS)
+                raise ValueError(
+                    f"Unknown range filter {name}. Available filters: {avail}"
+                ) from None
+            column = getattr(cls, column_name)
+            query = query.filter(*query_range(column, **{bound: value}))
+        return query
+
+    @classmethod
+    def build_query(cls, title=None, ingredients=None, keywords=None, order_by_time=True, **ranges):
+        query = cls.list_query()
         if title:
             query = query.filter(sql.and_(*query_substrings(cls.title, title)))
         if ingredients:
-            query = query.filter(sql.and_(*query_substrings(cls.ingredients, *ingredients)))
+            query = query.filter(INGREDIENT_TERMS.filter(cls.id, *ingredients))
         if keywords:
-            query = query.filter(sql.and_(*query_substrings(cls.keywords, *keywords)))
+            query = query.filter(KEYWORD_TERMS.filter(cls.id, *keywords))
+        query = cls.filter_ranges(query, **ranges)
         if order_by_time:
             query = query.order_by(cls.timestamp.desc())
         return query
@@ -198,6 +338,25 @@ class Recipe(BaseModel):
             ingr.append(line)
         return clean_markdown_to_html("\n".join(ingr))
 
+    @staticmethod
+    def on_save(mapper, connection, target):
+        target.kcal_per_person = kcal_per_person(target.kcal, target.kcal_type, target.servings)
+
+    @staticmethod
+    def on_insert_terms(mapper, connection, target):
+        Recipe.index_terms(connection, [_term_row(target)], replace=False)
+
+    @staticmethod
+    def on_update_terms(mapper, connection, target):
+        state = sql.inspect(target)
+        if any(state.attrs[name].history.has_changes() for name in ("keywords", "ingredients")):
+            Recipe.index_terms(connection, [_term_row(target)])
+
+    @staticmethod
+    def on_delete_terms(mapper, connection, target):
+        for index in (KEYWORD_TERMS, INGREDIENT_TERMS):
+            index.delete(connection, [target.id])
+
     @staticmethod
     def on_changed_instructions(target, value, oldvalue, initiator):
         target.instructions_html = clean_markdown_to_html(value)
@@ -217,6 +376,54 @@ class Recipe(BaseModel):
 db.event.listen(Recipe.ingredients, "set", Recipe.on_changed_ingredients)
 db.event.listen(Recipe.instructions, "set", Recipe.on_changed_instructions)
 db.event.listen(Recipe.background, "set", Recipe.on_changed_background)
+# Keep the kcal per person in sync with the columns it is computed from
+db.event.listen(Recipe, "before_insert", Recipe.on_save)
+db.event.listen(Recipe, "before_update", Recipe.on_save)
+# Keep the links to the keywords and ingredients in sync
+db.event.listen(Recipe, "after_insert", Recipe.on_insert_terms)
+db.event.listen(Recipe, "after_update", Recipe.on_update_terms)
+db.event.listen(Recipe, "before_delete", Recipe.on_delete_terms)
+fulltext.register_fulltext_ddl(Recipe.__table__)
+
+
+def _term_row(recipe: Recipe) -> dict:
+    return {"id": recipe.id, "keywords": recipe.keywords, "ingredients": recipe.ingredients}
+
+
+class Keyword(BaseModel):
+    __tablename__ = "keyword"
+    id: int = db.Column(db.Integer, primary_key=True)
+    name: str = db.Column(terms.TERM_NAME_TYPE, unique=True, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<Keyword {self.name!r}>"
+
+
+class Ingredient(BaseModel):
+    __tablename__ = "ingredient"
+    id: int = db.Column(db.Integer, primary_key=True)
+    name: str = db.Column(terms.TERM_NAME_TYPE, unique=True, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<Ingredient {self.name!r}>"
+
+
+# The links are looked up by the term, so the index on the term id includes
+# the recipe id, and the searches don't read the link rows.
+recipe_keyword = db.Table(
+    "recipe_keyword",
+    db.Column("recipe_id", db.Integer, db.ForeignKey("recipe.id"), primary_key=True),
+    db.Column("keyword_id", db.Integer, db.ForeignKey("keyword.id"), primary_key=True),
+    db.Index("ix_recipe_keyword_keyword_id_recipe_id", "keyword_id", "recipe_id"),
+)
+recipe_ingredient = db.Table(
+    "recipe_ingredient",
+    db.Column("recipe_id", db.Integer, db.ForeignKey("recipe.id"), primary_key=True),
+    db.Column("ingredient_id", db.Integer, db.ForeignKey("ingredient.id"), primary_key=True),
+    db.Index("ix_recipe_ingredient_ingredient_id_recipe_id", "ingredient_id", "recipe_id"),
+)
+KEYWORD_TERMS = terms.TermIndex(Keyword.__table__, recipe_keyword, terms.parse_keywords)
+INGREDIENT_TERMS = terms.TermIndex(Ingredient.__table__, recipe_ingredient, terms.parse_ingredients)
 
 
 class Role(BaseModel):
@@ -269,6 +476,7 @@ class Role(BaseModel):
             role.default = role.name == default_role
             db.session.add(role)
         db.session.commit()
+        user_cache.invalidate_roles()
 
     def add_permission(self, perm):
         if not self.has_permission(perm):
@@ -315,6 +523,8 @@ class User(UserMixin, BaseModel):
     recipes = db.relationship("Recipe", backref="author", lazy="dynamic")
     avatar_hash = db.Column(db.String(32))
     member_since = db.Column(db.DateTime(), default=get_now_utc)
+    # Incremented when the login or role changes, see user_cache
+    version: int = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     # menu_plans = db.relationship("MenuPlanItem", backref="author", lazy="dynamic")
 
     def __init__(self, **kwargs):
@@ -383,6 +593,7 @@ class User(UserMixin, BaseModel):
             return False
         user.password = new_password
         db.session.add(user)
+        user_cache.invalidate_user(user)
         return True
 
     def can(self, perm) -> bool:
@@ -411,18 +622,39 @@ class User(UserMixin, BaseModel):
             if role.name.lower() == role_name:
                 self.role = role
                 db.session.commit()
+                user_cache.invalidate_user(self)
                 return
         raise RuntimeError(f"Unknown role: {role_name}. Available roles: {all_roles!r}")
 
+    @staticmethod
+    def on_update(mapper, connection, target):
+        state = sql.inspect(target)
+        if any(
+            state.attrs[name].history.has_changes()
+            for name in ("password_hash", "username", "email", "role_id", "role")
+        ):
+            # In SQL, so concurrent changes are all counted
+            target.version = User.version + 1
+
     @property
     def is_current_user(self) -> bool:
         """Is this user is the current logged in user?"""
         return self.id == current_user.id
 
 
+db.event.listen(User, "before_update", User.on_update)
+
+
 @login_manager.user_loader
 def load_user(user_id: int) -> User:
-    return User.query.get(int(user_id))
+    return user_cache.load_user(User, Role, int(user_id))
+
+
+def _as_naive_utc(timestamp: datetime.datetime) -> datetime.datetime:
+    """Timestamps are stored in UTC, but the time zone is dropped by some databases."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
 
 
 def _timedelta_to_hh_mm(delta: datetime.timedelta):
@@ -469,6 +701,8 @@ class MenuPlan(BaseModel):
     added_by_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey("users.id"), index=True)
     added_by: Mapped[User] = relationship("User")
     timestamp: datetime.datetime = db.Column(db.DateTime, index=False, default=get_now_utc)
+    # Time of the latest change to the plan or its items
+    last_updated = db.Column(db.DateTime)
     recipe_plans: Mapped[list[MenuPlanItem]] = relationship(
         "MenuPlanItem",
         cascade="all,delete",
@@ -486,6 +720,26 @@ class MenuPlan(BaseModel):
     def get_date(cls, date: datetime.date):
         return cls.query.filter(cls.date == date).all()
 
+    @property
+    def last_modified(self) -> datetime.datetime:
+        """Time of the latest change to the plan, its items or its recipes"""
+        modified = [self.timestamp]
+        if self.last_updated is not None:
+            modified.append(self.last_updated)
+        modified.extend(item.recipe.last_modified for item in self.recipe_plans if item.recipe)
+        return max(_as_naive_utc(m) for m in modified)
+
+    @property
+    def version(self) -> str:
+        """Version of the plan, which changes when the plan, its items or recipes change."""
+        items = sorted(
+            (item.id, item.recipe_id, item.day, item.days_leftover, item.recipe.version)
+            for item in self.recipe_plans
+            if item.recipe
+        )
+        key = repr((self.title, self.description, self.timestamp, items))
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
     def get_sorted_plans(self) -> list[MenuPlanItem]:
         plans = self.recipe_plans.copy()
         plans.sort(key=lambda p: p.day)
@@ -497,8 +751,13 @@ class MenuPlan(BaseModel):
             target.description_html = ""
         target.description_html = clean_markdown_to_html(value)
 
+    @staticmethod
+    def on_update(mapper, connection, target):
+        target.last_updated = get_now_utc()
+
 
 db.event.listen(MenuPlan.description, "set", MenuPlan.on_changed_description)
+db.event.listen(MenuPlan, "before_update", MenuPlan.on_update)
 
 
 class MenuPlanItem(BaseModel):
@@ -511,3 +770,42 @@ class MenuPlanItem(BaseModel):
     day: int = db.Column(db.Integer, nullable=False)  # Number of days offset from day 0
     days_leftover = db.Column(db.Integer, nullable=False)
     recipe: Mapped[Recipe] = relationship(foreign_keys=[recipe_id])
+
+    @staticmethod
+    def on_change(mapper, connection, target):
+        """Adding, removing or moving an item changes the plan"""
+        plans = MenuPlan.__table__
+        connection.execute(
+            plans.update()
+            .where(plans.c.id == target.menu_plan_id)
+            .values(last_updated=get_now_utc())
+        )
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    db.event.listen(MenuPlanItem, _event, MenuPlanItem.on_change)
+
+
+class UploadJob(BaseModel):
+    """Upload of a recipe image, which runs in the background"""
+
+    __tablename__ = "upload_job"
+    id: int = db.Column(db.Integer, primary_key=True)
+    recipe_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey("recipe.id"), index=True)
+    user_id: Mapped[int] = db.Column(db.Integer, db.ForeignKey("users.id"))
+    status: str = db.Column(db.String(16), nullable=False, default=UploadStatus.PENDING, index=True)
+    # The uploaded file, until it has been sent
+    spool_path: str = db.Column(db.String(255))
+    error: str | None = db.Column(db.String(255), nullable=True)
+    timestamp: datetime.datetime = db.Column(db.DateTime, default=get_now_utc)
+    last_updated = db.Column(db.DateTime)
+    recipe: Mapped[Recipe] = relationship(
+        "Recipe", backref=db.backref("upload_jobs", cascade="all,delete", lazy="dynamic")
+    )
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (UploadStatus.DONE, UploadStatus.FAILED)
+
+    def __repr__(self) -> str:
+        return f"<UploadJob {self.id} {self.status}>"
@@ -0,0 +1,267 @@
+"""Pagination helpers shared by the recipe list views"""
+from __future__ import annotations
+
+import base64
+import binascii
+from collections import OrderedDict
+import datetime
+import json
+import threading
+import time
+from typing import Any, NamedTuple
+
+from flask import Flask, current_app
+from flask_sqlalchemy.pagination import Pagination, QueryPagination
+import sqlalchemy as sql
+
+_CACHE_EXTENSION = "tymenu_count_cache"
+
+
+class CountCache:
+    """Small thread-safe LRU of query totals, which expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl: float, max_size: int = 256):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: OrderedDict[tuple, tuple[float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> int | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, total = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return total
+
+    def set(self, key: tuple, total: int) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, total)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class CountCaching:
+    """Flask extension keeping a :class:`CountCache` for each app"""
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions[_CACHE_EXTENSION] = CountCache(app.config["TYMENU_COUNT_CACHE_TTL"])
+
+
+def get_count_cache() -> CountCache:
+    """The count cache of the current app."""
+    return current_app.extensions[_CACHE_EXTENSION]
+
+
+def _cache_key(query, max_total: int | None) -> tuple:
+    from .resources import get_db
+
+    compiled = query.statement.compile(dialect=get_db().engine.dialect)
+    params = tuple(sorted((k, repr(v)) for k, v in compiled.params.items()))
+    return (str(compiled), params, max_total)
+
+
+def count_query(query, max_total: int | None = None) -> int:
+    """Count the rows of a query. With ``max_total``, stop counting
+    after ``max_total + 1`` rows."""
+    query = query.order_by(None)
+    if max_total is None:
+        return query.count()
+    limited = query.limit(max_total + 1).subquery()
+    stmt = sql.select(sql.func.count()).select_from(limited)
+    return query.session.execute(stmt).scalar_one()
+
+
+class EstimatedPagination(QueryPagination):
+    """Offset pagination of a query which is counted only up to a limit.
+
+    Each page fetches one row more than it shows. Once the total is unknown
+    (``total`` is None), there is a next page as long as that row exists."""
+
+    def _query_items(self) -> list[Any]:
+        query = self._query_args["query"]
+        items = query.limit(self.per_page + 1).offset(self._query_offset).all()
+        self.has_more = len(items) > self.per_page
+        return items[: self.per_page]
+
+    @property
+    def pages(self) -> int:
+        if self.total is not None:
+            return super().pages
+        return self.page + 1 if self.has_more else self.page
+
+    @property
+    def has_next(self) -> bool:
+        if self.total is not None:
+            return super().has_next
+        return self.has_more
+
+
+def _total(query, cache_total: bool, max_total: int | None) -> int:
+    key = None
+    if cache_total:
+        key = _cache_key(query, max_total)
+        total = get_count_cache().get(key)
+        if total is not None:
+            return total
+    total = count_query(query, max_total=max_total)
+    if key is not None:
+        get_count_cache().set(key, total)
+    return total
+
+
+def paginate(
+    query,
+    page: int = 1,
+    per_page: int = 20,
+    cache_total: bool = False,
+    max_total: int | None = None,
+    count: bool = True,
+    keyset: tuple | None = None,
+    cursor: str | None = None,
+) -> Pagination | KeysetPagination:
+    """Paginate a query, counting the total number of rows only once.
+
+    :param cache_total: Reuse the total of an identical query from the
+        count cache, e.g. when flipping through pages of a search.
+    :param max_total: Estimate mode for large result sets. Count at most
+        this many rows. If there are more, ``pagination.total_is_estimate``
+        is set and ``pagination.total`` is None, while the pages continue
+        for as long as there are rows.
+    :param count: Count the total at all. Without it ``pagination.total``
+        is None, for lists which don't show it.
+    :param keyset: ``(timestamp_column, id_column)`` to page with a cursor
+        instead of an offset, see ``keyset_paginate``. The page is given by
+        the ``cursor`` token, and ``page`` is not used.
+    """
+    if keyset is not None:
+        timestamp_column, id_column = keyset
+        pagination = keyset_paginate(query, cursor, per_page, timestamp_column, id_column)
+    elif max_total is not None:
+        pagination = EstimatedPagination(
+            query=query, page=page, per_page=per_page, error_out=False, count=False
+        )
+    else:
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    pagination.max_total = max_total
+    if not count:
+        pagination.total_is_estimate = False
+        return pagination
+
+    total = _total(query, cache_total, max_total)
+    pagination.total_is_estimate = max_total is not None and total > max_total
+    pagination.total = None if pagination.total_is_estimate else total
+    return pagination
+
+
+class Cursor(NamedTuple):
+    """Position in a keyset pagination, i.e. the sort key of the row to continue from."""
+
+    timestamp: datetime.datetime
+    id: int
+    backwards: bool = False
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    timestamp = cursor.timestamp
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    data = {"t": timestamp.isoformat(), "i": cursor.id}
+    if cursor.backwards:
+        data["b"] = 1
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor | None:
+    """Decode a cursor token from a URL. Returns None if the token is invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        return Cursor(
+            datetime.datetime.fromisoformat(data["t"]), int(data["i"]), bool(data.get("b"))
+        )
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+
+
+class KeysetPagination:
+    """A page of a keyset pagination, with tokens to the neighbouring pages."""
+
+    def __init__(self, items: list[Any], per_page: int, next_cursor, prev_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor: str | None = next_cursor
+        self.prev_cursor: str | None = prev_cursor
+        self.total: int | None = None
+        self.total_is_estimate = False
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def keyset_paginate(
+    query, cursor: str | None, per_page: int, timestamp_column, id_column
+) -> KeysetPagination:
+    """Paginate a query newest first on ``(timestamp, id)``, continuing from the
+    cursor token. Unlike OFFSET pagination, the database seeks directly to
+    the position of the cursor, so deep pages are as fast as the first one.
+
+    An invalid or missing cursor gives the first page."""
+    position = decode_cursor(cursor) if cursor else None
+    backwards = position is not None and position.backwards
+
+    if position is None:
+        query = query.order_by(timestamp_column.desc(), id_column.desc())
+    elif backwards:
+        query = query.filter(
+            sql.or_(
+                timestamp_column > position.timestamp,
+                sql.and_(timestamp_column == position.timestamp, id_column > position.id),
+            )
+        ).order_by(timestamp_column.asc(), id_column.asc())
+    else:
+        query = query.filter(
+            sql.or_(
+                timestamp_column < position.timestamp,
+                sql.and_(timestamp_column == position.timestamp, id_column < position.id),
+            )
+        ).order_by(timestamp_column.desc(), id_column.desc())
+
+    # Fetch one extra row, to know if there are more pages in this direction.
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = position is not None, has_more
+
+    def _cursor(item, backwards: bool) -> str:
+        key = Cursor(getattr(item, timestamp_column.key), getattr(item, id_column.key), backwards)
+        return encode_cursor(key)
+
+    next_cursor = prev_cursor = None
+    if items and has_next:
+        next_cursor = _cursor(items[-1], backwards=False)
+    if items and has_prev:
+        prev_cursor = _cursor(items[0], backwards=True)
+    return KeysetPagination(items, per_page, next_cursor, prev_cursor)
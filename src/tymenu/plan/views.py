@@ -4,8 +4,10 @@ import logging
 
 from flask import flash, redirect, render_template, url_for
 from flask_login import current_user
+from sqlalchemy.orm import selectinload
 
-from tymenu.decorators import admin_required, mod_required
+from tymenu.conditional import conditional_render, page_etag
+from tymenu.decorators import admin_required, mod_required, read_only
 from tymenu.models import MenuPlan, MenuPlanItem, Recipe
 from tymenu.resources import get_db
 
@@ -53,9 +55,16 @@ def new_plan():
 
 
 @planner.route("/plan/view_plan/<int:plan_id>", methods=["GET"])
+@read_only
 def view_plan(plan_id):
-    plan = MenuPlan.query.get_or_404(plan_id)
-    return render_template("menu_plan/view_plan.html", plan=plan)
+    plan = MenuPlan.query.options(
+        selectinload(MenuPlan.recipe_plans).joinedload(MenuPlanItem.recipe)
+    ).get_or_404(plan_id)
+    return conditional_render(
+        page_etag("plan", plan.id, plan.version),
+        plan.last_modified,
+        lambda: render_template("menu_plan/view_plan.html", plan=plan),
+    )
 
 
 @planner.route("/plan/add_recipe/<int:plan_id>", methods=["GET", "POST"])
@@ -0,0 +1,46 @@
+"""Worker threads which are started on first use in each process.
+
+Threads don't survive a fork, so the workers of a prefork server or of a
+forked job process would wait forever on threads which only exist in the
+parent. :class:`ProcessLocal` remembers the process which started the
+workers, and starts them again when it's used in another process."""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class ProcessLocal(Generic[T]):
+    """A value which is created by ``factory`` once in each process"""
+
+    def __init__(self, factory: Callable[[], T]):
+        self.factory = factory
+        self._value: T | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        """Return the value of this process, and create it on first use"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return self._value
+        with self._lock:
+            if self._pid != pid:
+                self._value = self.factory()
+                self._pid = pid
+            return self._value
+
+    def peek(self) -> T | None:
+        """Return the value of this process, or None if it's not created yet"""
+        return self._value if self._pid == os.getpid() else None
+
+    def reset(self) -> T | None:
+        """Forget the value, and return it if it was created in this process"""
+        with self._lock:
+            value = self.peek()
+            self._value = None
+            self._pid = None
+        return value
@@ -0,0 +1,5 @@
+from .blueprint import profiling_blueprint
+from .profiler import Profiler, get_profiler, make_token
+from . import views
+
+__all__ = ["profiling_blueprint", "Profiler", "get_profiler", "make_token", "views"]
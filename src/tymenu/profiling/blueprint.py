@@ -0,0 +1,5 @@
+from __future__ import annotations
+
+from flask import Blueprint
+
+profiling_blueprint = Blueprint("profiling", __name__)
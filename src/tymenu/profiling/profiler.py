@@ -0,0 +1,199 @@
+"""Profiling of selected requests, if ``TYMENU_PROFILING`` is set.
+
+A request is profiled if it has a valid ``X-Tymenu-Profile`` header, made
+by ``flask profile-token``, or at random with the probability
+``TYMENU_PROFILING_RATE``. The profiler is a WSGI middleware, so the whole
+request is profiled: the routing, the view, the templates and the teardown.
+``TYMENU_PROFILING_MODE`` is "sampler" for a stack sampler, or "cprofile".
+
+The profiles are written to ``TYMENU_PROFILING_DIR``, with a JSON file of
+the request's details, and only the last ``TYMENU_PROFILING_KEEP`` are
+kept. The admins see them on ``/admin/profiles``."""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+import random
+import threading
+import time
+from typing import NamedTuple
+import uuid
+
+from flask import Flask, current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from ..timestamp import get_now_utc
+from .sampler import CProfiler, StackSampler
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION = "tymenu_profiler"
+_SALT = "tymenu-profile"
+HEADER = "X-Tymenu-Profile"
+ID_HEADER = "X-Tymenu-Profile-Id"
+_META_SUFFIX = ".meta.json"
+
+
+def _serializer(secret_key: str) -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(secret_key, salt=_SALT)
+
+
+def make_token(secret_key: str) -> str:
+    """Token for the profiling header, signed with the app's secret key"""
+    return _serializer(secret_key).dumps("profile")
+
+
+def _valid_token(token: str, secret_key: str, max_age: int) -> bool:
+    try:
+        return _serializer(secret_key).loads(token, max_age=max_age) == "profile"
+    except BadSignature:
+        return False
+
+
+class ProfileInfo(NamedTuple):
+    id: str
+    timestamp: str
+    method: str
+    path: str
+    status: str
+    duration_ms: float
+    mode: str
+    trigger: str
+    samples: int
+    files: list[str]
+
+
+class ProfileStore:
+    """The profile files of an app"""
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> Path:
+        return Path(self.app.config["TYMENU_PROFILING_DIR"])
+
+    def save(self, profiler, info: ProfileInfo) -> ProfileInfo:
+        directory = self.directory
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{info.method} {info.path} ({info.duration_ms:.0f} ms)"
+        paths = profiler.save(directory / info.id, name)
+        info = info._replace(samples=profiler.sample_count, files=[path.name for path in paths])
+        with open(directory / f"{info.id}{_META_SUFFIX}", "w", encoding="utf-8") as file:
+            json.dump(info._asdict(), file)
+        self._prune()
+        return info
+
+    def _meta_files(self) -> list[Path]:
+        # The ids start with the time, so they sort in the order the profiles were made.
+        return sorted(self.directory.glob(f"*{_META_SUFFIX}"), reverse=True)
+
+    def _prune(self) -> None:
+        with self._lock:
+            for meta in self._meta_files()[self.app.config["TYMENU_PROFILING_KEEP"] :]:
+                profile_id = meta.name[: -len(_META_SUFFIX)]
+                for path in self.directory.glob(f"{profile_id}.*"):
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+
+    def recent(self, limit: int = 50) -> list[ProfileInfo]:
+        if not self.directory.is_dir():
+            return []
+        profiles = []
+        for meta in self._meta_files()[:limit]:
+            try:
+                with open(meta, encoding="utf-8") as file:
+                    profiles.append(ProfileInfo(**json.load(file)))
+            except (OSError, ValueError, TypeError):
+                # Removed or being written
+                continue
+        return profiles
+
+
+class ProfilingMiddleware:
+    def __init__(self, wsgi_app, app: Flask, store: ProfileStore):
+        self.wsgi_app = wsgi_app
+        self.app = app
+        self.store = store
+
+    def _trigger(self, environ) -> str | None:
+        """Why the request is profiled, None if it is not."""
+        config = self.app.config
+        token = environ.get("HTTP_" + HEADER.upper().replace("-", "_"))
+        if token and _valid_token(
+            token, config["SECRET_KEY"], config["TYMENU_PROFILING_TOKEN_MAX_AGE"]
+        ):
+            return "header"
+        rate = config["TYMENU_PROFILING_RATE"]
+        if rate > 0 and random.random() < rate:
+            return "sample"
+        return None
+
+    def _profiler(self):
+        config = self.app.config
+        if config["TYMENU_PROFILING_MODE"] == "cprofile":
+            return CProfiler()
+        return StackSampler(interval=config["TYMENU_PROFILING_INTERVAL_MS"] / 1000)
+
+    def __call__(self, environ, start_response):
+        if not self.app.config["TYMENU_PROFILING"]:
+            return self.wsgi_app(environ, start_response)
+        trigger = self._trigger(environ)
+        if trigger is None:
+            return self.wsgi_app(environ, start_response)
+
+        profiler = self._profiler()
+        try:
+            profiler.start()
+        except ValueError:
+            # cProfile is already running, e.g. in another thread
+            return self.wsgi_app(environ, start_response)
+
+        now = get_now_utc()
+        profile_id = f"{now:%Y%m%d-%H%M%S-%f}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+        statuses = []
+
+        def _start_response(status, headers, exc_info=None):
+            statuses.append(status)
+            return start_response(status, [*headers, (ID_HEADER, profile_id)], exc_info)
+
+        start = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, _start_response)
+        finally:
+            profiler.stop()
+            info = ProfileInfo(
+                id=profile_id,
+                timestamp=now.isoformat(),
+                method=environ.get("REQUEST_METHOD", ""),
+                path=environ.get("PATH_INFO", ""),
+                status=statuses[-1] if statuses else "",
+                duration_ms=(time.perf_counter() - start) * 1000,
+                mode=self.app.config["TYMENU_PROFILING_MODE"],
+                trigger=trigger,
+                samples=0,
+                files=[],
+            )
+            try:
+                self.store.save(profiler, info)
+            except OSError as exc:
+                logger.error("Failed to save profile %s: %s", profile_id, exc)
+
+
+def get_profiler() -> ProfileStore:
+    return current_app.extensions[_EXTENSION]
+
+
+class Profiler:
+    """Flask extension profiling the selected requests. The middleware is always
+    installed, and does nothing unless ``TYMENU_PROFILING`` is set."""
+
+    def init_app(self, app: Flask) -> None:
+        store = ProfileStore(app)
+        app.extensions[_EXTENSION] = store
+        app.wsgi_app = ProfilingMiddleware(app.wsgi_app, app, store)
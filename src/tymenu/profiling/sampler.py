@@ -0,0 +1,172 @@
+"""Profilers of a single request, and their output formats.
+
+The :class:`StackSampler` records the call stack of the request's thread at
+a fixed interval from a background thread. It only sees Python frames, but
+its overhead does not depend on the number of calls, so the profile of e.g.
+``render_template`` is not distorted. The samples are written as collapsed
+stacks, the input of ``flamegraph.pl``, and as a speedscope file, which can
+be opened at https://www.speedscope.app.
+
+The :class:`CProfiler` records every call with cProfile, and writes a
+``.pstats`` file, e.g. for snakeviz or ``python -m pstats``."""
+from __future__ import annotations
+
+from collections import Counter
+import cProfile
+import json
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+from types import CodeType, FrameType
+
+Frame = tuple[str, str, int]
+Stack = tuple[Frame, ...]
+
+
+def _path_prefixes() -> list[str]:
+    prefixes = {os.path.abspath(path) + os.sep for path in sys.path if path}
+    return sorted(prefixes, key=len, reverse=True)
+
+
+class _FrameNames:
+    """Names of the code objects, with the file relative to sys.path"""
+
+    def __init__(self):
+        self._prefixes = _path_prefixes()
+        self._names: dict[CodeType, Frame] = {}
+
+    def __call__(self, code: CodeType) -> Frame:
+        name = self._names.get(code)
+        if name is None:
+            filename = code.co_filename
+            for prefix in self._prefixes:
+                if filename.startswith(prefix):
+                    filename = filename[len(prefix) :]
+                    break
+            name = self._names[code] = (code.co_name, filename, code.co_firstlineno)
+        return name
+
+
+class StackSampler:
+    """Samples the stack of one thread, from ``start`` until ``stop``."""
+
+    suffixes = (".collapsed.txt", ".speedscope.json")
+
+    def __init__(self, thread_id: int | None = None, interval: float = 0.001):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples: Counter[Stack] = Counter()
+        # Seconds of each stack, the sampling is not exactly periodic.
+        self.weights: Counter[Stack] = Counter()
+        self._names = _FrameNames()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _stack(self, frame: FrameType | None) -> Stack:
+        stack = []
+        while frame is not None:
+            stack.append(self._names(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = self._stack(frame)
+            del frame
+            self.samples[stack] += 1
+            self.weights[stack] += now - last
+            last = now
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.samples.values())
+
+    def collapsed(self) -> str:
+        """One line per stack: the frames separated by ';', and the number of samples."""
+        lines = []
+        for stack, count in self.samples.most_common():
+            frames = ";".join(f"{name} ({filename}:{line})" for name, filename, line in stack)
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> dict:
+        frames: list[dict] = []
+        index: dict[Frame, int] = {}
+        samples = []
+        weights = []
+        for stack, seconds in self.weights.items():
+            sample = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                sample.append(index[frame])
+            samples.append(sample)
+            weights.append(seconds * 1000)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+            "name": name,
+            "exporter": "tymenu",
+        }
+
+    def save(self, base: Path, name: str) -> list[Path]:
+        collapsed, speedscope = (base.with_name(base.name + suffix) for suffix in self.suffixes)
+        collapsed.write_text(self.collapsed(), encoding="utf-8")
+        with open(speedscope, "w", encoding="utf-8") as file:
+            json.dump(self.speedscope(name), file, separators=(",", ":"))
+        return [collapsed, speedscope]
+
+
+class CProfiler:
+    """Deterministic profile of the calling thread"""
+
+    suffixes = (".pstats",)
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self.profile.enable()
+
+    def stop(self) -> None:
+        self.profile.disable()
+
+    @property
+    def sample_count(self) -> int:
+        # The number of distinct functions called
+        self.profile.create_stats()
+        return len(self.profile.stats)
+
+    def save(self, base: Path, name: str) -> list[Path]:
+        path = base.with_name(base.name + self.suffixes[0])
+        self.profile.dump_stats(path)
+        return [path]
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from functools import wraps
+
+from flask import abort, current_app, render_template, send_from_directory
+from flask_login import current_user, login_required
+
+from .blueprint import profiling_blueprint as profiling
+from .profiler import get_profiler
+
+
+def admin_required(f):
+    # Not tymenu.decorators, which imports the models, as the extension is
+    # created before the models are defined.
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_administrator():
+            abort(403)
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+@profiling.route("/admin/profiles")
+@login_required
+@admin_required
+def list_profiles():
+    profiles = get_profiler().recent(current_app.config["TYMENU_PROFILING_LIST"])
+    return render_template(
+        "profiling/profiles.html",
+        profiles=profiles,
+        enabled=current_app.config["TYMENU_PROFILING"],
+    )
+
+
+@profiling.route("/admin/profiles/<path:filename>")
+@login_required
+@admin_required
+def download_profile(filename):
+    return send_from_directory(get_profiler().directory.resolve(), filename, as_attachment=True)
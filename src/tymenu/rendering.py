@@ -0,0 +1,120 @@
+"""Markdown to sanitized HTML rendering, with memoization of the output"""
+from __future__ import annotations
+
+from collections import OrderedDict
+import hashlib
+import threading
+
+import bleach
+from bleach.linkifier import Linker
+import emoji
+from flask import Flask, current_app, has_app_context
+from markdown import Markdown
+
+ALLOWED_TAGS = frozenset(
+    [
+        "a",
+        "abbr",
+        "acronym",
+        "b",
+        "blockquote",
+        "code",
+        "em",
+        "i",
+        "li",
+        "ol",
+        "pre",
+        "strong",
+        "ul",
+        "h1",
+        "h2",
+        "h3",
+        "p",
+    ]
+)
+
+_EXTENSION = "tymenu_markdown_renderer"
+
+
+class MarkdownRenderer:
+    """Render Markdown into sanitized HTML.
+
+    The Markdown converter, the bleach ``Cleaner`` and ``Linker`` are built once
+    per thread (they are not thread-safe) and reused for every render.
+    The output is memoized by a hash of the input in a bounded LRU cache,
+    which is shared between threads."""
+
+    def __init__(self, max_size: int = 2048, allowed_tags=ALLOWED_TAGS):
+        self.max_size = max_size
+        self.allowed_tags = allowed_tags
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[bytes, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _pipeline(self) -> tuple[Markdown, bleach.Cleaner, Linker]:
+        local = self._local
+        if not hasattr(local, "markdown"):
+            local.markdown = Markdown(output_format="html")
+            local.cleaner = bleach.Cleaner(tags=self.allowed_tags, strip=True)
+            local.linker = Linker()
+        return local.markdown, local.cleaner, local.linker
+
+    def render_uncached(self, value: str, emojify: bool = True) -> str:
+        md, cleaner, linker = self._pipeline()
+        html = md.reset().convert(value)
+        cleaned = linker.linkify(cleaner.clean(html))
+        if emojify:
+            cleaned = emoji.emojize(cleaned, language="alias", variant="emoji_type")
+        return cleaned
+
+    def render(self, value: str, emojify: bool = True) -> str:
+        key = hashlib.sha256(value.encode("utf-8")).digest() + (b"1" if emojify else b"0")
+        with self._lock:
+            cleaned = self._cache.get(key)
+            if cleaned is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cleaned
+            self.misses += 1
+
+        cleaned = self.render_uncached(value, emojify=emojify)
+
+        if self.max_size > 0:
+            with self._lock:
+                self._cache[key] = cleaned
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+        return cleaned
+
+    @property
+    def size(self) -> int:
+        return len(self._cache)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": self.size}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Used outside of an app context, e.g. by the benchmarks
+_RENDERER = MarkdownRenderer()
+
+
+class MarkdownRendering:
+    """Flask extension keeping a :class:`MarkdownRenderer` for each app"""
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions[_EXTENSION] = MarkdownRenderer(app.config["TYMENU_MARKDOWN_CACHE_SIZE"])
+
+
+def get_renderer() -> MarkdownRenderer:
+    """The renderer of the current app, or the default one outside of an app."""
+    if not has_app_context():
+        return _RENDERER
+    return current_app.extensions[_EXTENSION]
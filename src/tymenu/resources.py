@@ -12,18 +12,50 @@ from flask_moment import Moment
 from flask_pagedown import PageDown
 from flask_sqlalchemy import SQLAlchemy
 
-__all__ = ["get_db", "get_login_manager", "get_plugins", "init_plugins"]
+from .cache import FragmentCache
+from .email_dispatcher import EmailDispatcher
+from .instrumentation import QueryInstrumentation
+from .metrics import Metrics
+from .pagination import CountCaching
+from .profiling import Profiler
+from .rendering import MarkdownRendering
+from .routing import ReplicaRouting, RoutingSession
+from .sqlite_tuning import SQLiteTuning
+from .uploads import UploadQueue
+from .user_cache import UserCaching
+
+__all__ = [
+    "get_db",
+    "get_email_dispatcher",
+    "get_fragment_cache",
+    "get_login_manager",
+    "get_plugins",
+    "get_upload_queue",
+    "init_plugins",
+]
 
 logger = logging.getLogger(__name__)
 
 _RESOURCES = {
     "bootstrap": Bootstrap(),
     "moment": Moment(),
-    "db": SQLAlchemy(),
+    # Before the database, for the pool class
+    "metrics": Metrics(),
+    "db": SQLAlchemy(session_options={"class_": RoutingSession}),
+    "replica_routing": ReplicaRouting(),
+    "sqlite_tuning": SQLiteTuning(),
     "login_manager": LoginManager(),
     "pagedown": PageDown(),
     "mail": Mail(),
+    "email_dispatcher": EmailDispatcher(),
     "datepicker": datepicker(),
+    "fragment_cache": FragmentCache(),
+    "count_caching": CountCaching(),
+    "markdown_rendering": MarkdownRendering(),
+    "user_caching": UserCaching(),
+    "query_instrumentation": QueryInstrumentation(),
+    "profiler": Profiler(),
+    "upload_queue": UploadQueue(),
 }
 _RESOURCES["login_manager"].login_view = "auth.login"
 
@@ -40,6 +72,18 @@ def get_mail() -> Mail:
     return _RESOURCES["mail"]
 
 
+def get_email_dispatcher() -> EmailDispatcher:
+    return _RESOURCES["email_dispatcher"]
+
+
+def get_fragment_cache() -> FragmentCache:
+    return _RESOURCES["fragment_cache"]
+
+
+def get_upload_queue() -> UploadQueue:
+    return _RESOURCES["upload_queue"]
+
+
 def get_plugins() -> dict[str, Any]:
     return _RESOURCES.copy()
 
@@ -0,0 +1,101 @@
+"""Routing of the reads to read replicas.
+
+``TYMENU_REPLICA_URLS`` is a comma separated list of the database URLs of
+the replicas, which get engines with the same options as the primary. The
+views decorated with :func:`read_only` read from one of the replicas, picked
+at random for each request. Everything else goes to the primary
+``SQLALCHEMY_DATABASE_URI``: writes, reads in the other views, and work
+outside of requests.
+
+The replicas lag behind the primary, so a user reads their own writes from
+the primary: once a request writes, its following queries use the primary,
+and so do the user's requests in the next ``TYMENU_READ_AFTER_WRITE_SECONDS``,
+which is tracked in the session cookie.
+
+The replicas are not binds of Flask-SQLAlchemy, as they hold the same tables
+as the primary, which e.g. ``db.create_all`` must not create in them."""
+from __future__ import annotations
+
+import random
+import time
+
+from flask import Flask, Response, current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+import sqlalchemy as sql
+from sqlalchemy.engine import Engine
+
+_EXTENSION = "tymenu_replicas"
+_SESSION_KEY = "_primary_until"
+
+
+def read_only(f):
+    """Mark a view as read-only, so it can read from a replica"""
+    f._tymenu_read_only = True
+    return f
+
+
+def _is_read_only_view() -> bool:
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, "_tymenu_read_only", False)
+
+
+def get_replicas() -> list[Engine]:
+    """The engines of the replicas of the current app"""
+    return current_app.extensions.get(_EXTENSION, [])
+
+
+def _choose_replica() -> None:
+    replicas = get_replicas()
+    if not replicas or not _is_read_only_view():
+        return
+    if session.get(_SESSION_KEY, 0) > time.time():
+        # The user wrote recently, the replicas may not have it yet.
+        return
+    g._replica = random.choice(replicas)
+
+
+def _remember_write(response: Response) -> Response:
+    if g.get("_db_write"):
+        window = current_app.config["TYMENU_READ_AFTER_WRITE_SECONDS"]
+        if window > 0 and get_replicas():
+            session[_SESSION_KEY] = time.time() + window
+    return response
+
+
+def _is_write(session: Session, clause) -> bool:
+    return session._flushing or getattr(clause, "is_dml", False)
+
+
+def _is_plain_select(clause) -> bool:
+    return getattr(clause, "is_select", False) and getattr(clause, "_for_update_arg", None) is None
+
+
+class RoutingSession(Session):
+    """Session which sends the selects of read-only views to a replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if _is_write(self, clause):
+                g._db_write = True
+                g.pop("_replica", None)
+            elif _is_plain_select(clause) and "_replica" in g:
+                return g._replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_urls(config) -> list[str]:
+    return [
+        url.strip() for url in (config.get("TYMENU_REPLICA_URLS") or "").split(",") if url.strip()
+    ]
+
+
+class ReplicaRouting:
+    """Flask extension creating the engines of the replicas"""
+
+    def init_app(self, app: Flask) -> None:
+        app.before_request(_choose_replica)
+        app.after_request(_remember_write)
+        options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        engines = [sql.create_engine(url, **options) for url in replica_urls(app.config)]
+        if engines:
+            app.extensions[_EXTENSION] = engines
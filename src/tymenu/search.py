@@ -39,3 +39,14 @@ def query_substrings(column, *substrings: str, exclude: bool = False):
 
     queries = [_query_maker(substring) for substring in substrings]
     return queries
+
+
+def query_range(column, minimum=None, maximum=None):
+    """Helper function to query values of a column within a range,
+    including the bounds. Rows without a value do not match."""
+    queries = []
+    if minimum is not None:
+        queries.append(column >= minimum)
+    if maximum is not None:
+        queries.append(column <= maximum)
+    return queries
@@ -0,0 +1,156 @@
+"""Tuning of SQLite databases, if ``TYMENU_SQLITE_TUNING`` is set.
+
+Each new connection to a SQLite file gets the pragmas of the ``TYMENU_SQLITE_*``
+config:
+
+* ``journal_mode=WAL``: readers don't block the writer and the writer
+  doesn't block the readers, so a commit in an edit view doesn't stall the
+  other requests. The mode is stored in the database file.
+* ``synchronous=NORMAL``: in WAL mode the database stays consistent, but the
+  last commits may be lost on a power failure, not on an app crash.
+* ``mmap_size`` and ``cache_size``: read the pages through a memory map, and
+  keep more of them in the page cache of each connection.
+* ``busy_timeout``: wait this long for the write lock instead of failing with
+  "database is locked".
+
+The WAL file is merged into the database by checkpoints. SQLite runs them
+when a commit makes the WAL long, but a checkpoint can't finish while readers
+use the old pages, so under constant reads the WAL keeps growing. A thread in
+each process therefore runs ``PRAGMA wal_checkpoint`` and ``PRAGMA optimize``
+every ``TYMENU_SQLITE_MAINTENANCE_INTERVAL`` seconds. ``flask sqlite-maintenance``
+does the same once, with a truncating checkpoint."""
+from __future__ import annotations
+
+import atexit
+from dataclasses import dataclass
+import logging
+import threading
+
+from flask import Flask
+import sqlalchemy as sql
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .process_local import ProcessLocal
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION = "tymenu_sqlite_tuning"
+
+
+def is_sqlite_file(engine: Engine) -> bool:
+    database = engine.url.database
+    return engine.dialect.name == "sqlite" and database not in (None, "", ":memory:")
+
+
+def _pragmas(config) -> list[str]:
+    return [
+        f"PRAGMA journal_mode={config['TYMENU_SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['TYMENU_SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(config['TYMENU_SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size={int(config['TYMENU_SQLITE_CACHE_SIZE'])}",
+        f"PRAGMA busy_timeout={int(config['TYMENU_SQLITE_BUSY_TIMEOUT_MS'])}",
+    ]
+
+
+def _listen_connect(engine: Engine, pragmas: list[str]) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+@dataclass
+class MaintenanceResult:
+    busy: bool
+    wal_pages: int
+    checkpointed_pages: int
+
+
+def run_maintenance(engine: Engine, mode: str = "PASSIVE") -> MaintenanceResult:
+    """Checkpoint the WAL and update the query planner's statistics"""
+    with engine.connect() as conn:
+        busy, wal_pages, checkpointed = conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one()
+        conn.exec_driver_sql("PRAGMA optimize")
+        conn.commit()
+    return MaintenanceResult(bool(busy), wal_pages, checkpointed)
+
+
+class _Maintenance:
+    """The maintenance thread of an app, started on first use in each process"""
+
+    def __init__(self, engines: list[Engine], interval: float, mode: str):
+        self.engines = engines
+        self.interval = interval
+        self.mode = mode
+        self._stop = threading.Event()
+        self._thread = ProcessLocal(self._start)
+
+    def _start(self) -> threading.Thread:
+        self._stop = threading.Event()
+        thread = threading.Thread(target=self._run, name="sqlite-maintenance", daemon=True)
+        thread.start()
+        atexit.register(self._stop.set)
+        return thread
+
+    def start(self) -> None:
+        self._thread.get()
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread = self._thread.reset()
+        if thread is not None:
+            thread.join()
+
+    def _run(self) -> None:
+        stop = self._stop
+        while not stop.wait(self.interval):
+            for engine in self.engines:
+                try:
+                    result = run_maintenance(engine, self.mode)
+                except sql.exc.SQLAlchemyError as exc:
+                    logger.warning("SQLite maintenance of %s failed: %s", engine.url, exc)
+                    continue
+                if result.busy:
+                    logger.info(
+                        "Checkpoint of %s was blocked, %d of %d WAL pages done.",
+                        engine.url.database,
+                        result.checkpointed_pages,
+                        result.wal_pages,
+                    )
+
+
+def sqlite_engines(app: Flask) -> list[Engine]:
+    """The engines of the app which use SQLite files, including the replicas"""
+    from .resources import get_db
+    from .routing import get_replicas
+
+    with app.app_context():
+        engines = [*get_db().engines.values(), *get_replicas()]
+    return [engine for engine in engines if is_sqlite_file(engine)]
+
+
+class SQLiteTuning:
+    """Flask extension setting the pragmas of SQLite connections, and running
+    the maintenance. It must come after the database and the replicas."""
+
+    def init_app(self, app: Flask) -> None:
+        if not app.config.get("TYMENU_SQLITE_TUNING"):
+            return
+        engines = sqlite_engines(app)
+        if not engines:
+            return
+        pragmas = _pragmas(app.config)
+        for engine in engines:
+            _listen_connect(engine, pragmas)
+        interval = app.config["TYMENU_SQLITE_MAINTENANCE_INTERVAL"]
+        if interval > 0:
+            maintenance = _Maintenance(
+                engines, interval, app.config["TYMENU_SQLITE_CHECKPOINT_MODE"]
+            )
+            app.extensions[_EXTENSION] = maintenance
+            app.before_request(maintenance.start)
@@ -0,0 +1,219 @@
+"""Normalized keywords and ingredients of the recipes.
+
+The free-text ``keywords`` and ``ingredients`` of a recipe are parsed into
+terms, which are stored once in the ``keyword`` and ``ingredient`` tables and
+linked to the recipes by the ``recipe_keyword`` and ``recipe_ingredient``
+tables. A keyword is each comma separated phrase of the keywords, an
+ingredient is each word of the ingredients. The words are lower case and in
+singular, so "Eggs" finds "egg", but not "eggplant".
+
+Searches select the ids of the recipes from the link tables, using the index
+on the term id, and combine the searched terms as set operations in the
+database: "and" is an intersection, "or" a union. The work depends on the
+number of matching links, not on the number of recipes.
+
+The links are written by the mapper events of ``Recipe`` when a recipe is
+saved. Rows inserted with Core, e.g. by the bulk seeder or the import, are
+indexed with ``Recipe.index_terms``, and ``flask reindex-terms`` indexes all
+recipes again."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+import re
+from typing import Callable, Iterable
+
+import sqlalchemy as sql
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from .search import get_operation
+
+# Length of the name column of the term tables
+MAX_TERM_LENGTH = 64
+# The names are compared as bytes. With the accent insensitive default
+# collation of MySQL, "café" would be a duplicate of "cafe", so it wasn't
+# inserted and had no id.
+TERM_NAME_TYPE = sql.String(MAX_TERM_LENGTH).with_variant(
+    mysql.VARCHAR(MAX_TERM_LENGTH, charset="utf8mb4", collation="utf8mb4_bin"), "mysql"
+)
+# Names per IN (...) when looking up the terms
+_CHUNK_SIZE = 500
+
+_LETTERS_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_KEYWORD_SEPARATOR_RE = re.compile(r"[,;\n]")
+
+# Words of the ingredients which are not ingredients
+STOP_WORDS = frozenset(
+    {
+        "and",
+        "or",
+        "of",
+        "with",
+        "to",
+        "the",
+        "for",
+        "some",
+        "lots",
+        "dl",
+        "ml",
+        "cl",
+        "kg",
+        "tsp",
+        "tbsp",
+        "cup",
+        "pinch",
+        "pcs",
+    }
+)
+
+
+def normalize(word: str) -> str:
+    """Lower case, and a light conversion to singular,
+    which is the same for the word in singular and plural."""
+    word = word.lower()
+    if len(word) > 4 and word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif len(word) > 4 and word.endswith("oes"):
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    if len(word) > 4 and word.endswith("ie"):
+        # cookie and cookies are both cooky
+        word = word[:-2] + "y"
+    return word
+
+
+def parse_keywords(text: str | None) -> set[str]:
+    """The normalized keywords, each phrase separated by a comma"""
+    keywords = set()
+    for phrase in _KEYWORD_SEPARATOR_RE.split(text or ""):
+        keyword = " ".join(normalize(word) for word in _WORD_RE.findall(phrase))
+        if keyword:
+            keywords.add(keyword[:MAX_TERM_LENGTH])
+    return keywords
+
+
+def parse_ingredients(text: str | None) -> set[str]:
+    """The normalized words of the ingredients, without amounts and units"""
+    ingredients = set()
+    for word in _LETTERS_RE.findall(text or ""):
+        word = normalize(word)
+        if len(word) > 1 and word not in STOP_WORDS:
+            ingredients.add(word[:MAX_TERM_LENGTH])
+    return ingredients
+
+
+def _insert_ignore(connection, table: sql.Table, rows: list[dict]) -> None:
+    """Insert the rows, skipping those which violate a unique constraint"""
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        module = sqlite if dialect == "sqlite" else postgresql
+        connection.execute(module.insert(table).on_conflict_do_nothing(), rows)
+    elif dialect == "mysql":
+        connection.execute(table.insert().prefix_with("IGNORE"), rows)
+    else:
+        for row in rows:
+            try:
+                with connection.begin_nested():
+                    connection.execute(table.insert(), row)
+            except sql.exc.IntegrityError:
+                pass
+
+
+def _chunks(items: list, size: int = _CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+@dataclass(frozen=True)
+class TermIndex:
+    """A table of terms, and the table linking them to the recipes"""
+
+    terms: sql.Table
+    links: sql.Table
+    parse: Callable[[str | None], set[str]]
+
+    @property
+    def term_id(self) -> sql.Column:
+        return self.links.c[f"{self.terms.name}_id"]
+
+    @property
+    def recipe_id(self) -> sql.Column:
+        return self.links.c.recipe_id
+
+    def recipe_ids(self, names: set[str]) -> sql.Select:
+        """Select the ids of the recipes which have all of the terms"""
+        select = (
+            sql.select(self.recipe_id)
+            .join(self.terms, self.terms.c.id == self.term_id)
+            .where(self.terms.c.name.in_(sorted(names)))
+        )
+        if len(names) > 1:
+            # One link per recipe and term
+            select = select.group_by(self.recipe_id).having(sql.func.count() == len(names))
+        return select
+
+    def filter(self, id_column, *strings: str, operation="and", exclude: bool = False):
+        """Filter clause on the recipe ids, for the recipes with the terms
+        of each string, combined with the operation of ``get_operation``.
+        Strings without any terms are ignored."""
+        op = get_operation(operation)
+        selects = [self.recipe_ids(names) for string in strings if (names := self.parse(string))]
+        if not selects:
+            return sql.true()
+        if op in (sql.and_, sql.or_):
+            # With exclude, not a and not b is not (a or b), and vice versa
+            intersection = (op is sql.and_) != exclude
+            if len(selects) == 1:
+                ids = selects[0]
+            elif intersection:
+                ids = sql.intersect(*selects)
+            else:
+                ids = sql.union(*selects)
+            clause = id_column.in_(ids)
+            return sql.not_(clause) if exclude else clause
+        clauses = [id_column.in_(select) for select in selects]
+        if exclude:
+            clauses = [sql.not_(clause) for clause in clauses]
+        return op(*clauses)
+
+    def _term_ids(self, connection, names: set[str]) -> dict[str, int]:
+        """Ids of the terms, adding the terms which are new"""
+        name_column = self.terms.c.name
+        ids = {}
+        for chunk in _chunks(sorted(names)):
+            ids.update(
+                connection.execute(
+                    sql.select(name_column, self.terms.c.id).where(name_column.in_(chunk))
+                ).all()
+            )
+        missing = sorted(names - ids.keys())
+        if missing:
+            # Another transaction may add the same terms at the same time
+            _insert_ignore(connection, self.terms, [{"name": name} for name in missing])
+            for chunk in _chunks(missing):
+                ids.update(
+                    connection.execute(
+                        sql.select(name_column, self.terms.c.id).where(name_column.in_(chunk))
+                    ).all()
+                )
+        return ids
+
+    def update(self, connection, texts: dict[int, str | None], replace: bool = True) -> None:
+        """Link the recipes to the terms of their text by recipe id. With
+        ``replace`` the old links are removed, which new recipes don't have."""
+        if replace:
+            self.delete(connection, texts)
+        names = {recipe_id: self.parse(text) for recipe_id, text in texts.items()}
+        ids = self._term_ids(connection, set().union(*names.values()))
+        rows = [
+            {"recipe_id": recipe_id, self.term_id.name: ids[name]}
+            for recipe_id, recipe_names in names.items()
+            for name in recipe_names
+        ]
+        if rows:
+            connection.execute(self.links.insert(), rows)
+
+    def delete(self, connection, recipe_ids: Iterable[int]) -> None:
+        for chunk in _chunks(list(recipe_ids)):
+            connection.execute(self.links.delete().where(self.recipe_id.in_(chunk)))
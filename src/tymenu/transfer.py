@@ -0,0 +1,215 @@
+"""Bulk export and import of the data as NDJSON.
+
+The file starts with a header line, followed by one line per row::
+
+    {"format": "tymenu", "version": 1}
+    {"table": "users", "row": {"id": 1, "email": ..., "role": "Administrator"}}
+    {"table": "recipe", "row": {"id": 1, "author_id": 1, ...}}
+
+The tables are written in dependency order, so a row only refers to rows
+earlier in the file. Roles are written by name, as the roles are created by
+``Role.insert_roles`` in each database. The format does not depend on the
+database, so it can move data between e.g. SQLite and MySQL.
+
+Rows are read with ``yield_per`` and written as they are read, and imported
+in batches with executemany, so the memory use does not depend on the
+number of rows. Imported rows get new ids after the largest id in the
+database, and the foreign keys are remapped to the new ids. Users with an
+email and recipes with a title which exist already are not imported; the
+rows which refer to them use the existing rows instead."""
+from __future__ import annotations
+
+import datetime
+import gzip
+import io
+import json
+import logging
+import sys
+from typing import IO, Iterator
+
+import sqlalchemy as sql
+
+from .models import (
+    MenuPlan,
+    MenuPlanInstance,
+    MenuPlanItem,
+    Recipe,
+    Role,
+    User,
+    kcal_per_person,
+)
+from .resources import get_db
+
+logger = logging.getLogger(__name__)
+
+FORMAT = "tymenu"
+VERSION = 1
+
+# In dependency order
+TABLES: dict[str, sql.Table] = {
+    model.__tablename__: model.__table__
+    for model in (User, Recipe, MenuPlan, MenuPlanItem, MenuPlanInstance)
+}
+# Rows which exist already, found by these columns
+NATURAL_KEYS = {"users": "email", "recipe": "title"}
+
+
+def open_file(path: str, mode: str) -> IO[str]:
+    """Open a text file, compressed if the name ends with .gz. "-" is stdin/stdout."""
+    if path == "-":
+        return io.TextIOWrapper(
+            sys.stdout.buffer if "w" in mode else sys.stdin.buffer, encoding="utf-8"
+        )
+    if path.endswith(".gz"):
+        return gzip.open(path, f"{mode}t", encoding="utf-8", compresslevel=6)
+    return open(path, mode, encoding="utf-8")
+
+
+def _encode(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def _decoders(table: sql.Table) -> dict[str, type]:
+    decoders = {}
+    for column in table.columns:
+        if isinstance(column.type, sql.DateTime):
+            decoders[column.name] = datetime.datetime.fromisoformat
+        elif isinstance(column.type, sql.Date):
+            decoders[column.name] = datetime.date.fromisoformat
+    return decoders
+
+
+def _foreign_keys(table: sql.Table) -> dict[str, str]:
+    """Column name -> name of the referenced table, of the exported tables"""
+    return {
+        fk.parent.name: fk.column.table.name
+        for fk in table.foreign_keys
+        if fk.column.table.name in TABLES
+    }
+
+
+def iter_rows(yield_per: int = 1000) -> Iterator[tuple[str, dict]]:
+    db = get_db()
+    role_names = dict(db.session.execute(sql.select(Role.id, Role.name)).all())
+    for name, table in TABLES.items():
+        stmt = sql.select(table).order_by(table.c.id).execution_options(yield_per=yield_per)
+        for row in db.session.execute(stmt).mappings():
+            values = {key: _encode(value) for key, value in row.items()}
+            if name == "users":
+                values["role"] = role_names.get(values.pop("role_id"))
+            yield name, values
+
+
+def export_data(file: IO[str], yield_per: int = 1000) -> dict[str, int]:
+    """Write all rows to the file. Returns the number of rows per table."""
+    counts = dict.fromkeys(TABLES, 0)
+    file.write(json.dumps({"format": FORMAT, "version": VERSION}) + "\n")
+    for name, values in iter_rows(yield_per):
+        file.write(json.dumps({"table": name, "row": values}, separators=(",", ":")) + "\n")
+        counts[name] += 1
+    file.flush()
+    return counts
+
+
+class _Importer:
+    def __init__(self, batch_size: int):
+        self.db = get_db()
+        self.batch_size = batch_size
+        self.id_maps: dict[str, dict[int, int]] = {name: {} for name in TABLES}
+        self.next_ids: dict[str, int] = {}
+        self.existing: dict[str, dict] = {}
+        self.counts = dict.fromkeys(TABLES, 0)
+        self.skipped = dict.fromkeys(TABLES, 0)
+        self.batch: list[dict] = []
+        self.batch_table: str | None = None
+        self.decoders = {name: _decoders(table) for name, table in TABLES.items()}
+        self.foreign_keys = {name: _foreign_keys(table) for name, table in TABLES.items()}
+        roles = self.db.session.execute(sql.select(Role.name, Role.id, Role.default)).all()
+        self.role_ids = {role_name: role_id for role_name, role_id, _ in roles}
+        self.default_role_id = next((role_id for _, role_id, default in roles if default), None)
+
+    def _start_table(self, name: str) -> None:
+        table = TABLES[name]
+        max_id = self.db.session.execute(sql.select(sql.func.max(table.c.id))).scalar()
+        self.next_ids[name] = (max_id or 0) + 1
+        if name in NATURAL_KEYS:
+            key = table.c[NATURAL_KEYS[name]]
+            self.existing[name] = dict(self.db.session.execute(sql.select(key, table.c.id)).all())
+
+    def add(self, name: str, values: dict) -> None:
+        if name not in TABLES:
+            raise ValueError(f"Unknown table: {name}")
+        if name not in self.next_ids:
+            self._start_table(name)
+        if name != self.batch_table:
+            # The rows of the previous table may be referred to by this one
+            self.flush()
+            self.batch_table = name
+
+        old_id = values["id"]
+        existing_id = self.existing.get(name, {}).get(values.get(NATURAL_KEYS.get(name)))
+        if existing_id is not None:
+            self.id_maps[name][old_id] = existing_id
+            self.skipped[name] += 1
+            return
+
+        for column, decode in self.decoders[name].items():
+            if values.get(column) is not None:
+                values[column] = decode(values[column])
+        for column, target in self.foreign_keys[name].items():
+            if values.get(column) is not None:
+                try:
+                    values[column] = self.id_maps[target][values[column]]
+                except KeyError:
+                    raise ValueError(
+                        f"{name} {old_id} refers to {target} {values[column]}, "
+                        "which is not in the file."
+                    ) from None
+        if name == "users":
+            values["role_id"] = self.role_ids.get(values.pop("role", None), self.default_role_id)
+        elif name == "recipe":
+            # Computed by the ORM events, which the inserts skip
+            values["kcal_per_person"] = kcal_per_person(
+                values.get("kcal"), values.get("kcal_type"), values.get("servings")
+            )
+
+        new_id = self.next_ids[name]
+        self.next_ids[name] += 1
+        self.id_maps[name][old_id] = new_id
+        values["id"] = new_id
+        self.batch.append(values)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.batch:
+            return
+        self.db.session.execute(sql.insert(TABLES[self.batch_table]), self.batch)
+        if self.batch_table == "recipe":
+            Recipe.index_terms(self.db.session.connection(), self.batch, replace=False)
+        self.counts[self.batch_table] += len(self.batch)
+        self.batch = []
+
+
+def import_data(file: IO[str], batch_size: int = 1000) -> tuple[dict[str, int], dict[str, int]]:
+    """Import the rows of the file in one transaction.
+    Returns the number of imported and skipped rows per table."""
+    header = json.loads(file.readline() or "{}")
+    if header.get("format") != FORMAT or header.get("version") != VERSION:
+        raise ValueError(f"Not a {FORMAT} export (version {VERSION}): {header!r}")
+
+    db = get_db()
+    importer = _Importer(batch_size)
+    try:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                importer.add(entry["table"], entry["row"])
+        importer.flush()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return importer.counts, importer.skipped
@@ -0,0 +1,224 @@
+"""Background upload of recipe images.
+
+An upload is saved to the spool directory ``TYMENU_UPLOAD_SPOOL_DIR`` and
+recorded as an :class:`~tymenu.models.UploadJob`, so the request returns at
+once. A pool of ``TYMENU_UPLOAD_WORKERS`` threads stores the images, see
+:mod:`tymenu.image_store`, and sets the image of the recipe when the upload
+is done. With 0 workers the upload runs in the request.
+
+A job is claimed by changing its status from pending to running, so a job is
+only processed once, even by multiple processes. A job which fails in any way
+is marked as failed, and its spooled file is removed. Jobs which are still
+pending after a restart are sent by the ``flask resume-uploads`` command,
+which also queues the running jobs of a crashed process again, once they have
+run for ``TYMENU_UPLOAD_STALE_SECONDS``.
+
+The models are imported in the functions, as the extension is created
+before the models are defined."""
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import datetime
+import logging
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+import uuid
+
+from flask import Flask, current_app
+import sqlalchemy as sql
+from werkzeug.datastructures import FileStorage
+
+from .image_store import make_store
+from .imgbb import UploadError
+from .process_local import ProcessLocal
+from .timestamp import get_now_utc
+
+if TYPE_CHECKING:
+    from .models import Recipe, UploadJob, User
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION = "tymenu_upload_queue"
+
+
+def _spool(file: FileStorage, directory: str) -> str:
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    suffix = Path(file.filename or "").suffix.lower()
+    path = os.path.join(directory, f"{uuid.uuid4().hex}{suffix}")
+    file.save(path)
+    return path
+
+
+def _claim(job_id: int) -> bool:
+    from .models import UploadJob, UploadStatus
+    from .resources import get_db
+
+    db = get_db()
+    claimed = db.session.execute(
+        sql.update(UploadJob)
+        .where(UploadJob.id == job_id, UploadJob.status == UploadStatus.PENDING)
+        .values(status=UploadStatus.RUNNING, last_updated=get_now_utc())
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def process_job(app: Flask, job_id: int) -> None:
+    """Send the image of a pending job, and update the recipe."""
+    from .models import UploadJob, UploadStatus
+    from .resources import get_db, get_fragment_cache
+
+    with app.app_context():
+        db = get_db()
+        try:
+            if not _claim(job_id):
+                return
+            job = db.session.get(UploadJob, job_id)
+            try:
+                store = make_store(app.config)
+                with open(job.spool_path, "rb") as file:
+                    url_data = store.save(file, Path(job.spool_path).suffix)
+            except (UploadError, OSError) as exc:
+                job.status = UploadStatus.FAILED
+                job.error = str(exc)[:255]
+                logger.error("Upload job %d failed: %s", job_id, exc)
+            else:
+                job.recipe.set_image(url_data)
+                job.status = UploadStatus.DONE
+            job.last_updated = get_now_utc()
+            db.session.commit()
+            if job.status == UploadStatus.DONE:
+                logger.info("Comitted image URL's to recipe with ID %s", job.recipe_id)
+                get_fragment_cache().invalidate(job.recipe.cache_key)
+            _remove(job.spool_path)
+        except Exception as exc:
+            logger.exception("Upload job %d crashed.", job_id)
+            db.session.rollback()
+            _fail(job_id, exc)
+        finally:
+            db.session.remove()
+
+
+def _fail(job_id: int, exc: Exception) -> None:
+    """Mark a running job as failed in a new transaction, and remove its file"""
+    from .models import UploadJob, UploadStatus
+    from .resources import get_db
+
+    db = get_db()
+    try:
+        spool_path = db.session.scalar(
+            sql.select(UploadJob.spool_path).where(UploadJob.id == job_id)
+        )
+        db.session.execute(
+            sql.update(UploadJob)
+            .where(UploadJob.id == job_id, UploadJob.status == UploadStatus.RUNNING)
+            .values(
+                status=UploadStatus.FAILED,
+                error=f"Internal error: {type(exc).__name__}"[:255],
+                last_updated=get_now_utc(),
+            )
+        )
+        db.session.commit()
+    except Exception:
+        logger.exception("Could not mark upload job %d as failed.", job_id)
+        db.session.rollback()
+        return
+    if spool_path:
+        _remove(spool_path)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class _Workers:
+    """The thread pool of an app, started on first use in each process"""
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self._executor = ProcessLocal(
+            lambda: ThreadPoolExecutor(self.workers, thread_name_prefix="upload")
+        )
+
+    @property
+    def workers(self) -> int:
+        return self.app.config["TYMENU_UPLOAD_WORKERS"]
+
+    def submit(self, job_id: int) -> Future | None:
+        if self.workers <= 0:
+            process_job(self.app, job_id)
+            return None
+        return self._executor.get().submit(process_job, self.app, job_id)
+
+    def shutdown(self) -> None:
+        """Wait for the submitted jobs to finish"""
+        executor = self._executor.reset()
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+class UploadQueue:
+    """Flask extension running the upload jobs"""
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions[_EXTENSION] = _Workers(app)
+
+    @staticmethod
+    def _workers() -> _Workers:
+        return current_app.extensions[_EXTENSION]
+
+    def submit(self, recipe: Recipe, file: FileStorage, user: User) -> UploadJob:
+        """Spool the file and queue the upload. The returned job is finished
+        already if the upload runs in the request."""
+        from .models import UploadJob
+        from .resources import get_db
+
+        db = get_db()
+        path = _spool(file, current_app.config["TYMENU_UPLOAD_SPOOL_DIR"])
+        job = UploadJob(recipe=recipe, user_id=user.id, spool_path=path)
+        try:
+            db.session.add(job)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            _remove(path)
+            raise
+        logger.info("Queued upload job %d of file %s", job.id, file.filename)
+        if self._workers().submit(job.id) is None:
+            # Processed by another session
+            db.session.refresh(job)
+            db.session.refresh(recipe)
+        return job
+
+    def resume(self) -> int:
+        """Queue the pending jobs, e.g. after a restart, and the running jobs
+        which are stale. Returns the number of jobs."""
+        from .models import UploadJob, UploadStatus
+        from .resources import get_db
+
+        db = get_db()
+        stale = get_now_utc() - datetime.timedelta(
+            seconds=current_app.config["TYMENU_UPLOAD_STALE_SECONDS"]
+        )
+        # The process running them is gone, so they are claimed again.
+        requeued = db.session.execute(
+            sql.update(UploadJob)
+            .where(UploadJob.status == UploadStatus.RUNNING, UploadJob.last_updated < stale)
+            .values(status=UploadStatus.PENDING, last_updated=get_now_utc())
+        ).rowcount
+        db.session.commit()
+        if requeued:
+            logger.warning("Requeued %d stale running upload jobs.", requeued)
+        job_ids = db.session.scalars(
+            sql.select(UploadJob.id).where(UploadJob.status == UploadStatus.PENDING)
+        ).all()
+        for job_id in job_ids:
+            self._workers().submit(job_id)
+        return len(job_ids)
+
+    def shutdown(self) -> None:
+        self._workers().shutdown()
@@ -0,0 +1,125 @@
+"""Cache of the logged in users and their roles.
+
+Without the cache, every authenticated request loads the user, and the first
+permission check loads the role. Cached users are kept as plain column values
+for ``TYMENU_USER_CACHE_TTL`` seconds, and merged into the request's session.
+The roles rarely change, so they are loaded once per process.
+
+The ``version`` column of the user is incremented with each change of the
+password, username, email or role. Each request reads the version, which
+is a lookup of the primary key, and a cached user is only used if it has the
+same version. So a change is seen at once in every worker process, whoever
+made it. The process which made a change also drops its entry through
+:func:`invalidate_user`."""
+from __future__ import annotations
+
+import threading
+import time
+
+from flask import Flask, current_app
+import sqlalchemy as sql
+from sqlalchemy.orm import make_transient_to_detached
+
+_EXTENSION = "tymenu_user_cache"
+
+
+class UserCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._users: dict[int, tuple[float, int, dict]] = {}
+        self.roles: list[dict] | None = None
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> tuple[int, dict] | None:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            expires, version, values = entry
+            if expires < time.monotonic():
+                del self._users[user_id]
+                return None
+            return version, values
+
+    def set(self, user_id: int, version: int, values: dict) -> None:
+        with self._lock:
+            self._users[user_id] = (time.monotonic() + self.ttl, version, values)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+            self.roles = None
+
+
+class UserCaching:
+    """Flask extension keeping a :class:`UserCache` for each app"""
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions[_EXTENSION] = UserCache(app.config["TYMENU_USER_CACHE_TTL"])
+
+
+def get_user_cache() -> UserCache:
+    return current_app.extensions[_EXTENSION]
+
+
+def _column_values(instance) -> dict:
+    mapper = sql.inspect(instance).mapper
+    return {attr.key: getattr(instance, attr.key) for attr in mapper.column_attrs}
+
+
+def _merge_cached(session, model, values: dict):
+    """Add an instance to the session from cached values, without a query."""
+    instance = model.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        setattr(instance, key, value)
+    make_transient_to_detached(instance)
+    return session.merge(instance, load=False)
+
+
+def _ensure_roles(session, role_model) -> None:
+    cache = get_user_cache()
+    if cache.roles is None:
+        cache.roles = [_column_values(role) for role in role_model.query.all()]
+    # Put the roles in the identity map, so the user's role is not queried.
+    for values in cache.roles:
+        _merge_cached(session, role_model, values)
+
+
+def load_user(user_model, role_model, user_id: int):
+    """Load the user, from the cache if possible."""
+    from .resources import get_db
+
+    db = get_db()
+    cache = get_user_cache()
+    if cache.ttl <= 0:
+        return db.session.get(user_model, user_id)
+
+    _ensure_roles(db.session, role_model)
+    version = db.session.scalar(sql.select(user_model.version).where(user_model.id == user_id))
+    if version is None:
+        # Deleted
+        cache.invalidate(user_id)
+        return None
+    entry = cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        return _merge_cached(db.session, user_model, entry[1])
+
+    user = db.session.get(user_model, user_id)
+    if user is None:
+        cache.invalidate(user_id)
+        return None
+    cache.set(user_id, user.version, _column_values(user))
+    return user
+
+
+def invalidate_user(user) -> None:
+    """Drop the cached user of this process after a change"""
+    get_user_cache().invalidate(user.id)
+
+
+def invalidate_roles() -> None:
+    get_user_cache().clear()
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import bleach
 import emoji
-from markdown import markdown
 from markupsafe import Markup
 
+from .rendering import get_renderer
+
 
 def label_is_required(text, is_required=True):
     # Add a star emoji if this field is required.
@@ -15,35 +15,7 @@ def label_is_required(text, is_required=True):
 
 
 def clean_markdown_to_html(value: str, emojify=True) -> str:
-    allowed_tags = [
-        "a",
-        "abbr",
-        "acronym",
-        "b",
-        "blockquote",
-        "code",
-        "em",
-        "i",
-        "li",
-        "ol",
-        "pre",
-        "strong",
-        "ul",
-        "h1",
-        "h2",
-        "h3",
-        "p",
-    ]
-    cleaned = bleach.linkify(
-        bleach.clean(
-            markdown(value, output_format="html"),
-            tags=allowed_tags,
-            strip=True,
-        )
-    )
-    if emojify:
-        cleaned = emojify_str(cleaned)
-    return cleaned
+    return get_renderer().render(value, emojify=emojify)
 
 
 def emojify_str(s: str) -> str:
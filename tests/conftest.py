@@ -1,7 +1,16 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
 import pytest
+from sqlalchemy import event
+
 from tymenu import create_app
+from tymenu.models import User
 from tymenu.resources import get_db
 
 
@@ -37,3 +46,88 @@ def commit_to_db(db):
         db.session.commit()
 
     return _commit_to_db
+
+
+@pytest.fixture
+def john(commit_to_db):
+    u = User(email="john@example.com", username="john", password="cat")
+    commit_to_db(u)
+    return u
+
+
+@pytest.fixture
+def client(app_context, app):
+    return app_context.test_client()
+
+
+@pytest.fixture
+def count_queries(db):
+    """Context manager which records the SQL statements executed within it"""
+
+    @contextmanager
+    def _count_queries():
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+
+    return _count_queries
+
+
+class _ImgbbHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        body = self.rfile.read(length)
+        message = BytesParser().parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+        )
+        fields = {
+            part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+            for part in message.get_payload()
+        }
+        self.server.received.append(fields)
+        if fields.get("key") != b"secret":
+            self._reply(400, {"error": {"message": "Invalid API v1 key."}})
+            return
+        self._reply(
+            200,
+            {
+                "data": {
+                    "display_url": "http://img/display.png",
+                    "delete_url": "http://img/delete",
+                    "thumb": {"url": "http://img/thumb.png"},
+                    "url_viewer": "http://img/viewer",
+                }
+            },
+        )
+
+    def _reply(self, status, data):
+        content = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def imgbb_server():
+    """Local stand-in for the imgbb upload API, accepting the API key "secret"."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ImgbbHandler)
+    server.received = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/1/upload"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
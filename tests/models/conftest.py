@@ -4,13 +4,6 @@ import pytest
 from tymenu.models import Role, User
 
 
-@pytest.fixture
-def john(commit_to_db):
-    u = User(email="john@example.com", username="john", password="cat")
-    commit_to_db(u)
-    return u
-
-
 @pytest.fixture
 def alice(commit_to_db):
     u = User(email="alice@example.com", username="alice", password="dog")
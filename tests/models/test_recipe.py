@@ -3,8 +3,12 @@ from __future__ import annotations
 import datetime
 
 import pytest
+import sqlalchemy as sql
 from sqlalchemy import or_
-from tymenu.models import Recipe
+from sqlalchemy.dialects import mysql
+
+from tymenu import fulltext
+from tymenu.models import KcalType, Recipe, recipe_ingredient
 
 
 @pytest.fixture
@@ -85,3 +89,155 @@ def test_get_recipe(meatballs):
     print(result)
     result = Recipe.query.filter_by(id=2).first()
     print(result)
+
+
+def test_search_string(meatballs, spaghetti):
+    result = Recipe.search_string("tomato").all()
+    assert len(result) == 2
+
+    # Prefix match, and case insensitive
+    result = Recipe.search_string("MeatBall").all()
+    assert result == [meatballs]
+
+    # All words must be present
+    result = Recipe.search_string("minced sauce").all()
+    assert result == [spaghetti]
+    assert Recipe.search_string("minced carrot").all() == []
+
+
+def test_search_string_index_in_sync(db, meatballs, spaghetti):
+    meatballs.ingredients = "Carrots"
+    db.session.commit()
+    assert Recipe.search_string("carrot").all() == [meatballs]
+    assert Recipe.search_string("tomato").all() == [spaghetti]
+
+    db.session.delete(spaghetti)
+    db.session.commit()
+    assert Recipe.search_string("tomato").all() == []
+
+
+def test_search_string_no_fulltext(app_context, meatballs, spaghetti):
+    app_context.config["TYMENU_FULLTEXT_SEARCH"] = False
+    # Substring matching
+    result = Recipe.search_string("ghett").all()
+    assert result == [spaghetti]
+
+
+@pytest.mark.parametrize("fulltext", [True, False])
+def test_search_string_by_relevance(app_context, make_recipe, fulltext):
+    app_context.config["TYMENU_FULLTEXT_SEARCH"] = fulltext
+    in_instructions = make_recipe(
+        title="stew", ingredients="beef", instructions="Serve with carrot"
+    )
+    in_ingredients = make_recipe(title="soup", ingredients="carrot", instructions="Boil")
+    in_title = make_recipe(title="carrot cake", ingredients="flour", instructions="Bake")
+
+    result = Recipe.search_string_by_relevance("carrot").all()
+    assert result == [in_title, in_ingredients, in_instructions]
+
+
+def test_ranked_recipes_mysql(app_context):
+    query = fulltext.ranked_recipes(Recipe.list_query(), Recipe.id, "Carrot cake", "mysql")
+    compiled = str(query.statement.compile(dialect=mysql.dialect()))
+    match = (
+        "MATCH (recipe.title, recipe.ingredients, recipe.keywords, recipe.instructions) "
+        "AGAINST (%s IN BOOLEAN MODE)"
+    )
+    assert f"WHERE {match}" in compiled
+    assert f"ORDER BY {match} DESC" in compiled
+    assert fulltext.mysql_match_expression(["carrot", "cake"]) == "+carrot* +cake*"
+
+
+def test_kcal_per_person(db, make_recipe):
+    recipe = make_recipe(title="stew", kcal=1200, kcal_type=KcalType.TOTAL, servings=4)
+    assert recipe.kcal_per_person == 300
+
+    recipe.servings = 3
+    db.session.commit()
+    assert recipe.kcal_per_person == 400
+
+    recipe.kcal_type = KcalType.PER_PERSON
+    db.session.commit()
+    assert recipe.kcal_per_person == 1200
+
+    # Unknown without servings
+    recipe.kcal_type = KcalType.TOTAL
+    recipe.servings = 0
+    db.session.commit()
+    assert recipe.kcal_per_person is None
+    assert recipe.kcal_pers is None
+
+
+def test_filter_ranges(make_recipe):
+    salad = make_recipe(
+        title="salad", kcal=400, kcal_type=KcalType.PER_PERSON, cooking_time_min=10, protein_gram=35
+    )
+    roast = make_recipe(
+        title="roast", kcal=3200, kcal_type=KcalType.TOTAL, servings=4, cooking_time_min=90
+    )
+    # No nutrition at all
+    make_recipe(title="toast")
+
+    def titles(**ranges):
+        return {r.title for r in Recipe.filter_ranges(Recipe.query, **ranges)}
+
+    assert titles(max_kcal=600) == {salad.title}
+    assert titles(min_kcal=600) == {roast.title}
+    assert titles(max_time=30) == {salad.title}
+    assert titles(min_protein=30) == {salad.title}
+    assert titles(max_kcal=1000, max_time=60) == {salad.title}
+    assert titles(max_kcal=None) == {"salad", "roast", "toast"}
+    assert [r.title for r in Recipe.build_query(title="oa", max_time=120)] == ["roast"]
+
+    with pytest.raises(ValueError):
+        titles(max_servings=4)
+
+
+def test_search_ingredients_whole_words(make_recipe):
+    omelette = make_recipe(title="omelette", ingredients="* 3 Eggs\n* 1 dl milk")
+    moussaka = make_recipe(title="moussaka", ingredients="* 2 eggplants\n* 400 g minced meat")
+
+    assert Recipe.search_ingredients("egg").all() == [omelette]
+    assert Recipe.search_ingredients("eggplant").all() == [moussaka]
+    # All the words of an ingredient
+    assert Recipe.search_ingredients("minced meat").all() == [moussaka]
+    assert Recipe.search_ingredients("minced milk").all() == []
+    assert Recipe.search_ingredients("egg", "milk").all() == [omelette]
+    assert Recipe.search_ingredients("egg", "meat", operation="or").count() == 2
+    assert Recipe.search_ingredients("egg", "meat", exclude=True).count() == 0
+    # Without egg or without meat
+    assert Recipe.search_ingredients("egg", "meat", operation="or", exclude=True).count() == 2
+    assert Recipe.search_ingredients("milk", operation="not").all() == [moussaka]
+
+
+def test_search_keywords(make_recipe):
+    soup = make_recipe(title="soup", ingredients="carrot", keywords="Soups, Main course")
+    cake = make_recipe(title="cake", ingredients="flour", keywords="dessert, main")
+
+    assert Recipe.search_keywords("soup").all() == [soup]
+    assert Recipe.search_keywords("main courses").all() == [soup]
+    # Whole keywords
+    assert Recipe.search_keywords("main").all() == [cake]
+    assert Recipe.search_keywords("soup", "dessert", operation="or").count() == 2
+    assert Recipe.search_keywords("soup", exclude=True).all() == [cake]
+    assert Recipe.build_query(ingredients=["carrot"], keywords=["soup"]).all() == [soup]
+
+
+def test_terms_in_sync(db, make_recipe):
+    recipe = make_recipe(title="salad", ingredients="tomato\nonion", keywords="summer")
+    assert [term.name for term in recipe.ingredient_terms] == ["onion", "tomato"]
+    assert [term.name for term in recipe.keyword_terms] == ["summer"]
+
+    recipe.ingredients = "* 2 tomatoes\n* cucumber"
+    db.session.commit()
+    db.session.expire(recipe)
+    assert [term.name for term in recipe.ingredient_terms] == ["cucumber", "tomato"]
+    assert Recipe.search_ingredients("onion").all() == []
+    assert Recipe.search_ingredients("cucumber").all() == [recipe]
+
+    db.session.delete(recipe)
+    db.session.commit()
+    assert (
+        db.session.execute(sql.select(sql.func.count()).select_from(recipe_ingredient)).scalar()
+        == 0
+    )
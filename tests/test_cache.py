@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import datetime
+
+import pytest
+
+import tymenu
+from tymenu.cache import FileSystemCache, MemoryCache
+from tymenu.models import Recipe
+from tymenu.resources import get_fragment_cache
+
+
+@pytest.fixture(params=["memory", "filesystem"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCache(max_size=2)
+    return FileSystemCache(tmp_path / "fragments")
+
+
+def test_backend(backend):
+    assert backend.get("a") is None
+    backend.set("a", "v1", "<p>a</p>")
+    assert backend.get("a") == ("v1", "<p>a</p>")
+    backend.set("a", "v2", "<p>b\nc</p>")
+    assert backend.get("a") == ("v2", "<p>b\nc</p>")
+    backend.delete("a")
+    assert backend.get("a") is None
+    backend.delete("a")
+
+    backend.set("b", "v1", "b")
+    backend.clear()
+    assert backend.get("b") is None
+
+
+def test_memory_cache_lru():
+    cache = MemoryCache(max_size=2)
+    cache.set("a", "1", "a")
+    cache.set("b", "1", "b")
+    cache.get("a")
+    cache.set("c", "1", "c")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+
+@pytest.fixture
+def soup(commit_to_db, john):
+    recipe = Recipe(title="soup", ingredients="carrot", instructions="boil", author=john)
+    commit_to_db(recipe)
+    return recipe
+
+
+def test_view_recipe_cached(db, client, soup):
+    cache = get_fragment_cache()
+    cache.clear()
+    hits, misses = cache.hits, cache.misses
+
+    response = client.get(f"/recipe/{soup.id}")
+    assert response.status_code == 200
+    assert b"soup" in response.data
+    response = client.get(f"/recipe/{soup.id}")
+    assert b"soup" in response.data
+    assert (cache.hits - hits, cache.misses - misses) == (1, 1)
+
+    # A new version of the recipe is rendered again
+    soup.instructions = "simmer"
+    soup.last_updated = datetime.datetime(2030, 1, 1)
+    db.session.commit()
+    response = client.get(f"/recipe/{soup.id}")
+    assert b"simmer" in response.data
+    assert cache.misses - misses == 2
+
+
+def test_view_recipe_cached_new_username(db, client, soup):
+    """The cached body shows the author, so a new username renders it again,
+    also in the other processes, which don't see an invalidation."""
+    assert b"john" in client.get(f"/recipe/{soup.id}").data
+    soup.author.username = "johnny"
+    db.session.commit()
+    assert b"johnny" in client.get(f"/recipe/{soup.id}").data
+
+
+def test_view_recipe_cached_new_app_version(client, soup, monkeypatch):
+    """A deploy may change the templates, so the cached bodies are rendered again"""
+    cache = get_fragment_cache()
+    client.get(f"/recipe/{soup.id}")
+    misses = cache.misses
+    monkeypatch.setattr(tymenu, "__version__", "new")
+    client.get(f"/recipe/{soup.id}")
+    assert cache.misses == misses + 1
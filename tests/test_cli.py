@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import pytest
+
+from tymenu.models import MenuPlan, Recipe
+
+
+@pytest.fixture
+def runner(app_context, app):
+    return app_context.test_cli_runner()
+
+
+@pytest.fixture
+def stale_html(db, commit_to_db, john):
+    """Recipes and plans where the stored HTML is out of date"""
+    recipes = [
+        Recipe(title=f"soup {i}", ingredients="* carrot", instructions="*boil*", author=john)
+        for i in range(5)
+    ]
+    plan = MenuPlan(title="week", description="**Soup** week")
+    commit_to_db(*recipes, plan)
+    db.session.execute(
+        Recipe.__table__.update().values(ingredients_html="old", instructions_html="old")
+    )
+    db.session.execute(MenuPlan.__table__.update().values(description_html="old"))
+    db.session.commit()
+    db.session.expire_all()
+    return recipes, plan
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_rerender_html(runner, stale_html, workers):
+    recipes, plan = stale_html
+    result = runner.invoke(args=["rerender-html", "--batch-size", "2", "--workers", workers])
+    assert result.exit_code == 0, result.output
+    assert "recipe: 5/5 rows, last id 5" in result.output
+
+    for recipe in recipes:
+        assert recipe.ingredients_html == "<ul>\n<li>carrot</li>\n</ul>"
+        assert recipe.instructions_html == "<p><em>boil</em></p>"
+        assert recipe.background_html == ""
+    assert plan.description_html == "<p><strong>Soup</strong> week</p>"
+
+
+def test_rerender_html_resume(runner, stale_html):
+    recipes, _ = stale_html
+    versions = [recipe.version for recipe in recipes]
+    result = runner.invoke(args=["rerender-html", "--table", "recipe", "--start-id", "3"])
+    assert result.exit_code == 0, result.output
+    assert [r.ingredients_html == "old" for r in recipes] == [True] * 3 + [False] * 2
+    # The re-rendered recipes are new versions, so their cached pages are not used
+    assert [r.version == v for r, v in zip(recipes, versions)] == [True] * 3 + [False] * 2
+
+
+def test_rerender_html_resume_needs_a_table(runner, stale_html):
+    _, plan = stale_html
+    result = runner.invoke(args=["rerender-html", "--start-id", "3"])
+    assert result.exit_code == 2
+    assert "--start-id needs a single --table" in result.output
+    assert plan.description_html == "old"
+
+
+def test_reindex_terms(runner, db, john):
+    # Core inserts are not indexed
+    db.session.execute(
+        Recipe.__table__.insert(),
+        [
+            {"title": f"omelette {i}", "ingredients": "3 eggs", "author_id": john.id}
+            for i in range(3)
+        ],
+    )
+    db.session.commit()
+    assert Recipe.search_ingredients("egg").count() == 0
+
+    result = runner.invoke(args=["reindex-terms", "--batch-size", "2"])
+    assert result.exit_code == 0, result.output
+    assert "Indexed the terms of 3 recipes" in result.output
+    assert Recipe.search_ingredients("egg").count() == 3
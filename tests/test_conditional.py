@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import datetime
+
+import pytest
+
+from tymenu.models import MenuPlan, MenuPlanItem, Recipe, Role, User
+
+
+@pytest.fixture
+def soup(commit_to_db, john):
+    recipe = Recipe(title="soup", ingredients="carrot", instructions="boil", author=john)
+    commit_to_db(recipe)
+    return recipe
+
+
+@pytest.fixture
+def plan(commit_to_db, soup):
+    plan = MenuPlan(title="week", description="Soup week")
+    commit_to_db(plan, MenuPlanItem(menu_plan=plan, recipe=soup, day=0, days_leftover=0))
+    return plan
+
+
+def test_view_recipe_etag(db, client, soup):
+    url = f"/recipe/{soup.id}"
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert not response.get_etag()[1]  # A strong ETag
+    assert response.last_modified is not None
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+
+    soup.instructions = "simmer"
+    soup.last_updated = datetime.datetime(2030, 1, 1)
+    db.session.commit()
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_view_recipe_if_modified_since(client, soup):
+    url = f"/recipe/{soup.id}"
+    last_modified = client.get(url).headers["Last-Modified"]
+    response = client.get(url, headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    response = client.get(url, headers={"If-Modified-Since": "Sat, 01 Jan 2000 00:00:00 GMT"})
+    assert response.status_code == 200
+
+
+def test_view_plan_etag(db, client, plan, soup):
+    url = f"/plan/view_plan/{plan.id}"
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    # Adding a recipe to the plan changes the page
+    db.session.add(MenuPlanItem(menu_plan=plan, recipe=soup, day=1, days_leftover=0))
+    db.session.commit()
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_view_plan_if_modified_since(db, client, plan, soup):
+    url = f"/plan/view_plan/{plan.id}"
+    # Without the ORM events, which would set the time of the update
+    long_ago = datetime.datetime(2020, 1, 1)
+    db.session.execute(MenuPlan.__table__.update().values(timestamp=long_ago, last_updated=None))
+    db.session.execute(Recipe.__table__.update().values(timestamp=long_ago))
+    db.session.commit()
+    db.session.expire_all()
+    last_modified = client.get(url).headers["Last-Modified"]
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    # Removing an item is a change of the plan, though not of the plan's row
+    db.session.delete(plan.recipe_plans[0])
+    db.session.commit()
+    response = client.get(url, headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 200
+    db.session.refresh(plan)
+    assert plan.last_updated is not None
+
+
+def test_view_plan_etag_role(db, client, plan):
+    Role.insert_roles()
+    john = User.query.filter_by(username="john").one()
+    john.set_role("moderator")
+    with client.session_transaction() as session:
+        session["_user_id"] = str(john.id)
+        session["_fresh"] = True
+    url = f"/plan/view_plan/{plan.id}"
+    etag = client.get(url).headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    # The moderator links are gone
+    john.set_role("user")
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import smtplib
+import socket
+
+from flask_mail import Message
+import pytest
+
+from tymenu.email import EmailQueueFull, email_queue_depth, send_email
+from tymenu.email_dispatcher import _Dispatcher, _is_permanent
+from tymenu.resources import get_email_dispatcher
+
+
+class _Handler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    handler = _Handler()
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+@pytest.fixture
+def mail_app(app_context, smtp_server):
+    controller, _ = smtp_server
+    mail = app_context.extensions["mail"]
+    mail.suppress = False
+    mail.server = controller.hostname
+    mail.port = controller.port
+    mail.use_tls = False
+    mail.username = None
+    return app_context
+
+
+def _message(i: int) -> Message:
+    return Message(f"Message {i}", sender="admin@example.com", recipients=["john@example.com"])
+
+
+def test_burst_shares_connections(mail_app, smtp_server):
+    _, handler = smtp_server
+    dispatcher = get_email_dispatcher()
+    for i in range(20):
+        dispatcher.submit(_message(i))
+    dispatcher.shutdown()
+
+    assert len(handler.messages) == 20
+    assert email_queue_depth() == 0
+    # At most one connection per worker
+    assert len(handler.sessions) <= mail_app.config["TYMENU_MAIL_WORKERS"]
+
+
+def test_send_email_template(mail_app, smtp_server, john):
+    _, handler = smtp_server
+    with mail_app.test_request_context():
+        send_email(john.email, "Reset", "auth/email/reset_password", user=john, token="t")
+    get_email_dispatcher().shutdown()
+    assert len(handler.messages) == 1
+    assert handler.messages[0].rcpt_tos == ["john@example.com"]
+
+
+def test_retry_after_failure(mail_app, smtp_server):
+    _controller, handler = smtp_server
+    mail_app.config["TYMENU_MAIL_RETRY_DELAY"] = 0.01
+    mail = mail_app.extensions["mail"]
+    port = mail.port
+    # Nothing listens on the first attempt
+    mail.port = 1
+    dispatcher = _Dispatcher(mail_app)
+
+    real_open = dispatcher._open
+
+    def _open():
+        try:
+            return real_open()
+        finally:
+            mail.port = port
+
+    dispatcher._open = _open
+    dispatcher.submit(_message(0))
+    dispatcher.shutdown()
+    assert len(handler.messages) == 1
+    assert dispatcher.failed == 0
+
+
+def test_queue_full(app_context):
+    app_context.config["TYMENU_MAIL_QUEUE_SIZE"] = 1
+    app_context.config["TYMENU_MAIL_ENQUEUE_TIMEOUT"] = 0.01
+    dispatcher = _Dispatcher(app_context)
+    # Occupy the queue, without workers taking the messages
+    dispatcher._threads.factory = list
+    dispatcher.submit(_message(0))
+    with pytest.raises(EmailQueueFull):
+        dispatcher.submit(_message(1))
+
+
+def test_permanent_errors():
+    assert _is_permanent(smtplib.SMTPRecipientsRefused({}))
+    assert _is_permanent(smtplib.SMTPDataError(554, b"Rejected"))
+    assert not _is_permanent(smtplib.SMTPDataError(451, b"Try again"))
+    assert not _is_permanent(smtplib.SMTPServerDisconnected())
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import pytest
+
+from tymenu.models import MenuPlan, MenuPlanItem, Recipe, Role, User
+
+pytest.importorskip("faker")
+
+from tymenu.fake import PASSWORD, BulkSeeder
+
+
+@pytest.fixture
+def runner(app_context, app):
+    return app_context.test_cli_runner()
+
+
+def test_seed(db, count_queries):
+    Role.insert_roles()
+    with count_queries() as statements:
+        ids = BulkSeeder(chunk_size=20, seed=1).seed(users=10, recipes=50, plans=5)
+    assert len(ids["recipes"]) == 50
+    # Chunked inserts, and the terms of the recipes per chunk, not a query per row
+    assert len(statements) < 40
+
+    assert User.query.count() == 10
+    user = User.query.first()
+    assert user.verify_password(PASSWORD)
+    assert user.role.name == "User"
+    recipe = Recipe.query.first()
+    assert recipe.ingredients_html.startswith("<ul>")
+    assert recipe.instructions_html.startswith("<ol>")
+    assert recipe.author is not None
+    assert recipe.kcal_per_person == pytest.approx(recipe.kcal_pers)
+    assert len({r.title for r in Recipe.query}) == 50
+    assert Recipe.search_string(recipe.title).count() >= 1
+    keyword = recipe.keywords.split(",")[0]
+    assert recipe in Recipe.search_keywords(keyword).all()
+
+    plan = MenuPlan.query.first()
+    assert plan.description_html
+    assert len(plan.recipe_plans) >= 3
+    assert all(item.recipe is not None for item in MenuPlanItem.query)
+    assert len(plan.instances) == 1
+
+
+def test_seed_twice(db):
+    BulkSeeder(seed=1).seed(users=3, recipes=5, plans=1)
+    ids = BulkSeeder(seed=1).seed(users=3, recipes=5, plans=1)
+    assert list(ids["recipes"]) == [6, 7, 8, 9, 10]
+    assert User.query.count() == 6
+
+
+def test_seed_command(runner):
+    result = runner.invoke(args=["seed", "--users", "2", "--recipes", "3", "--plans", "1"])
+    assert result.exit_code == 0, result.output
+    assert "Created 2 users, 3 recipes, 1 plans" in result.output
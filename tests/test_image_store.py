@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from tymenu.image_store import LocalImageStore, make_store
+from tymenu.imgbb import UploadError
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _png(width: int, height: int) -> io.BytesIO:
+    data = io.BytesIO()
+    Image.new("RGB", (width, height), color=(200, 80, 20)).save(data, format="PNG")
+    data.seek(0)
+    return data
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalImageStore(tmp_path, "/images", thumb_width=200, display_width=600)
+
+
+def test_resized_copies(store, tmp_path):
+    url_data = store.save(_png(1000, 500), ".png")
+
+    thumb_name = url_data.thumb_url.rsplit("/", 1)[1]
+    with Image.open(tmp_path / thumb_name) as thumb:
+        assert thumb.size == (200, 100)
+    assert url_data.display_url.endswith("_600.png")
+    assert url_data.url_viewer.startswith("/images/")
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_failed_resize_removes_the_copies(store, tmp_path, monkeypatch):
+    save = Image.Image.save
+
+    def _save(image, path, *args, **kwargs):
+        if str(path).endswith("_600.png"):
+            raise OSError("No space left on device")
+        save(image, path, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, "save", _save)
+    with pytest.raises(UploadError):
+        store.save(_png(1000, 500), "png")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_resize_keeps_stored_images(store, tmp_path, monkeypatch):
+    url_data = store.save(_png(1000, 500), "png")
+    stored = sorted(tmp_path.iterdir())
+
+    def _open(path):
+        raise OSError("Input/output error")
+
+    monkeypatch.setattr(Image, "open", _open)
+    with pytest.raises(UploadError):
+        store.save(_png(1000, 500), "png")
+    assert sorted(tmp_path.iterdir()) == stored
+    assert url_data.thumb_url.endswith("_200.png")
+
+
+def test_content_hashed_names(store, tmp_path):
+    first = store.save(_png(300, 300), "png")
+    second = store.save(_png(300, 300), "png")
+    assert first == second
+    other = store.save(_png(301, 300), "png")
+    assert other.url_viewer != first.url_viewer
+    # Smaller than the display size, so the original is displayed
+    assert first.display_url == first.url_viewer
+
+
+def test_invalid_image(store, tmp_path):
+    with pytest.raises(UploadError):
+        store.save(io.BytesIO(b"not an image"), "png")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_serve_image(app_context, client, tmp_path):
+    app_context.config.update(
+        TYMENU_IMAGE_STORE="local", TYMENU_IMAGE_DIR=str(tmp_path), TYMENU_IMAGE_THUMB_WIDTH=100
+    )
+    url_data = make_store(app_context.config).save(_png(400, 400), "png")
+
+    response = client.get(url_data.thumb_url)
+    assert response.status_code == 200
+    assert response.mimetype == "image/png"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert response.cache_control.max_age == 365 * 24 * 60 * 60
+    assert client.get("/images/missing.png").status_code == 404
+
+
+def test_no_local_images_with_imgbb(app_context, client):
+    app_context.config["TYMENU_IMAGE_STORE"] = "imgbb"
+    assert client.get("/images/anything.png").status_code == 404
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import base64
+import io
+import os
+
+import pytest
+
+from tymenu.imgbb import Base64MultipartBody, ImgbbClient, UploadError, _encode_chunks
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 100_000, 3 * 16 * 1024 + 1])
+def test_encode_chunks(size):
+    data = os.urandom(size)
+    chunks = list(_encode_chunks(io.BytesIO(data), chunk_size=1000))
+    assert b"".join(chunks) == base64.b64encode(data)
+
+
+def test_body_length():
+    body = Base64MultipartBody({"key": "secret"}, "image", io.BytesIO(b"x" * 1001), 1001)
+    assert len(body) == len(b"".join(body))
+
+
+def test_upload(imgbb_server):
+    image = os.urandom(200_000)
+    client = ImgbbClient("secret", url=imgbb_server.url)
+    url_data = client.upload(io.BytesIO(image))
+
+    assert url_data.thumb_url == "http://img/thumb.png"
+    (fields,) = imgbb_server.received
+    assert base64.b64decode(fields["image"]) == image
+
+
+def test_upload_error(imgbb_server):
+    client = ImgbbClient("wrong", url=imgbb_server.url)
+    with pytest.raises(UploadError, match="Invalid API v1 key"):
+        client.upload(io.BytesIO(b"image"))
+
+
+def test_server_unreachable(imgbb_server):
+    client = ImgbbClient("secret", url="http://127.0.0.1:1/1/upload", timeout=(1, 1))
+    with pytest.raises(UploadError, match="Could not reach"):
+        client.upload(io.BytesIO(b"image"))
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import logging
+import re
+
+from tymenu.models import Recipe
+
+
+def test_server_timing(commit_to_db, client, john):
+    commit_to_db(Recipe(title="soup", ingredients="carrot", author=john))
+
+    response = client.get("/")
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    match = re.match(r'db;dur=[\d.]+;desc="(\d+) queries", app;dur=[\d.]+', timing)
+    assert match is not None
+    assert int(match.group(1)) == 1
+
+
+def test_slow_query_log(app_context, client, caplog):
+    app_context.config["TYMENU_SLOW_QUERY_MS"] = 1e-6
+    with caplog.at_level(logging.INFO, logger="tymenu.instrumentation"):
+        client.get("/")
+    messages = [r.getMessage() for r in caplog.records]
+    assert any(m.startswith("Slow query") and "main.index" in m for m in messages)
+    assert any("endpoint=main.index method=GET status=200" in m for m in messages)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import multiprocessing
+
+import pytest
+
+from tymenu import create_app
+from tymenu.config import TestingConfig
+from tymenu.metrics import get_metrics
+from tymenu.metrics.collector import TimedQueuePool
+from tymenu.metrics.registry import Registry
+from tymenu.metrics.store import MemoryStore, MmapStore
+from tymenu.resources import get_db
+
+
+def test_metrics_endpoint(client):
+    assert client.get("/").status_code == 200
+    assert client.get("/no-such-page").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+    assert "# TYPE tymenu_http_requests_total counter" in text
+    assert 'tymenu_http_requests_total{endpoint="main.index",method="GET",status="200"}' in text
+    assert 'tymenu_http_requests_total{endpoint="unknown",method="GET",status="404"}' in text
+    assert 'tymenu_http_request_duration_seconds_bucket{endpoint="main.index",le="+Inf"} 1' in text
+    assert 'tymenu_http_request_duration_seconds_count{endpoint="main.index"} 1' in text
+    assert "# TYPE tymenu_db_pool_checkout_seconds histogram" in text
+    assert 'tymenu_cache_hits_total{cache="markdown"}' in text
+    assert "tymenu_email_queue_depth 0" in text
+
+
+def test_pool_metrics(tmp_path, monkeypatch):
+    # The in-memory database of the tests has no queue pool
+    monkeypatch.setattr(
+        TestingConfig, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'db.sqlite'}"
+    )
+    app = create_app("testing")
+    with app.app_context():
+        engine = get_db().engine
+        assert isinstance(engine.pool, TimedQueuePool)
+        with engine.connect():
+            pass
+        with engine.connect():
+            pass
+        text = get_metrics().registry.render()
+    assert "tymenu_db_pool_checkout_seconds_count 2" in text
+    assert "tymenu_db_pool_connect_seconds_count 1" in text
+
+
+def test_metrics_token(app_context, client):
+    app_context.config["TYMENU_METRICS_TOKEN"] = "secret"
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+
+
+def test_metrics_disabled(app_context, client):
+    app_context.extensions.pop("tymenu_metrics")
+    assert client.get("/metrics").status_code == 404
+
+
+@pytest.fixture(params=["memory", "mmap"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    return MmapStore(tmp_path)
+
+
+def test_registry(store):
+    registry = Registry(store)
+    counter = registry.counter("requests_total", "Requests.")
+    histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    gauge = registry.gauge("depth", "Depth.")
+
+    counter.inc(endpoint="a")
+    counter.inc(2, endpoint="a")
+    histogram.observe(0.5)
+    histogram.observe(0.05)
+    gauge.set(3)
+
+    lines = registry.render().splitlines()
+    assert 'requests_total{endpoint="a"} 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in lines
+    assert "latency_seconds_sum 0.55" in lines
+    assert "latency_seconds_count 2" in lines
+    assert "depth 3" in lines
+    assert lines.index("# TYPE latency_seconds histogram") < lines.index("latency_seconds_count 2")
+
+
+def _count_in_child(directory):
+    store = MmapStore(directory)
+    registry = Registry(store)
+    counter = registry.counter("requests_total", "Requests.")
+    for _ in range(1000):
+        counter.inc()
+    registry.gauge("depth", "Depth.").set(5)
+
+
+def test_mmap_store_multiprocess(tmp_path):
+    registry = Registry(MmapStore(tmp_path))
+    registry.counter("requests_total", "Requests.").inc()
+    registry.gauge("depth", "Depth.").set(1)
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_count_in_child, args=(tmp_path,)) for _ in range(2)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+        assert proc.exitcode == 0
+
+    lines = registry.render().splitlines()
+    # Totals of exited processes are kept, live gauges are not.
+    assert "requests_total 2001" in lines
+    assert "depth 1" in lines
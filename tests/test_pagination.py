@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import datetime
+
+import pytest
+
+from tymenu.models import Recipe
+from tymenu.pagination import (
+    Cursor,
+    decode_cursor,
+    encode_cursor,
+    get_count_cache,
+    keyset_paginate,
+    paginate,
+)
+
+
+@pytest.fixture
+def recipes(john, commit_to_db):
+    items = [Recipe(title=f"recipe {i}", ingredients="salt", author=john) for i in range(7)]
+    commit_to_db(*items)
+    return items
+
+
+def test_paginate(recipes):
+    query = Recipe.query.order_by(Recipe.id)
+    pagination = paginate(query, page=2, per_page=3)
+    assert pagination.total == 7
+    assert pagination.pages == 3
+    assert not pagination.total_is_estimate
+    assert pagination.items == recipes[3:6]
+
+
+def test_paginate_max_total(recipes):
+    query = Recipe.query.order_by(Recipe.id)
+    pagination = paginate(query, page=1, per_page=3, max_total=5)
+    assert pagination.total is None
+    assert pagination.total_is_estimate
+    assert pagination.has_next
+
+    # The pages continue past the estimate, up to the last row
+    pagination = paginate(query, page=2, per_page=3, max_total=2)
+    assert pagination.items == recipes[3:6]
+    assert pagination.has_next
+    assert list(pagination.iter_pages()) == [1, 2, 3]
+    pagination = paginate(query, page=3, per_page=3, max_total=2)
+    assert pagination.items == recipes[6:]
+    assert pagination.has_prev
+    assert not pagination.has_next
+
+    pagination = paginate(query, page=1, per_page=3, max_total=7)
+    assert pagination.total == 7
+    assert not pagination.total_is_estimate
+
+
+def test_paginate_cached_total(db, john, recipes):
+    query = Recipe.query.filter(Recipe.title.contains("recipe"))
+    assert paginate(query, page=1, per_page=3, cache_total=True).total == 7
+
+    db.session.add(Recipe(title="recipe 7", author=john))
+    db.session.commit()
+    # The total is reused, until the cache is cleared.
+    assert paginate(query, page=2, per_page=3, cache_total=True).total == 7
+    assert paginate(query, page=2, per_page=3).total == 8
+    get_count_cache().clear()
+    assert paginate(query, page=2, per_page=3, cache_total=True).total == 8
+
+
+def test_cursor_roundtrip():
+    cursor = Cursor(datetime.datetime(2023, 7, 30, 15, 13, 56, 181250), 42, backwards=True)
+    assert decode_cursor(encode_cursor(cursor)) == cursor
+    assert decode_cursor("not-a-cursor") is None
+
+
+def test_keyset_paginate(db, recipes):
+    # Two recipes share a timestamp, so the id breaks the tie.
+    start = datetime.datetime(2023, 1, 1)
+    for i, recipe in enumerate(recipes):
+        recipe.timestamp = start + datetime.timedelta(days=i // 2)
+    db.session.commit()
+    newest_first = sorted(recipes, key=lambda r: (r.timestamp, r.id), reverse=True)
+
+    def _page(cursor=None):
+        return keyset_paginate(
+            Recipe.query,
+            cursor=cursor,
+            per_page=3,
+            timestamp_column=Recipe.timestamp,
+            id_column=Recipe.id,
+        )
+
+    first = _page()
+    assert first.items == newest_first[:3]
+    assert not first.has_prev
+    second = _page(first.next_cursor)
+    assert second.items == newest_first[3:6]
+    assert second.has_prev
+    last = _page(second.next_cursor)
+    assert last.items == newest_first[6:]
+    assert not last.has_next
+
+    # And back again
+    assert _page(last.prev_cursor).items == second.items
+    back = _page(second.prev_cursor)
+    assert back.items == first.items
+    assert not back.has_prev
+
+
+def test_paginate_keyset_total(recipes):
+    pagination = paginate(Recipe.query, per_page=3, keyset=(Recipe.timestamp, Recipe.id))
+    assert len(pagination.items) == 3
+    assert pagination.total == 7
+    second = paginate(
+        Recipe.query,
+        per_page=3,
+        keyset=(Recipe.timestamp, Recipe.id),
+        cursor=pagination.next_cursor,
+    )
+    assert second.total == 7
+    assert paginate(Recipe.query, per_page=3, count=False).total is None
+
+
+def test_profile_counts_once(client, john, recipes, count_queries):
+    with count_queries() as statements:
+        response = client.get(f"/profile/{john.id}")
+    assert response.status_code == 200
+    assert b"Number of recipes: 7" in response.data
+    assert sum("count(" in statement.lower() for statement in statements) == 1
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from tymenu.process_local import ProcessLocal
+
+
+def test_created_once():
+    created = []
+    local = ProcessLocal(lambda: created.append(1) or len(created))
+    assert local.peek() is None
+    assert local.get() == local.get() == 1
+    assert local.reset() == 1
+    assert local.peek() is None
+    assert local.get() == 2
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_created_again_after_fork():
+    local = ProcessLocal(os.getpid)
+    assert local.get() == os.getpid()
+    pid = os.fork()
+    if pid == 0:
+        # Not created in the child yet, so nothing to clean up
+        ok = local.peek() is None and local.reset() is None and local.get() == os.getpid()
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert local.get() == os.getpid()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+import pstats
+import time
+
+from flask import g
+import pytest
+
+from tymenu.models import Role
+from tymenu.profiling import get_profiler, make_token
+from tymenu.profiling.profiler import HEADER, ID_HEADER
+from tymenu.profiling.sampler import StackSampler
+
+
+@pytest.fixture
+def profiling(app_context, tmp_path):
+    app_context.config.update(
+        TYMENU_PROFILING=True,
+        TYMENU_PROFILING_RATE=0.0,
+        TYMENU_PROFILING_DIR=str(tmp_path / "profiles"),
+    )
+    return tmp_path / "profiles"
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_collapsed_and_speedscope():
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    _busy(0.05)
+    sampler.stop()
+
+    assert sampler.sample_count > 5
+    collapsed = sampler.collapsed()
+    assert "_busy (test_profiling.py:" in collapsed
+    _stack, count = collapsed.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+    profile = sampler.speedscope("busy")
+    frames = profile["shared"]["frames"]
+    assert "_busy" in {frame["name"] for frame in frames}
+    sampled = profile["profiles"][0]
+    assert len(sampled["samples"]) == len(sampled["weights"])
+    assert sampled["endValue"] == pytest.approx(sum(sampled["weights"]))
+
+
+def test_disabled_by_default(app_context, db, client, tmp_path):
+    app_context.config.update(TYMENU_PROFILING_DIR=str(tmp_path), TYMENU_PROFILING_RATE=1.0)
+    token = make_token(app_context.config["SECRET_KEY"])
+    response = client.get("/", headers={HEADER: token})
+    assert ID_HEADER not in response.headers
+    assert not list(tmp_path.iterdir())
+
+
+def test_sampled_request_is_saved(app_context, db, client, profiling):
+    app_context.config["TYMENU_PROFILING_RATE"] = 1.0
+    response = client.get("/")
+    assert response.status_code == 200
+    profile_id = response.headers[ID_HEADER]
+
+    meta = json.loads((profiling / f"{profile_id}.meta.json").read_text())
+    assert meta["path"] == "/"
+    assert meta["status"] == "200 OK"
+    assert meta["trigger"] == "sample"
+    assert sorted(meta["files"]) == [
+        f"{profile_id}.collapsed.txt",
+        f"{profile_id}.speedscope.json",
+    ]
+    [info] = get_profiler().recent()
+    assert info.id == profile_id
+
+
+def test_header_token(app_context, db, client, profiling):
+    response = client.get("/", headers={HEADER: "forged"})
+    assert ID_HEADER not in response.headers
+
+    token = make_token(app_context.config["SECRET_KEY"])
+    response = client.get("/", headers={HEADER: token})
+    assert response.headers[ID_HEADER]
+    assert get_profiler().recent()[0].trigger == "header"
+
+
+def test_cprofile_mode(app_context, db, client, profiling):
+    app_context.config.update(TYMENU_PROFILING_RATE=1.0, TYMENU_PROFILING_MODE="cprofile")
+    profile_id = client.get("/").headers[ID_HEADER]
+    stats = pstats.Stats(str(profiling / f"{profile_id}.pstats"))
+    assert any(name == "render_template" for _, _, name in stats.stats)
+
+
+def test_old_profiles_are_removed(app_context, db, client, profiling):
+    app_context.config.update(TYMENU_PROFILING_RATE=1.0, TYMENU_PROFILING_KEEP=2)
+    ids = [client.get("/").headers[ID_HEADER] for _ in range(4)]
+    assert [info.id for info in get_profiler().recent()] == ids[:1:-1]
+    assert len(list(profiling.iterdir())) == 2 * 3
+
+
+@pytest.mark.parametrize("role, status", [("user", 403), ("administrator", 200)])
+def test_profiles_page_is_for_admins(
+    app_context, db, client, profiling, john, role, status
+):
+    Role.insert_roles()
+    john.set_role(role)
+    with client.session_transaction() as session:
+        session["_user_id"] = str(john.id)
+        session["_fresh"] = True
+
+    app_context.config["TYMENU_PROFILING_RATE"] = 1.0
+    g.pop("_login_user", None)
+    profile_id = client.get("/").headers[ID_HEADER]
+    app_context.config["TYMENU_PROFILING_RATE"] = 0.0
+
+    g.pop("_login_user", None)
+    response = client.get("/admin/profiles")
+    assert response.status_code == status
+    if status == 200:
+        assert response.data.count(b'class="profile"') == 1
+        g.pop("_login_user", None)
+        response = client.get(f"/admin/profiles/{profile_id}.collapsed.txt")
+        assert response.status_code == 200
+        assert b"render_template" in response.data
+
+
+def test_profile_token_command(app_context, profiling):
+    result = app_context.test_cli_runner().invoke(args=["profile-token"])
+    assert result.exit_code == 0, result.output
+    header, token = result.output.splitlines()[0].split(": ")
+    assert header == HEADER
+    with app_context.test_client() as client:
+        assert ID_HEADER in client.get("/links", headers={HEADER: token}).headers
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from tymenu import create_app
+from tymenu.config import TestingConfig
+from tymenu.rendering import MarkdownRenderer, get_renderer
+
+
+def test_render():
+    renderer = MarkdownRenderer()
+    html = renderer.render("# Soup :carrot:\n\n* Carrots\n\n<script>alert(1)</script>")
+    assert "<h1>" in html
+    assert "<li>Carrots</li>" in html
+    assert "<script>" not in html
+    assert "\N{CARROT}" in html
+    assert "\N{CARROT}" not in renderer.render("# Soup :carrot:", emojify=False)
+
+    html = renderer.render("See www.example.com")
+    assert 'href="http://www.example.com"' in html
+
+
+def test_render_cache():
+    renderer = MarkdownRenderer(max_size=2)
+    first = renderer.render("*a*")
+    assert renderer.render("*a*") == first
+    assert renderer.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+    renderer.render("*b*")
+    renderer.render("*c*")
+    # The least recently used entry was evicted
+    assert renderer.size == 2
+    renderer.render("*a*")
+    assert renderer.misses == 4
+
+    renderer.clear()
+    assert renderer.stats() == {"hits": 0, "misses": 0, "size": 0}
+
+
+def test_renderer_of_the_app(monkeypatch):
+    monkeypatch.setattr(TestingConfig, "TYMENU_MARKDOWN_CACHE_SIZE", 3)
+    with create_app("testing").app_context():
+        assert get_renderer().max_size == 3
+        assert get_renderer() is get_renderer()
+
+
+def test_renderer_without_an_app():
+    assert "<em>a</em>" in get_renderer().render("*a*")
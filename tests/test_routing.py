@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import pytest
+
+from tymenu import create_app
+from tymenu.config import TestingConfig, engine_options
+from tymenu.models import Recipe, Role, User
+from tymenu.resources import get_db
+from tymenu.routing import get_replicas
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """App with a primary and a replica database, in which the same rows
+    have different titles and names, so it shows which one was read."""
+    monkeypatch.setattr(
+        TestingConfig, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'primary.sqlite'}"
+    )
+    monkeypatch.setattr(
+        TestingConfig, "TYMENU_REPLICA_URLS", f"sqlite:///{tmp_path / 'replica.sqlite'}"
+    )
+    app = create_app("testing")
+    app.config["WTF_CSRF_ENABLED"] = False
+    with app.app_context():
+        db = get_db()
+        [replica] = get_replicas()
+        db.metadata.create_all(db.engine)
+        db.metadata.create_all(replica)
+        for engine, name in [(db.engine, "primary"), (replica, "replica")]:
+            with engine.begin() as conn:
+                conn.execute(
+                    User.__table__.insert(),
+                    {"id": 1, "email": "john@example.com", "username": f"{name}-john"},
+                )
+                conn.execute(
+                    Recipe.__table__.insert(),
+                    {"id": 1, "title": f"{name} soup", "author_id": 1, "ingredients": "carrot"},
+                )
+        Role.insert_roles()
+        db.session.remove()
+    # No app context is pushed, so each request has its own, as in production.
+    yield app
+    with app.app_context():
+        for engine in [get_db().engine, *get_replicas()]:
+            engine.dispose()
+
+
+def test_engine_options(monkeypatch):
+    monkeypatch.setenv("SQLALCHEMY_POOL_SIZE", "20")
+    monkeypatch.setenv("SQLALCHEMY_MAX_OVERFLOW", "5")
+    monkeypatch.setenv("SQLALCHEMY_POOL_TIMEOUT", "2.5")
+    monkeypatch.setenv("SQLALCHEMY_POOL_PRE_PING", "true")
+    assert engine_options() == {
+        "pool_recycle": -1,
+        "pool_pre_ping": True,
+        "pool_size": 20,
+        "max_overflow": 5,
+        "pool_timeout": 2.5,
+    }
+
+    monkeypatch.delenv("SQLALCHEMY_POOL_SIZE")
+    assert "pool_size" not in engine_options()
+
+
+def test_replica_gets_the_engine_options(replicated):
+    with replicated.app_context():
+        [replica] = get_replicas()
+        assert replica.pool._recycle == get_db().engine.pool._recycle
+
+
+def test_read_only_views_use_the_replica(replicated):
+    client = replicated.test_client()
+    assert b"replica soup" in client.get("/recipe/1").data
+    assert b"replica soup" in client.get("/").data
+    assert b"replica soup" in client.get("/search_results?q=soup").data
+    # Not a read-only view
+    assert b"primary-john" in client.get("/profile/1").data
+
+
+def test_no_replica_outside_requests(replicated):
+    with replicated.app_context():
+        assert get_db().session.get(Recipe, 1).title == "primary soup"
+
+
+def test_read_after_write(replicated):
+    client = replicated.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "1"
+        session["_fresh"] = True
+    assert b"replica soup" in client.get("/recipe/1").data
+
+    response = client.post("/profile/change_username/1", data={"username": "johnny"})
+    assert response.status_code == 302
+    # The user reads their own write from the primary
+    assert b"primary soup" in client.get("/recipe/1").data
+
+    with client.session_transaction() as session:
+        session["_primary_until"] = 0
+    assert b"replica soup" in client.get("/recipe/1").data
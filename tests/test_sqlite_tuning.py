@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from tymenu import create_app
+from tymenu.config import TestingConfig
+from tymenu.resources import get_db
+from tymenu.sqlite_tuning import run_maintenance
+
+
+@pytest.fixture
+def make_file_app(tmp_path, monkeypatch):
+    """Make an app with a SQLite file database"""
+    monkeypatch.setattr(
+        TestingConfig, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'data.sqlite'}"
+    )
+    apps = []
+
+    def _make_file_app(**config):
+        for name, value in config.items():
+            monkeypatch.setattr(TestingConfig, name, value)
+        app = create_app("testing")
+        with app.app_context():
+            get_db().create_all()
+        apps.append(app)
+        return app
+
+    yield _make_file_app
+    for app in apps:
+        maintenance = app.extensions.get("tymenu_sqlite_tuning")
+        if maintenance is not None:
+            maintenance.stop()
+        with app.app_context():
+            get_db().engine.dispose()
+
+
+def _pragma(name):
+    return get_db().session.execute(get_db().text(f"PRAGMA {name}")).scalar()
+
+
+def test_pragmas_are_set(make_file_app):
+    app = make_file_app()
+    with app.app_context():
+        assert _pragma("journal_mode") == "wal"
+        # NORMAL
+        assert _pragma("synchronous") == 1
+        assert _pragma("busy_timeout") == 5000
+        assert _pragma("cache_size") == -64 * 1024
+        assert _pragma("mmap_size") == 256 * 1024 * 1024
+
+
+def test_tuning_can_be_disabled(make_file_app):
+    app = make_file_app(TYMENU_SQLITE_TUNING=False)
+    with app.app_context():
+        assert _pragma("journal_mode") == "delete"
+    assert "tymenu_sqlite_tuning" not in app.extensions
+
+
+def test_no_tuning_in_memory(app_context):
+    assert "tymenu_sqlite_tuning" not in app_context.extensions
+
+
+def test_run_maintenance(make_file_app, john):
+    # make_file_app comes first, so john is added to the file database
+    result = run_maintenance(get_db().engine, "TRUNCATE")
+    assert not result.busy
+    # Truncated, so the WAL is empty
+    assert result.wal_pages == result.checkpointed_pages == 0
+
+
+def test_maintenance_thread_starts_on_request(make_file_app):
+    app = make_file_app(TYMENU_SQLITE_MAINTENANCE_INTERVAL=0.01)
+    maintenance = app.extensions["tymenu_sqlite_tuning"]
+    app.test_client().get("/links")
+    thread = maintenance._thread.peek()
+    assert thread.is_alive()
+    # A few rounds of maintenance
+    time.sleep(0.05)
+    assert thread.is_alive()
+
+    maintenance.stop()
+    assert not thread.is_alive()
+
+
+def test_sqlite_maintenance_command(make_file_app):
+    app = make_file_app()
+    result = app.test_cli_runner().invoke(args=["sqlite-maintenance"])
+    assert result.exit_code == 0, result.output
+    assert "data.sqlite: checkpoint done" in result.output
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import pytest
+import sqlalchemy as sql
+from sqlalchemy.dialects import mysql
+from sqlalchemy.schema import CreateTable
+
+from tymenu.models import KEYWORD_TERMS
+from tymenu.terms import _insert_ignore, normalize, parse_ingredients, parse_keywords
+
+
+@pytest.mark.parametrize(
+    "word, expected",
+    [
+        ("Eggs", "egg"),
+        ("egg", "egg"),
+        ("eggplant", "eggplant"),
+        ("tomatoes", "tomato"),
+        ("berries", "berry"),
+        ("cookies", "cooky"),
+        ("cookie", "cooky"),
+        ("sauces", "sauce"),
+        ("couscous", "couscous"),
+        ("glass", "glass"),
+    ],
+)
+def test_normalize(word, expected):
+    assert normalize(word) == expected
+
+
+def test_parse_ingredients():
+    text = "* 2 dl Milk\n* 3 eggs\n- 1 tsp salt and pepper\n* 200 g minced meat (beef)"
+    assert parse_ingredients(text) == {"milk", "egg", "salt", "pepper", "minced", "meat", "beef"}
+    assert parse_ingredients(None) == set()
+
+
+def test_parse_keywords():
+    assert parse_keywords("Dinner,  Main Courses ;soups\n, ") == {"dinner", "main course", "soup"}
+    assert parse_keywords("") == set()
+
+
+def test_insert_ignore(db):
+    # As if another transaction had added the term after it was looked up
+    terms = KEYWORD_TERMS.terms
+    connection = db.session.connection()
+    connection.execute(terms.insert(), [{"name": "soup"}])
+    _insert_ignore(connection, terms, [{"name": "soup"}, {"name": "quick"}])
+    names = connection.execute(sql.select(terms.c.name)).scalars().all()
+    assert sorted(names) == ["quick", "soup"]
+    assert KEYWORD_TERMS._term_ids(connection, {"soup", "quick", "dinner"}).keys() == {
+        "soup",
+        "quick",
+        "dinner",
+    }
+
+
+def test_accented_names_are_different_terms(db):
+    connection = db.session.connection()
+    assert KEYWORD_TERMS._term_ids(connection, {"cafe", "café"}).keys() == {"cafe", "café"}
+    # A binary collation on MySQL, as its default one ignores the accents
+    ddl = str(CreateTable(KEYWORD_TERMS.terms).compile(dialect=mysql.dialect()))
+    assert "COLLATE utf8mb4_bin" in ddl
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import datetime
+import gzip
+import json
+
+import pytest
+
+from tymenu.models import MenuPlan, MenuPlanInstance, MenuPlanItem, Recipe, Role, User
+
+
+@pytest.fixture
+def runner(app_context, app):
+    return app_context.test_cli_runner()
+
+
+@pytest.fixture
+def data(db, commit_to_db, john):
+    Role.insert_roles()
+    alice = User(email="alice@example.com", username="alice", password="dog")
+    commit_to_db(alice)
+    john.set_role("administrator")
+    recipes = [
+        Recipe(title=f"soup {i}", ingredients="* carrot", keywords="soup", author=alice)
+        for i in range(5)
+    ]
+    plan = MenuPlan(title="week", description="**Soup** week", added_by=john)
+    plan.recipe_plans = [
+        MenuPlanItem(recipe=recipe, day=i, days_leftover=0) for i, recipe in enumerate(recipes)
+    ]
+    plan.instances = [MenuPlanInstance(date=datetime.date(2023, 8, 1))]
+    commit_to_db(*recipes, plan)
+
+
+def _recreate(db):
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    Role.insert_roles()
+
+
+def test_export_import(runner, db, data, tmp_path):
+    path = str(tmp_path / "export.ndjson.gz")
+    result = runner.invoke(args=["export-data", path])
+    assert result.exit_code == 0, result.output
+    with gzip.open(path, "rt") as file:
+        lines = [json.loads(line) for line in file]
+    assert lines[0] == {"format": "tymenu", "version": 1}
+    assert [line["table"] for line in lines[1:]].count("recipe") == 5
+
+    _recreate(db)
+    result = runner.invoke(args=["import-data", path, "--batch-size", "2"])
+    assert result.exit_code == 0, result.output
+    assert "Imported 2 users, 5 recipe, 1 menu_plan, 5 menu_plan_recipe" in result.output
+
+    john = User.query.filter_by(email="john@example.com").one()
+    assert john.is_administrator()
+    assert john.verify_password("cat")
+    recipe = Recipe.query.filter_by(title="soup 3").one()
+    assert recipe.author.username == "alice"
+    assert recipe.ingredients_html == "<ul>\n<li>carrot</li>\n</ul>"
+    assert Recipe.search_string("soup").count() == 5
+    assert Recipe.search_keywords("soup").count() == 5
+    (plan,) = MenuPlan.query.all()
+    assert plan.added_by == john
+    assert plan.get_sorted_plans()[0].recipe.title == "soup 0"
+    assert plan.instances[0].date == datetime.date(2023, 8, 1)
+
+
+def test_import_remaps_ids(runner, db, data, tmp_path):
+    path = str(tmp_path / "export.ndjson")
+    runner.invoke(args=["export-data", path])
+
+    # Import into the same database: the users and recipes exist already.
+    result = runner.invoke(args=["import-data", path])
+    assert result.exit_code == 0, result.output
+    assert "Skipped 5 recipe which exist already." in result.output
+    assert Recipe.query.count() == 5
+    plans = MenuPlan.query.order_by(MenuPlan.id).all()
+    assert [plan.id for plan in plans] == [1, 2]
+    first, second = ({item.recipe_id for item in plan.recipe_plans} for plan in plans)
+    assert first == second
+
+
+def test_import_rejects_other_files(runner, tmp_path):
+    path = tmp_path / "other.ndjson"
+    path.write_text('{"something": "else"}\n')
+    result = runner.invoke(args=["import-data", str(path)])
+    assert result.exit_code != 0
+    assert "Import failed" in result.output
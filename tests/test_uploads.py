@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import datetime
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from tymenu.models import Recipe, Role, UploadJob, UploadStatus
+from tymenu.resources import get_upload_queue
+
+
+@pytest.fixture
+def upload_app(app_context, db, imgbb_server, tmp_path):
+    app_context.config.update(
+        IMGBB_API_KEY="secret",
+        IMGBB_UPLOAD_URL=imgbb_server.url,
+        TYMENU_UPLOAD_SPOOL_DIR=str(tmp_path),
+        TYMENU_UPLOAD_WORKERS=0,
+    )
+    return app_context
+
+
+@pytest.fixture
+def moderator(db, john):
+    Role.insert_roles()
+    john.set_role("moderator")
+    return john
+
+
+@pytest.fixture
+def recipe(commit_to_db, moderator):
+    recipe = Recipe(title="Soup", ingredients="carrot", keywords="soup", author=moderator)
+    commit_to_db(recipe)
+    return recipe
+
+
+@pytest.fixture
+def login(client, moderator):
+    with client.session_transaction() as session:
+        session["_user_id"] = str(moderator.id)
+        session["_fresh"] = True
+
+
+def _image_file() -> FileStorage:
+    return FileStorage(io.BytesIO(b"\x89PNG image data"), filename="soup.png")
+
+
+def test_upload_in_request(upload_app, client, login, recipe, imgbb_server, tmp_path):
+    response = client.post(
+        f"/upload/{recipe.id}",
+        data={"file": (io.BytesIO(b"\x89PNG image data"), "soup.png")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 302
+    assert recipe.img_thumbnail_url == "http://img/thumb.png"
+    (job,) = UploadJob.query.all()
+    assert job.status == UploadStatus.DONE
+    # The spooled file is removed
+    assert os.listdir(tmp_path) == []
+
+
+def test_upload_in_background(upload_app, db, client, login, recipe, moderator):
+    upload_app.config["TYMENU_UPLOAD_WORKERS"] = 1
+    queue = get_upload_queue()
+    job = queue.submit(recipe, _image_file(), moderator)
+    queue.shutdown()
+    # The job was finished in another session
+    db.session.expire_all()
+
+    response = client.get(f"/upload/status/{job.id}")
+    assert response.json["status"] == UploadStatus.DONE
+    assert response.json["recipe_url"] == f"/recipe/{recipe.id}"
+    assert recipe.img_display_url == "http://img/display.png"
+
+
+def test_failed_upload(upload_app, client, login, recipe, moderator):
+    upload_app.config["IMGBB_API_KEY"] = "wrong"
+    job = get_upload_queue().submit(recipe, _image_file(), moderator)
+
+    assert job.status == UploadStatus.FAILED
+    assert "Invalid API v1 key" in job.error
+    response = client.get(f"/upload/status/{job.id}")
+    assert response.json == {"id": job.id, "status": "failed", "error": job.error}
+    assert recipe.img_thumbnail_url is None
+
+
+def test_resume_pending(upload_app, db, commit_to_db, recipe, moderator, tmp_path):
+    path = tmp_path / "pending.png"
+    path.write_bytes(b"image")
+    job = UploadJob(recipe=recipe, user_id=moderator.id, spool_path=str(path))
+    commit_to_db(job)
+
+    assert get_upload_queue().resume() == 1
+    db.session.refresh(job)
+    assert job.status == UploadStatus.DONE
+    # A finished job is not run again
+    assert get_upload_queue().resume() == 0
+
+
+def test_crashed_upload(upload_app, monkeypatch, recipe, moderator, tmp_path):
+    class BrokenStore:
+        def save(self, file, suffix):
+            raise ValueError("not an image")
+
+    monkeypatch.setattr("tymenu.uploads.make_store", lambda config: BrokenStore())
+    job = get_upload_queue().submit(recipe, _image_file(), moderator)
+
+    assert job.status == UploadStatus.FAILED
+    assert job.error == "Internal error: ValueError"
+    assert os.listdir(tmp_path) == []
+
+
+def test_resume_stale_running(upload_app, db, commit_to_db, recipe, moderator, tmp_path):
+    path = tmp_path / "running.png"
+    path.write_bytes(b"image")
+    now = datetime.datetime.now(datetime.timezone.utc)
+    stale = UploadJob(
+        recipe=recipe,
+        user_id=moderator.id,
+        spool_path=str(path),
+        status=UploadStatus.RUNNING,
+        last_updated=now - datetime.timedelta(hours=1),
+    )
+    running = UploadJob(
+        recipe=recipe,
+        user_id=moderator.id,
+        spool_path=str(path),
+        status=UploadStatus.RUNNING,
+        last_updated=now,
+    )
+    commit_to_db(stale, running)
+
+    assert get_upload_queue().resume() == 1
+    db.session.refresh(stale)
+    db.session.refresh(running)
+    assert stale.status == UploadStatus.DONE
+    # Still running in another process
+    assert running.status == UploadStatus.RUNNING
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from flask import g
+import pytest
+import sqlalchemy as sql
+
+from tymenu.models import Role, User
+from tymenu.user_cache import get_user_cache
+
+
+@pytest.fixture
+def roles(db):
+    Role.insert_roles()
+
+
+@pytest.fixture
+def user(roles, john):
+    """A user with the default role"""
+    return john
+
+
+@pytest.fixture
+def login(client, user):
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user.id)
+        session["_fresh"] = True
+
+
+def _get(client, url):
+    # The test app context outlives the requests, so forget the user loaded by
+    # the previous request.
+    g.pop("_login_user", None)
+    return client.get(url)
+
+
+def _user_queries(statements):
+    return [s for s in statements if "FROM users" in s or "FROM roles" in s]
+
+
+def test_cached_user_is_not_loaded(db, client, user, login, count_queries):
+    assert _get(client, "/change-password").status_code == 200
+    db.session.expunge_all()
+
+    with count_queries() as statements:
+        response = _get(client, "/change-password")
+    assert response.status_code == 200
+    # Only the version of the user is read
+    (query,) = _user_queries(statements)
+    assert query.startswith("SELECT users.version")
+
+
+def test_change_in_another_process(db, client, user, login):
+    _get(client, "/change-password")
+    assert get_user_cache().get(user.id)[0] == 1
+
+    # The entry of this process is not invalidated
+    admin = Role.query.filter_by(name="Administrator").one()
+    db.session.execute(
+        sql.update(User).where(User.id == user.id).values(role_id=admin.id, version=2)
+    )
+    db.session.commit()
+    _get(client, "/change-password")
+    version, values = get_user_cache().get(user.id)
+    assert (version, values["role_id"]) == (2, admin.id)
+
+
+def test_changes_increment_the_version(db, user):
+    user.set_role("administrator")
+    db.session.refresh(user)
+    assert user.version == 2
+    user.password = "dog"
+    db.session.commit()
+    assert user.version == 3
+
+
+def test_set_role_invalidates(db, client, user, login):
+    _get(client, "/change-password")
+    assert get_user_cache().get(user.id) is not None
+
+    user.set_role("administrator")
+    assert get_user_cache().get(user.id) is None
+
+
+def test_insert_roles_clears_roles(db, user):
+    cache = get_user_cache()
+    cache.roles = [{"id": 1}]
+    Role.insert_roles()
+    assert cache.roles is None
+
+
+def test_disabled_cache(db, client, user, login, count_queries):
+    get_user_cache().ttl = 0
+    _get(client, "/change-password")
+    db.session.expunge_all()
+
+    with count_queries() as statements:
+        _get(client, "/change-password")
+    assert len(_user_queries(statements)) == 1
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import pytest
+
+from tymenu.models import KcalType, Recipe, User
+
+
+@pytest.fixture
+def make_recipes(commit_to_db):
+    """Make recipes, each by a different author"""
+
+    def _make_recipes(count):
+        recipes = []
+        for i in range(count):
+            author = User(email=f"user{i}@example.com", username=f"user{i}", password="cat")
+            recipe = Recipe(title=f"soup {i}", ingredients="carrot", keywords="soup", author=author)
+            recipes.append(recipe)
+        commit_to_db(*recipes)
+        return recipes
+
+    return _make_recipes
+
+
+@pytest.mark.parametrize(
+    "url, expected_queries",
+    [
+        ("/", 1),
+        ("/search_results?q=soup", 2),
+        ("/search_results?q=soup&sort=relevance", 2),
+    ],
+)
+@pytest.mark.parametrize("n_recipes", [1, 5])
+def test_recipe_list_query_count(
+    app_context, db, client, make_recipes, count_queries, url, expected_queries, n_recipes
+):
+    app_context.config["TYMENU_RECIPES_PER_PAGE"] = 5
+    make_recipes(n_recipes)
+    db.session.expunge_all()
+
+    with count_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert response.data.count(b'class="recipe"') == n_recipes
+    # The number of queries does not depend on the number of recipes on the page.
+    assert len(statements) == expected_queries
+
+
+def test_search_range_filters(db, client, make_recipes):
+    quick, slow = make_recipes(2)
+    quick.kcal, quick.kcal_type, quick.cooking_time_min = 500, KcalType.PER_PERSON, 20
+    slow.kcal, slow.kcal_type, slow.cooking_time_min = 500, KcalType.PER_PERSON, 60
+    db.session.commit()
+
+    data = client.get("/search_results?q=soup&max_time=30&max_kcal=600").data
+    assert b"soup 0" in data
+    assert b"soup 1" not in data
+    assert b"cooking time at most 30 min" in data
+    # The sort links keep the filters
+    assert b"max_time=30" in data
+
+    # Without a search string
+    data = client.get("/search_results?min_kcal=400&max_time=90").data
+    assert data.count(b'class="recipe"') == 2
+    # Not a number, so not a filter
+    assert b"Filters:" not in client.get("/search_results?q=soup&max_time=soon").data
+
+
+def test_search_form_redirects_with_the_filters(app_context, client):
+    app_context.config["WTF_CSRF_ENABLED"] = False
+    response = client.post("/search", data={"search_string": "soup", "max_kcal": "600"})
+    assert response.status_code == 302
+    assert "q=soup" in response.location
+    assert "max_kcal=600" in response.location
+    assert "min_protein" not in response.location
+
+
+def test_search_results_past_the_count_limit(app_context, client, make_recipes):
+    app_context.config.update(TYMENU_RECIPES_PER_PAGE=2, TYMENU_SEARCH_COUNT_LIMIT=3)
+    make_recipes(6)
+    data = client.get("/search_results?q=soup&page=3").data
+    assert b"more than 3" in data
+    assert data.count(b'class="recipe"') == 2
+
+    # The last page is past the limit, but has its link
+    data = client.get("/search_results?q=soup&page=2").data
+    assert b"page=3" in data